@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,6 +14,19 @@ from src.modules.image_generation.router import router as image_generation_route
 from src.modules.routers.generated_images import generated_images_router
 from src.modules.routers.admin import router as admin_router
 from src.modules.auth.router import router as auth_router
+from src.modules.jobs.router import router as jobs_router
+from src.modules.uploads.router import router as uploads_router
+from src.modules.history.router import router as history_router
+from src.modules.jobs.service import init_job_manager, close_job_manager
+from src.external_services.http_pool import init_http_pool, close_http_pool, get_http_pool
+from src.external_services.kling import close_kling_tracker
+from src.external_services.governor import get_provider_governor
+from src.modules.services.tryon_routing import get_tryon_router
+from src.modules.auth.passwords import close_password_hasher
+from src.modules.history.service import init_history_writer, close_history_writer, referenced_outputs
+from src.utils.result_cache import init_result_cache
+from src.utils.storage import init_storage
+from src.modules.services.image_variants import close_image_variants
 
 load_dotenv('.env')
 # Configure logging
@@ -23,13 +37,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create app-scoped resources on startup and release them on shutdown"""
+    await init_http_pool()
+    await init_storage()
+    await init_job_manager()
+    init_history_writer()
+    init_result_cache(referenced=referenced_outputs)
+    try:
+        yield
+    finally:
+        await close_job_manager()
+        await close_history_writer()
+        await close_kling_tracker()
+        await close_http_pool()
+        close_password_hasher()
+        close_image_variants()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Virtual Cloth Try-On",
     description="virtual try-on using both external services and local pipeline",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS middleware
@@ -45,7 +78,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"]  # For file downloads if needed
+    expose_headers=["Content-Disposition", "X-Next-Cursor", "Link"]  # File downloads and pagination
 )
 
 # Add generated images router
@@ -65,6 +98,27 @@ app.include_router(
     tags=["Admin"]
 )
 
+# Add background jobs router
+app.include_router(
+    jobs_router,
+    prefix="/api",
+    tags=["Jobs"]
+)
+
+# Add image uploads router
+app.include_router(
+    uploads_router,
+    prefix="/api",
+    tags=["Uploads"]
+)
+
+# Add generation history router
+app.include_router(
+    history_router,
+    prefix="/api",
+    tags=["History"]
+)
+
 # Add auth router
 app.include_router(
     auth_router,
@@ -97,6 +151,17 @@ async def health_check():
         "timestamp": datetime.datetime.now(datetime.UTC).isoformat()
     }
 
+@app.get("/api/health/http-pool", tags=["Health"])
+async def http_pool_stats():
+    """Outbound connection pool utilisation per provider host"""
+    return get_http_pool().stats()
+
+@app.get("/api/health/providers", tags=["Health"])
+async def provider_stats():
+    """Admission limits and queueing per provider lane, breaker state and the try-on routing scoreboard"""
+    governor = get_provider_governor()
+    return {"lanes": governor.stats(), "breakers": governor.breaker_stats(), "tryon_routing": get_tryon_router().stats()}
+
 if __name__ == "__main__":
     print(f"Starting server with output directory: {constants.OUTPUT_DIR}")
     
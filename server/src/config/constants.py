@@ -2,3 +2,6 @@ import os
 
 # Define output directory path
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "output")
+
+# Content-addressed responses never change, so clients and CDNs may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
@@ -23,6 +23,109 @@ KLING_API_KEY: str = config.get("KLING_API_KEY", "")
 OPENAI_API_KEY: str = config.get("OPENAI_API_KEY", "")
 REPLICATE_API_TOKEN: str = config.get("REPLICATE_API_TOKEN", "")
 FAL_API_KEY: str = config.get("FAL_API_KEY", "")
+KOLORS_API_KEY: str = config.get("KOLORS_API_KEY") or KLING_API_KEY  # Appy Pie gateway subscription key
+
+# Kling task tracking
+KLING_TASK_TIMEOUT_SECONDS: float = float(config.get("KLING_TASK_TIMEOUT_SECONDS", 120))
+KLING_CALLBACK_URL: str = config.get("KLING_CALLBACK_URL", "")  # Public URL of /api/image-generation/kling/callback
+KLING_CALLBACK_SECRET: str = config.get("KLING_CALLBACK_SECRET", "")
+if KLING_CALLBACK_URL and not KLING_CALLBACK_SECRET:
+    raise ValueError("KLING_CALLBACK_SECRET is required when KLING_CALLBACK_URL is set")
+KOLORS_TASK_TIMEOUT_SECONDS: float = float(config.get("KOLORS_TASK_TIMEOUT_SECONDS", 180))
+
+# Virtual try-on routing for model "auto" (or an explicit routing policy):
+# fastest, cheapest or strict, over TRYON_PROVIDERS with relative per-call costs
+TRYON_ROUTING_POLICY: str = config.get("TRYON_ROUTING_POLICY", "fastest")
+TRYON_PROVIDERS: str = config.get("TRYON_PROVIDERS", "leffa,cat-vton,kolors")
+TRYON_PROVIDER_COSTS: str = config.get("TRYON_PROVIDER_COSTS", "cat-vton=1,leffa=3,kolors=7")
+# Batch try-on: items per request and items in flight per batch
+BATCH_TRYON_MAX_ITEMS: int = int(config.get("BATCH_TRYON_MAX_ITEMS", 50))
+BATCH_TRYON_CONCURRENCY: int = int(config.get("BATCH_TRYON_CONCURRENCY", 8))
+# Batch generation: images per request and provider calls in flight per batch
+BATCH_GENERATION_MAX_IMAGES: int = int(config.get("BATCH_GENERATION_MAX_IMAGES", 500))
+BATCH_GENERATION_CONCURRENCY: int = int(config.get("BATCH_GENERATION_CONCURRENCY", 8))
+
+# Outbound HTTP pool settings
+HTTP_POOL_MAX_CONNECTIONS: int = int(config.get("HTTP_POOL_MAX_CONNECTIONS", 100))
+HTTP_POOL_HOST_LIMITS: str = config.get("HTTP_POOL_HOST_LIMITS", "")  # "host=limit,host=limit"
+HTTP_POOL_MAX_KEEPALIVE: int = int(config.get("HTTP_POOL_MAX_KEEPALIVE", 20))
+HTTP_POOL_KEEPALIVE_EXPIRY: float = float(config.get("HTTP_POOL_KEEPALIVE_EXPIRY", 60))
+HTTP_POOL_HTTP2: bool = config.get("HTTP_POOL_HTTP2", "true").lower() == "true"
+HTTP_POOL_TIMEOUT: float = float(config.get("HTTP_POOL_TIMEOUT", 30))
+
+# Per-provider admission ("provider=value,provider=value"); lanes are per API key and
+# shrink on upstream 429/5xx, then grow back towards these ceilings
+PROVIDER_MAX_CONCURRENCY: str = config.get("PROVIDER_MAX_CONCURRENCY", "kling=5,replicate=10,leffa=10,cat-vton=4,kolors=5,openai=20")
+PROVIDER_RATE_PER_MINUTE: str = config.get("PROVIDER_RATE_PER_MINUTE", "")
+PROVIDER_BURST: str = config.get("PROVIDER_BURST", "")
+PROVIDER_QUEUE_TIMEOUT_SECONDS: float = float(config.get("PROVIDER_QUEUE_TIMEOUT_SECONDS", 30))
+PROVIDER_CONNECT_TIMEOUT_SECONDS: float = float(config.get("PROVIDER_CONNECT_TIMEOUT_SECONDS", 5))
+CATVTON_READ_TIMEOUT_SECONDS: float = float(config.get("CATVTON_READ_TIMEOUT_SECONDS", 300))
+FAL_TIMEOUT_SECONDS: float = float(config.get("FAL_TIMEOUT_SECONDS", 300))
+
+# A provider's breaker opens after this many consecutive timeouts / 5xx and
+# lets one probe through after CIRCUIT_BREAKER_RECOVERY_SECONDS
+CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = int(config.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5))
+CIRCUIT_BREAKER_RECOVERY_SECONDS: float = float(config.get("CIRCUIT_BREAKER_RECOVERY_SECONDS", 30))
+# Providers ("cat-vton,leffa") whose calls are duplicated once they run past the recent p95
+PROVIDER_HEDGE: str = config.get("PROVIDER_HEDGE", "")
+PROVIDER_HEDGE_MIN_SAMPLES: int = int(config.get("PROVIDER_HEDGE_MIN_SAMPLES", 20))
+
+# Background job settings
+JOB_STORE_BACKEND: str = config.get("JOB_STORE_BACKEND", "memory")  # "memory" or "database"
+JOB_WORKERS: int = int(config.get("JOB_WORKERS", 32))
+JOB_QUEUE_SIZE: int = int(config.get("JOB_QUEUE_SIZE", 10000))
+JOB_PROVIDER_CONCURRENCY: str = config.get("JOB_PROVIDER_CONCURRENCY", "")  # "provider=limit,provider=limit"
+JOB_RESULT_TTL_SECONDS: int = int(config.get("JOB_RESULT_TTL_SECONDS", 3600))
+JOB_STALE_SECONDS: int = int(config.get("JOB_STALE_SECONDS", 1800))  # Queued/running jobs untouched this long were orphaned by a restart
+
+# Generated image storage: "local" (sharded under OUTPUT_DIR) or "s3" (any S3-compatible endpoint)
+STORAGE_BACKEND: str = config.get("STORAGE_BACKEND", "local").lower()
+STORAGE_SHARD_DEPTH: int = int(config.get("STORAGE_SHARD_DEPTH", 2))
+# fsync policy for local writes: off, data (file before rename) or full (file and directory)
+STORAGE_FSYNC: str = config.get("STORAGE_FSYNC", "off").lower()
+S3_ENDPOINT_URL: str = config.get("S3_ENDPOINT_URL", "")
+S3_BUCKET: str = config.get("S3_BUCKET", "")
+S3_ACCESS_KEY_ID: str = config.get("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY: str = config.get("S3_SECRET_ACCESS_KEY", "")
+S3_REGION: str = config.get("S3_REGION", "us-east-1")
+S3_PREFIX: str = config.get("S3_PREFIX", "")
+
+# Resized / re-encoded variants of generated images (?w=&fmt=), rendered in worker processes
+IMAGE_VARIANT_CACHE_MAX_BYTES: int = int(config.get("IMAGE_VARIANT_CACHE_MAX_BYTES", 1024 ** 3))
+IMAGE_VARIANT_WORKERS: int = int(config.get("IMAGE_VARIANT_WORKERS", 2))
+
+# Result cache settings (content-addressed provider outputs under OUTPUT_DIR)
+RESULT_CACHE_ENABLED: bool = config.get("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS: int = int(config.get("RESULT_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+RESULT_CACHE_URL_TTL_SECONDS: int = int(
+    config.get("RESULT_CACHE_URL_TTL_SECONDS", 3600)
+)  # Results only known by a provider URL (FAL); keep under the provider's link retention
+RESULT_CACHE_MAX_ENTRIES: int = int(config.get("RESULT_CACHE_MAX_ENTRIES", 10000))
+RESULT_CACHE_MAX_BYTES: int = int(config.get("RESULT_CACHE_MAX_BYTES", 5 * 1024 ** 3))  # Evicted files history still references are kept
+
+# Image proxy settings (/api/image-generation/view-image)
+IMAGE_PROXY_ALLOWED_HOSTS: str = config.get(
+    "IMAGE_PROXY_ALLOWED_HOSTS", "replicate.delivery,fal.media,klingai.com,kling.ai"
+)  # Comma-separated provider CDNs, subdomains included; "*" allows any host
+IMAGE_PROXY_CACHE_ENABLED: bool = config.get("IMAGE_PROXY_CACHE_ENABLED", "false").lower() == "true"
+IMAGE_PROXY_CACHE_TTL_SECONDS: int = int(config.get("IMAGE_PROXY_CACHE_TTL_SECONDS", 24 * 3600))
+IMAGE_PROXY_CACHE_MAX_BYTES: int = int(config.get("IMAGE_PROXY_CACHE_MAX_BYTES", 1024 ** 3))
+IMAGE_PROXY_MAX_OBJECT_BYTES: int = int(config.get("IMAGE_PROXY_MAX_OBJECT_BYTES", 50 * 1024 ** 2))
+
+# Image uploads (/api/uploads)
+UPLOAD_MAX_BYTES: int = int(config.get("UPLOAD_MAX_BYTES", 20 * 1024 ** 2))
+UPLOAD_QUOTA_BYTES: int = int(config.get("UPLOAD_QUOTA_BYTES", 200 * 1024 ** 2))  # Per user per window
+UPLOAD_QUOTA_WINDOW_SECONDS: int = int(config.get("UPLOAD_QUOTA_WINDOW_SECONDS", 3600))
+
+# Image preprocessing: byte-identical inputs reuse one prepared payload
+IMAGE_DEDUPE_MAX_ENTRIES: int = int(config.get("IMAGE_DEDUPE_MAX_ENTRIES", 1024))
+
+# GPT-4o garment description cache
+GARMENT_DESCRIPTION_CACHE_ENABLED: bool = config.get("GARMENT_DESCRIPTION_CACHE_ENABLED", "true").lower() == "true"
+GARMENT_DESCRIPTION_TTL_SECONDS: int = int(config.get("GARMENT_DESCRIPTION_TTL_SECONDS", 30 * 24 * 3600))  # 0 keeps them forever
+GARMENT_DESCRIPTION_CACHE_SIZE: int = int(config.get("GARMENT_DESCRIPTION_CACHE_SIZE", 2048))
+GARMENT_ANALYSIS_TIMEOUT_SECONDS: float = float(config.get("GARMENT_ANALYSIS_TIMEOUT_SECONDS", 8))  # 0 waits indefinitely
 
 # Database Settings
 DATABASE_URL: str = config.get("DATABASE_URL", "")
@@ -46,12 +149,35 @@ JWT_SECRET_KEY: str = config.get("JWT_SECRET_KEY", "your-secret-key")
 JWT_ALGORITHM: str = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
 
+# Verified tokens and loaded users are cached per process for this long
+AUTH_TOKEN_CACHE_TTL_SECONDS: int = int(config.get("AUTH_TOKEN_CACHE_TTL_SECONDS", 300))
+AUTH_USER_CACHE_TTL_SECONDS: int = int(config.get("AUTH_USER_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_SIZE: int = int(config.get("AUTH_CACHE_SIZE", 10000))
+
+# Password hashing; changing BCRYPT_ROUNDS rehashes passwords on next login
+BCRYPT_ROUNDS: int = int(config.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS: int = int(config.get("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_MAX_PENDING: int = int(config.get("PASSWORD_HASH_MAX_PENDING", 64))
+LOGIN_RATE_LIMIT_ATTEMPTS: int = int(config.get("LOGIN_RATE_LIMIT_ATTEMPTS", 10))
+LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = int(config.get("LOGIN_RATE_LIMIT_WINDOW_SECONDS", 300))
+# Reverse proxies whose X-Forwarded-For is trusted for the client address (IPs or CIDRs)
+TRUSTED_PROXIES: str = config.get("TRUSTED_PROXIES", "")
+
+# Generation history is written in batches of up to GENERATION_HISTORY_BATCH_SIZE
+# every GENERATION_HISTORY_FLUSH_SECONDS; beyond MAX_PENDING the oldest are dropped
+GENERATION_HISTORY_FLUSH_SECONDS: float = float(config.get("GENERATION_HISTORY_FLUSH_SECONDS", 1.0))
+GENERATION_HISTORY_BATCH_SIZE: int = int(config.get("GENERATION_HISTORY_BATCH_SIZE", 500))
+GENERATION_HISTORY_MAX_PENDING: int = int(config.get("GENERATION_HISTORY_MAX_PENDING", 10000))
+# Deterministic generations with identical inputs replay a successful result
+# from history for this long; 0 disables reuse
+GENERATION_REUSE_MAX_AGE_SECONDS: int = int(config.get("GENERATION_REUSE_MAX_AGE_SECONDS", 24 * 3600))
+
 # Tortoise ORM Config
 TORTOISE_ORM = {
     "connections": {"default": DATABASE_URL},
     "apps": {
         "models": {
-            "models": ["src.models.user", "aerich.models"],
+            "models": ["src.models.user", "src.models.job", "src.models.garment_description", "src.models.generation", "aerich.models"],
             "default_connection": "default",
         },
     },
@@ -1,11 +1,18 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from pydantic import BaseModel
-import os
-import aiohttp
-from fastapi import UploadFile
+import asyncio
 import base64
-from aiohttp import FormData
-from ..config.constants import OUTPUT_DIR
+import binascii
+import json
+import re
+import httpx
+from fastapi import HTTPException
+from ..config import settings
+from ..modules.services.image_preprocessing import PreprocessedImage, get_image_preprocessor
+from ..utils.result_cache import get_result_cache, make_cache_key
+from .governor import get_provider_governor
+from .resilience import hedged
+from .http_pool import HTTPClientPool, get_http_pool
 
 
 class CatVTONRequest(BaseModel):
@@ -15,128 +22,136 @@ class CatVTONRequest(BaseModel):
     human_image_url: str
     garment_image_url: str
     garment_type: str = "overall"
+    num_inference_steps: int = 50
+    guidance_scale: float = 3.0
+    seed: int = 42
 
 class CatVTONResponse(BaseModel):
     """
     Response model for CatVTON virtual try-on
     """
     task_id: str
-    image_path: str  # Path to the saved image
+    image_path: str  # Path to the saved image, or its storage key for remote storage
     logs: List[str]
 
-async def base64_to_uploadfile(base64_url: str, filename: str = "image.png") -> UploadFile:
-    # Extract the Base64 part from the URL (e.g., "data:image/png;base64,...")
-    base64_data = base64_url.split(",")[1]
-
-    # Decode the Base64 string into binary data
-    image_data = base64.b64decode(base64_data)
-
-    # Create an UploadFile object
-    upload_file = UploadFile(filename=filename, file=BytesIO(image_data))
-
-    return upload_file
-
-from fastapi import UploadFile
-from io import BytesIO
-import httpx
-import mimetypes
-
-async def url_to_uploadfile(image_url: str) -> UploadFile:
-    # Download the image from the URL
-    async with httpx.AsyncClient() as client:
-        response = await client.get(image_url)
-        response.raise_for_status()  # Raise an error for bad responses
-
-        # Determine the file extension
-        content_type = response.headers.get("Content-Type")
-        if content_type:
-            # Map MIME type to file extension (e.g., "image/webp" -> ".webp")
-            file_extension = mimetypes.guess_extension(content_type) or ".bin"
-        else:
-            # Fallback: Extract extension from the URL
-            file_extension = "." + image_url.split(".")[-1].lower()
-
-        # Create a filename with the correct extension
-        filename = f"image{file_extension}"
+CATVTON_API_URL = "https://catcontainer.calmpebble-9c79c8f4.westus3.azurecontainerapps.io/tryon"
+# Inference routinely takes tens of seconds, well above the pool default, but a
+# cold or dead container should fail at connect time rather than after minutes
+CATVTON_TIMEOUT = httpx.Timeout(settings.CATVTON_READ_TIMEOUT_SECONDS, connect=settings.PROVIDER_CONNECT_TIMEOUT_SECONDS)
+# Base64 characters decoded per chunk when persisting a result (a multiple of 4)
+RESULT_DECODE_CHUNK = 4 * 64 * 1024
+RESULT_IMAGE_FIELD = re.compile(rb'"result_image"\s*:\s*\[?\s*"')
 
-        # Create an UploadFile object
-        image_data = BytesIO(response.content)
-        upload_file = UploadFile(filename=filename, file=image_data)
-
-        return upload_file
+def iter_result_image(body: bytes) -> Iterator[bytes]:
+    """
+    Decode the base64 `result_image` of a CatVTON response chunk by chunk,
+    straight from the response buffer instead of parsing the whole JSON
+    document and decoding the image into one more full-size copy
+    """
+    match = RESULT_IMAGE_FIELD.search(body)
+    if not match:
+        raise ValueError("CatVTON response has no result_image")
+    start = match.end()
+    end = body.index(b'"', start)
+    if body.find(b"\\", start, end) != -1:
+        # Escaped characters need a real JSON parser
+        value = json.loads(body)["result_image"]
+        yield base64.b64decode(value[0] if isinstance(value, list) else value)
+        return
+    if body.startswith(b"data:", start):
+        start = body.index(b",", start, end) + 1
+
+    encoded = memoryview(body)[start:end]
+    for offset in range(0, len(encoded), RESULT_DECODE_CHUNK):
+        yield binascii.a2b_base64(encoded[offset:offset + RESULT_DECODE_CHUNK])
+
+async def prepare_input(image: str, http_pool: HTTPClientPool) -> PreprocessedImage:
+    """
+    Fetch or decode one input image and bring it to the model's working resolution
+    """
+    return await get_image_preprocessor().prepare(image, "cat-vton", http_pool)
 
-async def virtual_try_on(request: CatVTONRequest) -> CatVTONResponse:
+async def virtual_try_on(request: CatVTONRequest, http_pool: Optional[HTTPClientPool] = None) -> CatVTONResponse:
     """
     Perform virtual try-on using CatVTON API
     """
     try:
         logs = ["Starting CatVTON API request"]
-        
-        api_url = "https://catcontainer.calmpebble-9c79c8f4.westus3.azurecontainerapps.io/tryon"
-        
-        async with aiohttp.ClientSession() as session:
-            logs.append("Sending request to CatVTON API")
-
-            person_image = await url_to_uploadfile(request.human_image_url)
-            cloth_image = await base64_to_uploadfile(request.garment_image_url)
-
-            # Prepare FormData for multipart upload
-            form_data = FormData()
-
-            # Add files
-            form_data.add_field(
-                name="person_image",
-                value=person_image.file.read(),
-                filename=person_image.filename,
-                content_type="image/jpeg"
-            )
-            form_data.add_field(
-                name="cloth_image",
-                value=cloth_image.file.read(),
-                filename=cloth_image.filename,
-                content_type="image/png"
-            )
-
-            # Add other form fields
-            form_data.add_field("cloth_type", request.garment_type)
-            form_data.add_field("num_inference_steps", "50")
-            form_data.add_field("guidance_scale", "3")
-            form_data.add_field("seed", "42")
-            form_data.add_field("show_type", "result only")
-
-            # Make API request
-            async with session.post(
-                    api_url,
+        http_pool = http_pool or get_http_pool()
+
+        # Each image may be an upload id, a data URL or a remote URL; both are prepared concurrently
+        person_image, cloth_image = await asyncio.gather(
+            prepare_input(request.human_image_url, http_pool),
+            prepare_input(request.garment_image_url, http_pool),
+        )
+        person_bytes = person_image.data
+        cloth_bytes = cloth_image.data
+
+        # Identical inputs and parameters always produce the same output
+        cache = get_result_cache()
+        params = {
+            "garment_type": request.garment_type,
+            "num_inference_steps": request.num_inference_steps,
+            "guidance_scale": request.guidance_scale,
+            "seed": request.seed,
+        }
+        cache_key = make_cache_key("catvton", [person_bytes, cloth_bytes], params)
+        task_id = f"catvton_{cache_key[:16]}"
+        if settings.RESULT_CACHE_ENABLED:
+            cached = await cache.get(cache_key)
+            if cached and cached.files:
+                logs.append("Reusing cached CatVTON result")
+                return CatVTONResponse(
+                    task_id=task_id,
+                    image_path=cache.storage.local_path(cached.files[0]) or cached.files[0],
+                    logs=logs
+                )
+
+        logs.append("Sending request to CatVTON API")
+
+        # Prepare multipart upload
+        files = {
+            "person_image": (person_image.filename, person_bytes, person_image.content_type),
+            "cloth_image": (cloth_image.filename, cloth_bytes, cloth_image.content_type),
+        }
+        form_data = {
+            "cloth_type": request.garment_type,
+            "num_inference_steps": str(request.num_inference_steps),
+            "guidance_scale": f"{request.guidance_scale:g}",
+            "seed": str(request.seed),
+            "show_type": "result only",
+        }
+
+        governor = get_provider_governor()
+
+        async def attempt(hedge: int) -> httpx.Response:
+            # A hedge only runs if a slot is free right away
+            async with governor.slot("cat-vton", timeout=0 if hedge else None) as permit:
+                response = await http_pool.request(
+                    "POST",
+                    CATVTON_API_URL,
                     data=form_data,
-            ) as response:
-                logs.append(f"Received response from CatVTON API: {response.status}")
-
-                if response.status == 200:
-                    # Parse the API response
-                    result = await response.json()
-                    result_image = result.get("result_image", [])  # List of Base64-encoded image strings
-                    
-                    # Generate task_id
-                    task_id = f"catvton_{hash(request.human_image_url + request.garment_image_url) % 10000:04d}"
-                    
-                    # Ensure output directory exists
-                    os.makedirs(OUTPUT_DIR, exist_ok=True)
-                    
-                    # Save image with task_id in filename
-                    image_path = os.path.join(OUTPUT_DIR, f"{task_id}.png")
-                    image_data = base64.b64decode(result_image)
-                    
-                    print(f"Debug - Saving image to: {image_path}")
-                    print(f"Debug - Output directory: {OUTPUT_DIR}")
-                    print(f"Debug - Current directory: {os.getcwd()}")
-                    
-                    with open(image_path, "wb") as f:
-                        f.write(image_data)
-
-                    logs.append(f"Successfully processed and saved image to {image_path}")
-                    print(f"Debug - After save, file exists: {os.path.exists(image_path)}")
-                else:
-                    raise ValueError(f"API request failed with status {response.status}")
+                    files=files,
+                    timeout=CATVTON_TIMEOUT,
+                )
+                permit.observe(response.status_code)
+                return response
+
+        # Make API request, duplicated if it runs past the recent p95 (PROVIDER_HEDGE)
+        response = await hedged(attempt, governor.hedge_delay("cat-vton"))
+        logs.append(f"Received response from CatVTON API: {response.status_code}")
+
+        if response.status_code == 200:
+            # Decode and store the image under its content-addressed cache key on a worker thread
+            image_name = cache.name_for("catvton", cache_key, "png")
+            await cache.storage.put_chunks(image_name, iter_result_image(response.content), "image/png")
+            image_path = cache.storage.local_path(image_name) or image_name
+
+            logs.append(f"Successfully processed and saved image to {image_path}")
+            if settings.RESULT_CACHE_ENABLED:
+                await cache.put(cache_key, files=[image_name])
+        else:
+            raise ValueError(f"API request failed with status {response.status_code}")
 
         return CatVTONResponse(
             task_id=task_id,
@@ -144,5 +159,7 @@ async def virtual_try_on(request: CatVTONRequest) -> CatVTONResponse:
             logs=logs
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise ValueError(f"CatVTON virtual try-on error: {str(e)}")
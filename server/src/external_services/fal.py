@@ -1,14 +1,33 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 import fal_client
 import asyncio
 import os
+from fastapi import HTTPException
+from ..config import settings
+from ..utils.cache import TTLCache
+from ..utils.result_cache import get_result_cache, make_cache_key
+from .governor import get_provider_governor
+from .resilience import hedged
+
+FAL_TRYON_MODEL = "fal-ai/leffa/virtual-tryon"
+
+FAL_UPLOAD_CACHE_MAX_ENTRIES = 4096
+FAL_UPLOAD_URL_TTL_SECONDS = 24 * 3600
+
+# FAL storage URLs of recently uploaded images, keyed by content digest
+_uploaded_urls = TTLCache(max_entries=FAL_UPLOAD_CACHE_MAX_ENTRIES, ttl_seconds=FAL_UPLOAD_URL_TTL_SECONDS)
+
 class FalVirtualTryOnRequest(BaseModel):
     """
     Request model for FAL.AI virtual try-on
     """
     human_image_url: str
     garment_image_url: str
+    # SHA-256 of the prepared image bytes behind each URL; the result cache is
+    # keyed on these, so the same image under another URL still hits
+    human_image_digest: str
+    garment_image_digest: str
 
 class FalVirtualTryOnResponse(BaseModel):
     """
@@ -18,40 +37,81 @@ class FalVirtualTryOnResponse(BaseModel):
     result_images: List[str]
     logs: List[str]
 
+async def upload_image(key: str, data: bytes, content_type: str, api_key: str) -> str:
+    """
+    Upload an image to FAL storage once and reuse its URL for later requests
+    """
+    url = _uploaded_urls.get(key)
+    if url is None:
+        fal_client.api_key = os.getenv("FAL_KEY", api_key)
+        url = await fal_client.upload_async(data, content_type)
+        _uploaded_urls.set(key, url)
+    return url
+
 async def virtual_try_on(request: FalVirtualTryOnRequest, api_key: str) -> FalVirtualTryOnResponse:
     """
     Perform virtual try-on using FAL.AI API
     """
     try:
+        # FAL returns hosted URLs, so repeats are answered from the cache until those expire
+        cache = get_result_cache()
+        cache_key = make_cache_key(
+            FAL_TRYON_MODEL,
+            [bytes.fromhex(request.human_image_digest), bytes.fromhex(request.garment_image_digest)],
+            {},
+        )
+        task_id = f"fal_{cache_key[:16]}"
+        if settings.RESULT_CACHE_ENABLED:
+            cached = await cache.get(cache_key)
+            if cached and cached.urls:
+                return FalVirtualTryOnResponse(
+                    task_id=task_id,
+                    result_images=cached.urls,
+                    logs=["Reusing cached FAL.AI result"]
+                )
+
         fal_client.api_key = os.getenv("FAL_KEY", api_key)
 
-        # Submit the request
-        handler = await fal_client.submit_async(
-            "fal-ai/leffa/virtual-tryon",
-            arguments={
-                "human_image_url": request.human_image_url,
-                "garment_image_url": request.garment_image_url
-            },
-        )
+        governor = get_provider_governor()
 
-        # Collect logs during processing
-        logs = []
-        async for event in handler.iter_events(with_logs=True):
-            if isinstance(event, dict) and 'log' in event:
-                logs.append(event['log'])
+        async def attempt(hedge: int) -> Tuple[dict, List[str]]:
+            # A hedge only runs if a slot is free right away
+            async with governor.slot("leffa", api_key, timeout=0 if hedge else None):
+                async with asyncio.timeout(settings.FAL_TIMEOUT_SECONDS):
+                    # Submit the request
+                    handler = await fal_client.submit_async(
+                        FAL_TRYON_MODEL,
+                        arguments={
+                            "human_image_url": request.human_image_url,
+                            "garment_image_url": request.garment_image_url
+                        },
+                    )
 
-        # Get the final result
-        result = await handler.get()
+                    # Collect logs during processing
+                    logs = []
+                    async for event in handler.iter_events(with_logs=True):
+                        if isinstance(event, dict) and 'log' in event:
+                            logs.append(event['log'])
+
+                    # Get the final result
+                    return await handler.get(), logs
+
+        # Duplicated if it runs past the recent p95 (PROVIDER_HEDGE)
+        result, logs = await hedged(attempt, governor.hedge_delay("leffa"))
 
         # Extract image URLs correctly based on API response
         result_images = [result["image"]["url"]] if "image" in result and "url" in result["image"] else []
+        if settings.RESULT_CACHE_ENABLED and result_images:
+            await cache.put(cache_key, urls=result_images, ttl_seconds=settings.RESULT_CACHE_URL_TTL_SECONDS)
 
         return FalVirtualTryOnResponse(
-            task_id=f"fal_{hash(request.human_image_url + request.garment_image_url) % 10000:04d}",
+            task_id=task_id,
             result_images=result_images,
             logs=logs
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise ValueError(f"FAL.AI virtual try-on error: {str(e)}")
 """
@@ -0,0 +1,392 @@
+"""
+Per-provider admission control for outbound AI calls.
+
+Every call to Kling, Replicate, FAL, CatVTON or OpenAI goes through a lane
+keyed by provider and API key. A lane admits a call once it holds both a
+rate token (token bucket) and a concurrency slot, waiting in FIFO order for
+at most the queue deadline. Lanes adapt AIMD-style: each upstream 429/5xx
+halves the concurrency limit and the token rate (at most once per cooldown),
+each success grows them back additively towards the configured ceiling.
+Calls that can't be admitted in time, and upstream 429s, surface as HTTP 429
+with Retry-After rather than as generic failures. In front of the lanes sits
+a circuit breaker per provider (see resilience.py), so calls to an upstream
+that is down fail fast with 503 instead of queueing behind it.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+
+from src.config import settings
+from src.utils.common import parse_int_mapping
+from .resilience import HEDGE_PERCENTILE, CircuitBreaker, LatencyWindow, is_outage
+
+# Lanes grow back by this many slots per limit-worth of successes
+AIMD_INCREASE = 1.0
+AIMD_DECREASE = 0.5
+# Back-to-back failures from one burst only count as one congestion signal
+AIMD_COOLDOWN_SECONDS = 2.0
+# Recent queue waits kept per lane for the percentile metrics
+WAIT_SAMPLE_SIZE = 512
+
+
+class ProviderRateLimitedException(HTTPException):
+    """Exception raised when a provider call is throttled locally or upstream."""
+
+    def __init__(self, provider: str, retry_after: float, upstream: bool = False):
+        self.provider = provider
+        self.upstream = upstream
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=(
+                f"{provider} is rate limiting requests" if upstream
+                else f"Too many concurrent {provider} requests, try again shortly"
+            ),
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    """Ceilings for one provider lane; None means unlimited"""
+    max_concurrency: Optional[int] = None
+    rate_per_minute: Optional[int] = None
+    burst: Optional[int] = None
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or httpx exception, if any"""
+    for candidate in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "status"):
+            value = getattr(candidate, attribute, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate can be changed on the fly"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class ProviderLane:
+    """Admission state and metrics for one provider / API key"""
+
+    def __init__(self, provider: str, limits: ProviderLimits, queue_timeout: float):
+        self.provider = provider
+        self.limits = limits
+        self.queue_timeout = queue_timeout
+        self.limit = float(limits.max_concurrency) if limits.max_concurrency else None
+        self.bucket = None
+        if limits.rate_per_minute:
+            rate = limits.rate_per_minute / 60
+            self.bucket = TokenBucket(rate, limits.burst or max(1, limits.rate_per_minute // 60))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.failures = 0
+
+    def _has_slot(self) -> bool:
+        return self.limit is None or self.in_flight < int(self.limit)
+
+    def _wake_next(self) -> None:
+        while self._waiters and self._has_slot():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot is handed over here so a newcomer can't take it first
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire_slot(self, deadline: float) -> None:
+        if self._has_slot() and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # Handed a slot but cancelled before using it; pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise ProviderRateLimitedException(self.provider, self.queue_timeout)
+            raise
+
+    async def _acquire_token(self, deadline: float) -> None:
+        while self.bucket is not None:
+            delay = self.bucket.try_take()
+            if not delay:
+                return
+            if time.monotonic() + delay > deadline:
+                raise ProviderRateLimitedException(self.provider, delay)
+            await asyncio.sleep(delay)
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if timeout is None else timeout)
+        try:
+            await self._acquire_slot(deadline)
+        except ProviderRateLimitedException:
+            self.rejected += 1
+            raise
+        try:
+            await self._acquire_token(deadline)
+        except BaseException as e:
+            self.release()
+            if isinstance(e, ProviderRateLimitedException):
+                self.rejected += 1
+            raise
+        self.admitted += 1
+        self._waits.append(time.monotonic() - started)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_next()
+
+    def on_success(self) -> None:
+        ceiling = self.limits.max_concurrency
+        if self.limit is not None and ceiling:
+            self.limit = min(float(ceiling), self.limit + AIMD_INCREASE / self.limit)
+        if self.bucket is not None:
+            ceiling_rate = self.limits.rate_per_minute / 60
+            self.bucket.rate = min(ceiling_rate, self.bucket.rate + ceiling_rate * AIMD_INCREASE / 10)
+        self._wake_next()
+
+    def on_congestion(self, throttled: bool) -> None:
+        if throttled:
+            self.throttled += 1
+        else:
+            self.failures += 1
+        now = time.monotonic()
+        if now - self._last_decrease < AIMD_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        if self.limit is not None:
+            self.limit = max(1.0, self.limit * AIMD_DECREASE)
+        if self.bucket is not None:
+            self.bucket.rate = max(self.limits.rate_per_minute / 600, self.bucket.rate * AIMD_DECREASE)
+
+    def observe(self, status_code: Optional[int], error: Optional[BaseException] = None) -> None:
+        """Feed the outcome of one call into the AIMD controller"""
+        if status_code == 429:
+            self.on_congestion(throttled=True)
+            raise ProviderRateLimitedException(
+                self.provider, (error and retry_after_of(error)) or AIMD_COOLDOWN_SECONDS, upstream=True
+            )
+        if status_code is not None and status_code >= 500:
+            self.on_congestion(throttled=False)
+        elif error is None:
+            self.on_success()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4) if waits else None
+
+        return {
+            "limit": round(self.limit, 2) if self.limit is not None else None,
+            "rate_per_minute": round(self.bucket.rate * 60, 2) if self.bucket else None,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "wait_p50_seconds": percentile(0.5),
+            "wait_p95_seconds": percentile(0.95),
+            "wait_max_seconds": round(waits[-1], 4) if waits else None,
+        }
+
+
+class ProviderPermit:
+    """Handed to the governed call so it can report a response status"""
+
+    def __init__(self, lane: ProviderLane):
+        self.lane = lane
+        self.status_code: Optional[int] = None
+
+    @property
+    def reported(self) -> bool:
+        return self.status_code is not None
+
+    def observe(self, status_code: int) -> None:
+        """Report an HTTP status; raises ProviderRateLimitedException on 429"""
+        self.status_code = status_code
+        self.lane.observe(status_code)
+
+
+class ProviderGovernor:
+    """Lanes per (provider, API key) and a breaker per provider, created on first use"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, ProviderLimits]] = None,
+        queue_timeout: float = 30.0,
+        failure_threshold: int = 5,
+        recovery_seconds: float = 30.0,
+        hedged_providers: Optional[Set[str]] = None,
+        hedge_min_samples: int = 20,
+    ):
+        self.limits = limits or {}
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.hedged_providers = hedged_providers or set()
+        self.hedge_min_samples = hedge_min_samples
+        self._lanes: Dict[Tuple[str, str], ProviderLane] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyWindow] = {}
+
+    def lane(self, provider: str, api_key: Optional[str] = None) -> ProviderLane:
+        # API keys are only kept as a short digest
+        key_id = hashlib.sha256(api_key.encode()).hexdigest()[:8] if api_key else "default"
+        lane = self._lanes.get((provider, key_id))
+        if lane is None:
+            lane = ProviderLane(provider, self.limits.get(provider, ProviderLimits()), self.queue_timeout)
+            self._lanes[(provider, key_id)] = lane
+        return lane
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider, self.failure_threshold, self.recovery_seconds)
+            self._breakers[provider] = breaker
+        return breaker
+
+    def latency(self, provider: str) -> LatencyWindow:
+        return self._latency.setdefault(provider, LatencyWindow())
+
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Seconds after which a duplicate call is worth starting, or None to not hedge"""
+        window = self.latency(provider)
+        if provider not in self.hedged_providers or len(window) < self.hedge_min_samples:
+            return None
+        if self.breaker(provider).state != CircuitBreaker.CLOSED:
+            return None
+        return window.percentile(HEDGE_PERCENTILE)
+
+    @asynccontextmanager
+    async def slot(
+        self, provider: str, api_key: Optional[str] = None, timeout: Optional[float] = None
+    ) -> AsyncIterator[ProviderPermit]:
+        """
+        Hold a slot for one call to `provider`. Exceptions carrying an HTTP
+        status are fed to the lane; a 429 becomes ProviderRateLimitedException.
+        Timeouts, connection errors and 5xx count against the breaker, which
+        raises ProviderUnavailableException here while it is open.
+        """
+        breaker = self.breaker(provider)
+        probe = breaker.admit()
+        lane = self.lane(provider, api_key)
+        try:
+            await lane.acquire(timeout)
+        except BaseException:
+            breaker.abandon(probe)
+            raise
+        permit = ProviderPermit(lane)
+        started = time.monotonic()
+        try:
+            yield permit
+        except ProviderRateLimitedException:
+            # Throttled, but the upstream is answering
+            breaker.record(probe, failed=False)
+            raise
+        except Exception as e:
+            code = status_of(e)
+            breaker.record(probe, failed=is_outage(code, e))
+            lane.observe(code, e)
+            raise
+        except BaseException:
+            breaker.abandon(probe)
+            raise
+        finally:
+            lane.release()
+        failed = is_outage(permit.status_code)
+        breaker.record(probe, failed=failed)
+        if not failed:
+            self.latency(provider).add(time.monotonic() - started)
+        if not permit.reported:
+            lane.on_success()
+
+    def stats(self) -> dict:
+        return {f"{provider}:{key_id}": lane.stats() for (provider, key_id), lane in self._lanes.items()}
+
+    def breaker_stats(self) -> dict:
+        stats = {}
+        for provider, breaker in self._breakers.items():
+            window = self.latency(provider)
+            p95 = window.percentile(HEDGE_PERCENTILE)
+            stats[provider] = {
+                **breaker.stats(),
+                "latency_p95_seconds": round(p95, 3) if p95 is not None else None,
+                "hedge_delay_seconds": self.hedge_delay(provider),
+            }
+        return stats
+
+
+def limits_from_settings() -> Dict[str, ProviderLimits]:
+    concurrency = parse_int_mapping(settings.PROVIDER_MAX_CONCURRENCY)
+    rates = parse_int_mapping(settings.PROVIDER_RATE_PER_MINUTE)
+    bursts = parse_int_mapping(settings.PROVIDER_BURST)
+    return {
+        provider: ProviderLimits(concurrency.get(provider), rates.get(provider), bursts.get(provider))
+        for provider in {*concurrency, *rates}
+    }
+
+
+_governor: Optional[ProviderGovernor] = None
+
+
+def get_provider_governor() -> ProviderGovernor:
+    """Get the application provider governor"""
+    global _governor
+    if _governor is None:
+        _governor = ProviderGovernor(
+            limits_from_settings(),
+            queue_timeout=settings.PROVIDER_QUEUE_TIMEOUT_SECONDS,
+            failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            recovery_seconds=settings.CIRCUIT_BREAKER_RECOVERY_SECONDS,
+            hedged_providers={name.strip().lower() for name in settings.PROVIDER_HEDGE.split(",") if name.strip()},
+            hedge_min_samples=settings.PROVIDER_HEDGE_MIN_SAMPLES,
+        )
+    return _governor
@@ -0,0 +1,242 @@
+"""
+Shared outbound HTTP connection pool for all external service providers.
+
+A single pool is created in the FastAPI lifespan and reused by every provider,
+so DNS lookups, TCP connections and TLS handshakes are paid once per host
+instead of once per request. Known provider hosts get a dedicated client with
+its own connection limit; every other host shares a bounded default client.
+"""
+import importlib.util
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.config import settings
+from src.utils.common import parse_int_mapping
+
+# HTTP/2 needs the optional `h2` package (installed with `httpx[http2]`)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Hosts that get a dedicated connection pool, mapped to their connection limit.
+# Entries in HTTP_POOL_HOST_LIMITS ("host=limit,host=limit") override these.
+DEFAULT_HOST_LIMITS: Dict[str, int] = {
+    "api.kling.ai": 20,
+    "catcontainer.calmpebble-9c79c8f4.westus3.azurecontainerapps.io": 8,
+    "gateway.appypie.com": 10,
+}
+
+DEFAULT_POOL_KEY = "*"
+
+
+@dataclass
+class HostPoolStats:
+    """
+    Utilisation counters for a single host pool
+    """
+    max_connections: int
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        completed = self.requests - self.in_flight
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilisation": round(self.in_flight / self.max_connections, 3) if self.max_connections else 0.0,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_seconds / completed * 1000, 1) if completed > 0 else None,
+        }
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """
+    Response body wrapper that reports back when the connection is released
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    Transport wrapper counting in-flight requests until their body is closed
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: HostPoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        started = time.monotonic()
+
+        def release() -> None:
+            stats.in_flight -= 1
+            stats.total_seconds += time.monotonic() - started
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            release()
+            raise
+
+        if response.status_code >= 500:
+            stats.errors += 1
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_MeteredStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class HTTPClientPool:
+    """
+    App-scoped set of keep-alive HTTP clients, one per configured provider host
+    """
+
+    def __init__(
+        self,
+        host_limits: Optional[Dict[str, int]] = None,
+        default_max_connections: int = settings.HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive: int = settings.HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+        http2: bool = settings.HTTP_POOL_HTTP2,
+        timeout: float = settings.HTTP_POOL_TIMEOUT,
+        transport_factory: Optional[Callable[[httpx.Limits, bool], httpx.AsyncBaseTransport]] = None,
+    ):
+        self.host_limits = host_limits if host_limits is not None else {
+            **DEFAULT_HOST_LIMITS,
+            **parse_int_mapping(settings.HTTP_POOL_HOST_LIMITS),
+        }
+        self.default_max_connections = default_max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = timeout
+        self._transport_factory = transport_factory or self._default_transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, HostPoolStats] = {}
+        self._closed = False
+
+    @staticmethod
+    def _default_transport(limits: httpx.Limits, http2: bool) -> httpx.AsyncBaseTransport:
+        return httpx.AsyncHTTPTransport(limits=limits, http2=http2, retries=1)
+
+    def _pool_key(self, url: str) -> str:
+        host = (urlsplit(url).hostname or "").lower()
+        return host if host in self.host_limits else DEFAULT_POOL_KEY
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client responsible for the host of `url`
+        """
+        if self._closed:
+            raise RuntimeError("HTTP client pool is closed")
+
+        key = self._pool_key(url)
+        client = self._clients.get(key)
+        if client is None:
+            max_connections = self.host_limits.get(key, self.default_max_connections)
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(self.max_keepalive, max_connections),
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            stats = HostPoolStats(max_connections=max_connections)
+            transport = _MeteredTransport(self._transport_factory(limits, self.http2), stats)
+            client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+            self._clients[key] = client
+            self._stats[key] = stats
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the pool and return the fully read response
+        """
+        return await self.client_for(url).request(method, url, **kwargs)
+
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        Open a streaming request through the pool (use with `async with`)
+        """
+        return self.client_for(url).stream(method, url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Pool utilisation metrics per host
+        """
+        return {
+            "http2": self.http2,
+            "hosts": {key: stats.as_dict() for key, stats in self._stats.items()},
+        }
+
+    async def aclose(self) -> None:
+        self._closed = True
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+_pool: Optional[HTTPClientPool] = None
+
+
+async def init_http_pool() -> HTTPClientPool:
+    """
+    Create the application-wide pool (called from the FastAPI lifespan)
+    """
+    global _pool
+    if _pool is None:
+        _pool = HTTPClientPool()
+    return _pool
+
+
+async def close_http_pool() -> None:
+    """
+    Close every pooled connection (called from the FastAPI lifespan)
+    """
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
+
+
+def get_http_pool() -> HTTPClientPool:
+    """
+    Get the application-wide pool, creating it lazily outside the app lifespan
+    (scripts, tests)
+    """
+    global _pool
+    if _pool is None:
+        _pool = HTTPClientPool()
+    return _pool
@@ -1,13 +1,25 @@
 import json
+import logging
+import time
 import httpx
 import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from datetime import datetime
+from fastapi import HTTPException
+
+from ..config import settings
+from .governor import get_provider_governor
+from .http_pool import HTTPClientPool, get_http_pool
+
+logger = logging.getLogger(__name__)
 
 # Constants for Kling AI API
 KLING_API_BASE_URL = "https://api.kling.ai"
 KLING_IMAGE_GEN_ENDPOINT = "/v1/images/generations"
+KLING_TERMINAL_STATUSES = ("succeed", "failed")
+KLING_TIMEOUT = httpx.Timeout(30, connect=settings.PROVIDER_CONNECT_TIMEOUT_SECONDS)
 
 class KlingImageRequest(BaseModel):
     """
@@ -21,6 +33,7 @@ class KlingImageRequest(BaseModel):
     size: Optional[str] = "1024x1024"
     response_format: Optional[str] = "url"
     aspect_ratio: Optional[str] = "9:16"
+    callback_url: Optional[str] = None
 
 class KlingTaskResponse(BaseModel):
     """
@@ -63,22 +76,280 @@ class KlingImageResponse(BaseModel):
     created_at: int
     updated_at: int
 
-async def generate_image_with_kling(request: KlingImageRequest, access_token: str) -> KlingImageResponse:
+@dataclass
+class _TrackedTask:
+    """
+    Outstanding Kling task and the future its waiters are parked on
+    """
+    task_id: str
+    access_token: str
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.monotonic)
+    next_poll_at: float = 0.0
+    polls: int = 0
+
+
+class KlingTaskTracker:
+    """
+    Central tracker resolving Kling tasks for every in-flight generation.
+
+    A single background loop polls all outstanding tasks: when several tasks
+    of the same account are due it lists recent tasks in one request and only
+    falls back to per-task status checks for tasks missing from that page.
+    The first check for a task is scheduled around the observed median
+    completion time, later checks back off exponentially. Webhook callbacks
+    resolve tasks directly without any polling.
+    """
+
+    def __init__(
+        self,
+        http_pool: Optional[HTTPClientPool] = None,
+        min_interval: float = 1.0,
+        max_interval: float = 15.0,
+        list_page_size: int = 100,
+        history_size: int = 200,
+    ):
+        self._http_pool = http_pool
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.list_page_size = list_page_size
+        self._tasks: Dict[str, _TrackedTask] = {}
+        self._durations: deque = deque(maxlen=history_size)
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self.status_requests = 0
+
+    @property
+    def http_pool(self) -> HTTPClientPool:
+        return self._http_pool or get_http_pool()
+
+    def completion_percentile(self, percentile: float) -> Optional[float]:
+        """Observed task completion time (seconds) at the given percentile"""
+        if not self._durations:
+            return None
+        ordered = sorted(self._durations)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def _poll_delay(self, task: _TrackedTask) -> float:
+        if task.polls == 0:
+            # Don't bother asking before a typical task could have finished
+            median = self.completion_percentile(50)
+            delay = median * 0.8 if median is not None else self.min_interval
+        else:
+            delay = self.min_interval * (2 ** (task.polls - 1))
+            p90 = self.completion_percentile(90)
+            if p90 is not None and time.monotonic() - task.submitted_at < p90:
+                # Still inside the normal completion window: check at the regular cadence
+                delay = self.min_interval
+        return max(self.min_interval, min(self.max_interval, delay))
+
+    def track(self, task_id: str, access_token: str) -> asyncio.Future:
+        """
+        Start tracking a submitted task and return the future resolved with its final status data
+        """
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = _TrackedTask(
+                task_id=task_id,
+                access_token=access_token,
+                future=asyncio.get_running_loop().create_future(),
+            )
+            task.next_poll_at = time.monotonic() + self._poll_delay(task)
+            self._tasks[task_id] = task
+            if self._loop_task is None or self._loop_task.done():
+                self._loop_task = asyncio.create_task(self._run())
+            self._wakeup.set()
+        return task.future
+
+    async def wait(self, task_id: str, access_token: str, timeout: float = 300) -> Dict[str, Any]:
+        """
+        Wait for a task to reach a terminal status and return its status data
+        """
+        future = self.track(task_id, access_token)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._tasks.pop(task_id, None)
+            raise ValueError("Task timed out")
+
+    def resolve(self, task_data: Dict[str, Any]) -> bool:
+        """
+        Apply a task status payload (from a poll or a webhook callback).
+        Returns True if it resolved an outstanding task.
+        """
+        task = self._tasks.get(task_data.get("task_id"))
+        if task is None:
+            return False
+
+        if task_data.get("task_status") not in KLING_TERMINAL_STATUSES:
+            task.polls += 1
+            task.next_poll_at = time.monotonic() + self._poll_delay(task)
+            return False
+
+        del self._tasks[task.task_id]
+        self._durations.append(time.monotonic() - task.submitted_at)
+        if not task.future.done():
+            task.future.set_result(task_data)
+        return True
+
+    def _fail(self, task: _TrackedTask, error: Exception) -> None:
+        self._tasks.pop(task.task_id, None)
+        if not task.future.done():
+            task.future.set_exception(error)
+
+    async def _get(self, url: str) -> Dict[str, Any]:
+        self.status_requests += 1
+        response = await self.http_pool.request("GET", url, timeout=KLING_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code") != 0:
+            raise ValueError(f"Status check failed: {data.get('message')}")
+        return data
+
+    async def _poll_one(self, task: _TrackedTask) -> None:
+        api_url = f"{KLING_API_BASE_URL}{KLING_IMAGE_GEN_ENDPOINT}"
+        try:
+            status_data = await self._get(f"{api_url}/{task.task_id}?access_token={task.access_token}")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 and e.response.status_code != 429:
+                self._fail(task, ValueError(f"Kling AI API error: {e}"))
+                return
+            self._backoff(task)
+            return
+        except (httpx.RequestError, json.JSONDecodeError):
+            self._backoff(task)
+            return
+        except ValueError as e:
+            self._fail(task, e)
+            return
+        self.resolve(status_data["data"])
+
+    async def _poll_account(self, access_token: str, tasks: List[_TrackedTask]) -> None:
+        pending = list(tasks)
+        if len(pending) > 1:
+            api_url = f"{KLING_API_BASE_URL}{KLING_IMAGE_GEN_ENDPOINT}"
+            try:
+                page = await self._get(
+                    f"{api_url}?access_token={access_token}&pageNum=1&pageSize={self.list_page_size}"
+                )
+                seen = set()
+                for task_data in page.get("data") or []:
+                    if task_data.get("task_id") in self._tasks:
+                        seen.add(task_data["task_id"])
+                        self.resolve(task_data)
+                pending = [task for task in pending if task.task_id not in seen]
+            except (httpx.HTTPError, json.JSONDecodeError, ValueError) as e:
+                logger.warning(f"Kling task list failed, checking tasks individually: {e}")
+        results = await asyncio.gather(*(self._poll_one(task) for task in pending), return_exceptions=True)
+        self._backoff_failed(pending, results)
+
+    def _backoff(self, task: _TrackedTask) -> None:
+        task.polls += 1
+        task.next_poll_at = time.monotonic() + self._poll_delay(task)
+
+    def _backoff_failed(self, tasks: List[_TrackedTask], results: List[Any]) -> None:
+        """Back off tasks whose check raised unexpectedly, so one bad poll can't stop the loop"""
+        for task, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                logger.error("Kling status check for task %s failed: %r", task.task_id, result)
+                if task.task_id in self._tasks:
+                    self._backoff(task)
+
+    async def _run(self) -> None:
+        while self._tasks:
+            now = time.monotonic()
+            due: Dict[str, List[_TrackedTask]] = defaultdict(list)
+            for task in list(self._tasks.values()):
+                if task.future.done():
+                    # All waiters gave up
+                    self._tasks.pop(task.task_id, None)
+                elif task.next_poll_at <= now:
+                    due[task.access_token].append(task)
+
+            if due:
+                results = await asyncio.gather(
+                    *(self._poll_account(token, tasks) for token, tasks in due.items()), return_exceptions=True
+                )
+                for tasks, result in zip(due.values(), results):
+                    self._backoff_failed(tasks, [result] * len(tasks))
+                continue
+
+            if not self._tasks:
+                break
+            self._wakeup.clear()
+            next_poll_at = min(task.next_poll_at for task in self._tasks.values())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, next_poll_at - now))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding": len(self._tasks),
+            "status_requests": self.status_requests,
+            "p50_seconds": self.completion_percentile(50),
+            "p90_seconds": self.completion_percentile(90),
+        }
+
+    async def close(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        for task in list(self._tasks.values()):
+            self._fail(task, ValueError("Kling task tracker stopped"))
+
+
+_tracker: Optional[KlingTaskTracker] = None
+
+
+def get_kling_tracker() -> KlingTaskTracker:
+    """
+    Get the application-wide Kling task tracker
+    """
+    global _tracker
+    if _tracker is None:
+        _tracker = KlingTaskTracker()
+    return _tracker
+
+
+async def close_kling_tracker() -> None:
+    """
+    Stop the application-wide Kling task tracker (called from the FastAPI lifespan)
+    """
+    global _tracker
+    if _tracker is not None:
+        await _tracker.close()
+        _tracker = None
+
+
+async def generate_image_with_kling(
+    request: KlingImageRequest,
+    access_token: str,
+    http_pool: Optional[HTTPClientPool] = None,
+    tracker: Optional[KlingTaskTracker] = None,
+) -> KlingImageResponse:
     """
     Generate image using Kling AI API with two-step process:
     1. Submit task and get task_id
-    2. Poll for task completion and get images
+    2. Wait for the task tracker to report completion and get images
     """
     api_url = f"{KLING_API_BASE_URL}{KLING_IMAGE_GEN_ENDPOINT}"
+    if settings.KLING_CALLBACK_URL and not request.callback_url:
+        request = request.model_copy(update={"callback_url": settings.KLING_CALLBACK_URL})
     payload = request.model_dump(exclude_none=True)
+    client = (http_pool or get_http_pool()).client_for(api_url)
+    tracker = tracker or get_kling_tracker()
 
-    async with httpx.AsyncClient() as client:
-        try:
+    try:
+        # Kling bounds concurrent tasks per account, so the slot covers the whole task
+        async with get_provider_governor().slot("kling", access_token):
             # Step 1: Submit task
             response = await client.post(
                 f"{api_url}?access_token={access_token}",
                 json=payload,
-                timeout=30
+                timeout=KLING_TIMEOUT
             )
             response.raise_for_status()
             task_data = response.json()
@@ -89,51 +360,31 @@ async def generate_image_with_kling(request: KlingImageRequest, access_token: st
             task_id = task_data["data"]["task_id"]
             created_at = task_data["data"]["created_at"]
 
-            # Step 2: Poll for task completion
-            max_attempts = 30  # Maximum number of polling attempts
-            poll_interval = 2  # Seconds between polling attempts
+            # Step 2: Wait for completion (resolved by the shared poll loop or a webhook)
+            status_data = await tracker.wait(task_id, access_token, timeout=settings.KLING_TASK_TIMEOUT_SECONDS)
+            task_status = status_data["task_status"]
 
-            for _ in range(max_attempts):
-                status_response = await client.get(
-                    f"{api_url}/{task_id}?access_token={access_token}",
-                    timeout=30
-                )
-                status_response.raise_for_status()
-                status_data = status_response.json()
-
-                if status_data.get("code") != 0:
-                    raise ValueError(f"Status check failed: {status_data.get('message')}")
-
-                task_status = status_data["data"]["task_status"]
-                updated_at = status_data["data"]["updated_at"]
-
-                if task_status == "failed":
-                    raise ValueError(f"Task failed: {status_data['data'].get('task_status_msg', 'Unknown error')}")
-                
-                if task_status == "succeed":
-                    # Extract image URLs from task_result
-                    images = []
-                    if "task_result" in status_data["data"] and "images" in status_data["data"]["task_result"]:
-                        for image_info in status_data["data"]["task_result"]["images"]:
-                            images.append(image_info["url"])
-                    
-                    return KlingImageResponse(
-                        task_id=task_id,
-                        images=images,
-                        status=task_status,
-                        created_at=created_at,
-                        updated_at=updated_at
-                    )
-
-                await asyncio.sleep(poll_interval)
+            if task_status == "failed":
+                raise ValueError(f"Task failed: {status_data.get('task_status_msg', 'Unknown error')}")
 
-            raise ValueError("Task timed out")
+        # Extract image URLs from task_result
+        images = [image_info["url"] for image_info in (status_data.get("task_result") or {}).get("images", [])]
 
-        except httpx.HTTPStatusError as e:
-            raise ValueError(f"Kling AI API error: {e}")
-        except httpx.RequestError as e:
-            raise ValueError("Failed to connect to Kling AI API")
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON response from Kling AI API")
-        except Exception as e:
-            raise ValueError(f"An unexpected error occurred: {e}")
+        return KlingImageResponse(
+            task_id=task_id,
+            images=images,
+            status=task_status,
+            created_at=created_at,
+            updated_at=status_data.get("updated_at", created_at)
+        )
+
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
+        raise ValueError(f"Kling AI API error: {e}")
+    except httpx.RequestError as e:
+        raise ValueError("Failed to connect to Kling AI API")
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON response from Kling AI API")
+    except Exception as e:
+        raise ValueError(f"An unexpected error occurred: {e}")
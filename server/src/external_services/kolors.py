@@ -0,0 +1,129 @@
+"""
+Kolors virtual try-on (Kling AI, through the Appy Pie gateway)
+"""
+import asyncio
+import time
+from typing import List, Optional
+from pydantic import BaseModel
+import httpx
+from fastapi import HTTPException
+
+from ..config import settings
+from .governor import get_provider_governor
+from .http_pool import HTTPClientPool, get_http_pool
+
+KOLORS_TRYON_URL = "https://gateway.appypie.com/kling-ai-vton/v1/getVirtualTryOnTask"
+KOLORS_STATUS_URL = "https://gateway.appypie.com/kling-ai-polling/v1/getVirtualTryOnStatus"
+KOLORS_TERMINAL_STATUSES = ("succeed", "failed")
+KOLORS_POLL_INTERVAL_SECONDS = 3
+KOLORS_TIMEOUT = httpx.Timeout(30, connect=settings.PROVIDER_CONNECT_TIMEOUT_SECONDS)
+
+
+class KolorsTryOnRequest(BaseModel):
+    """
+    Request model for Kolors virtual try-on; images are URLs or raw base64
+    """
+    human_image: str
+    cloth_image: str
+    callback_url: str = ""
+
+
+class KolorsTaskStatus(BaseModel):
+    """
+    State of a Kolors try-on task
+    """
+    task_id: str
+    task_status: str
+    task_status_msg: Optional[str] = None
+    result_images: List[str] = []
+
+
+class KolorsTryOnResponse(BaseModel):
+    """
+    Response model for a completed Kolors virtual try-on
+    """
+    task_id: str
+    result_images: List[str]
+    logs: List[str]
+
+
+def _headers(api_key: str) -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Cache-Control": "no-cache",
+        "Ocp-Apim-Subscription-Key": api_key,
+    }
+
+
+async def _post(url: str, payload: dict, api_key: str, http_pool: Optional[HTTPClientPool]) -> dict:
+    # One slot per HTTP call: a task that sits in the queue for minutes
+    # must not hold a concurrency permit between polls
+    async with get_provider_governor().slot("kolors", api_key):
+        response = await (http_pool or get_http_pool()).request(
+            "POST", url, headers=_headers(api_key), json=payload, timeout=KOLORS_TIMEOUT
+        )
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {}
+        if response.status_code != 200 or response_data.get("code") != 0:
+            # Let the governor see the upstream status (429 throttling, 5xx outages)
+            response.raise_for_status()
+            raise ValueError(response_data.get("message", "Kolors API error"))
+        return response_data["data"]
+
+
+async def submit_try_on(
+    request: KolorsTryOnRequest, api_key: str, http_pool: Optional[HTTPClientPool] = None
+) -> str:
+    """
+    Submit a try-on task and return its task id
+    """
+    data = await _post(KOLORS_TRYON_URL, request.model_dump(), api_key, http_pool)
+    return data["task_id"]
+
+
+async def get_try_on_status(
+    task_id: str, api_key: str, http_pool: Optional[HTTPClientPool] = None
+) -> KolorsTaskStatus:
+    """
+    Fetch the current state of a try-on task
+    """
+    data = await _post(KOLORS_STATUS_URL, {"task_id": task_id}, api_key, http_pool)
+    images = (data.get("task_result") or {}).get("images", [])
+    return KolorsTaskStatus(
+        task_id=task_id,
+        task_status=data["task_status"],
+        task_status_msg=data.get("task_status_msg"),
+        result_images=[image["url"] for image in images],
+    )
+
+
+async def virtual_try_on(
+    request: KolorsTryOnRequest, api_key: str, http_pool: Optional[HTTPClientPool] = None
+) -> KolorsTryOnResponse:
+    """
+    Perform virtual try-on with Kolors and wait for the result
+    """
+    try:
+        task_id = await submit_try_on(request, api_key, http_pool)
+        logs = [f"Submitted Kolors task {task_id}"]
+
+        deadline = time.monotonic() + settings.KOLORS_TASK_TIMEOUT_SECONDS
+        while True:
+            await asyncio.sleep(KOLORS_POLL_INTERVAL_SECONDS)
+            status = await get_try_on_status(task_id, api_key, http_pool)
+            if status.task_status in KOLORS_TERMINAL_STATUSES:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Kolors task {task_id} did not finish in time")
+
+        if status.task_status == "failed":
+            raise ValueError(f"Task failed: {status.task_status_msg or 'Unknown error'}")
+        logs.append(f"Kolors task {task_id} finished")
+        return KolorsTryOnResponse(task_id=task_id, result_images=status.result_images, logs=logs)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise ValueError(f"Kolors virtual try-on error: {str(e)}")
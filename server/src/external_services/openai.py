@@ -6,6 +6,7 @@ from openai import AsyncOpenAI, BadRequestError
 from fastapi import HTTPException
 
 from src.config.settings import OPENAI_API_KEY
+from .governor import get_provider_governor
 
 client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
@@ -21,33 +22,36 @@ async def analyze_image(image_url: str) -> str:
         print(f"Analyzing image. Format: {'base64' if image_url.startswith('data:') else 'url'}")
         print(f"Image data length: {len(image_url)}")
         
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Describe this clothing item in detail, focusing on its style, color, pattern, material, and any distinctive features. Keep the description concise but comprehensive."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                'url': image_url
+        async with get_provider_governor().slot("openai"):
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": "Describe this clothing item in detail, focusing on its style, color, pattern, material, and any distinctive features. Keep the description concise but comprehensive."
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    'url': image_url
+                                }
                             }
-                        }
-                    ],
-                }
-            ],
-            max_tokens=800
-        )
+                        ],
+                    }
+                ],
+                max_tokens=800
+            )
         
         # Extract the description from the response
         description = response.choices[0].message.content.strip()
         print(f"Generated description: {description}")
         return description
 
+    except HTTPException:
+        raise
     except BadRequestError as e:
         print(f"OpenAI BadRequestError: {str(e)}")
         raise HTTPException(
@@ -74,33 +78,36 @@ async def generate_campaign(image_url: str, prompt: str) -> str:
         print(f"Generating campaign for prompt: {prompt}")
         print(f"Image data length: {len(image_url)}")
         
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Generate a creative and engaging campaign for this clothing item. The campaign theme is: {prompt}. Focus on highlighting the unique features and appeal of the garment. The campaign should be catchy, memorable, and suitable for marketing purposes."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                'url': image_url
+        async with get_provider_governor().slot("openai"):
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": f"Generate a creative and engaging campaign for this clothing item. The campaign theme is: {prompt}. Focus on highlighting the unique features and appeal of the garment. The campaign should be catchy, memorable, and suitable for marketing purposes."
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    'url': image_url
+                                }
                             }
-                        }
-                    ],
-                }
-            ],
-            max_tokens=1000
-        )
+                        ],
+                    }
+                ],
+                max_tokens=1000
+            )
         
         # Extract the campaign content from the response
         campaign_content = response.choices[0].message.content.strip()
         print(f"Generated campaign: {campaign_content}")
         return campaign_content
 
+    except HTTPException:
+        raise
     except BadRequestError as e:
         print(f"OpenAI BadRequestError: {str(e)}")
         raise HTTPException(
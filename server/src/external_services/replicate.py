@@ -1,6 +1,14 @@
+import asyncio
+import os
 import replicate
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
 from pydantic import BaseModel
+from fastapi import HTTPException
+from ..config import settings
+from ..utils.result_cache import GENERATED_IMAGES_URL_PREFIX, ResultCache, get_result_cache, make_cache_key
+from .governor import get_provider_governor
+from .http_pool import get_http_pool
 
 class ReplicateImageRequest(BaseModel):
     """
@@ -9,6 +17,7 @@ class ReplicateImageRequest(BaseModel):
     prompt: str
     guidance: Optional[float] = 3.5
     num_outputs: Optional[int] = 1
+    seed: Optional[int] = None
 
 class ReplicateImageResponse(BaseModel):
     """
@@ -17,42 +26,155 @@ class ReplicateImageResponse(BaseModel):
     task_id: str
     images: List[str]
 
+class ReplicateProgress(BaseModel):
+    """
+    Progress update for a running Replicate prediction
+    """
+    prediction_id: str
+    status: str
+    percentage: Optional[float] = None
+
+ReplicateProgressCallback = Callable[[ReplicateProgress], Awaitable[None]]
+
 # Available Replicate models
 REPLICATE_MODELS = {
     "flux-dev": "black-forest-labs/flux-dev"
 }
 
-async def generate_image_with_replicate(request: ReplicateImageRequest, api_token: str) -> ReplicateImageResponse:
+REPLICATE_TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+# One client per API token; each keeps its own keep-alive connection pool
+_clients: Dict[str, replicate.Client] = {}
+
+
+def get_replicate_client(api_token: str) -> replicate.Client:
     """
-    Generate image using Replicate API
+    Get the shared Replicate client for an API token
     """
-    try:
-        # Configure Replicate client with API token
+    client = _clients.get(api_token)
+    if client is None:
         client = replicate.Client(api_token=api_token)
+        _clients[api_token] = client
+    return client
 
-        # Run the model
-        output = client.run(
-            REPLICATE_MODELS["flux-dev"],
-            input={
-                "prompt": request.prompt,
-                "guidance_scale": request.guidance,
-                "num_outputs": request.num_outputs
-            }
-        )
 
-        # Convert FileOutput objects to URLs
+async def run_replicate_prediction(
+    model: str,
+    model_input: Dict[str, Any],
+    api_token: str,
+    poll_interval: float = 1.0,
+    on_progress: Optional[ReplicateProgressCallback] = None,
+) -> Any:
+    """
+    Run a Replicate prediction without blocking the event loop and return its
+    output. `on_progress` is awaited whenever the status or progress changes.
+    If the caller is cancelled the prediction is cancelled upstream as well,
+    so no GPU time is wasted.
+    """
+    client = get_replicate_client(api_token)
+    prediction = await client.predictions.async_create(model=model, input=model_input)
+    last: Optional[ReplicateProgress] = None
+    try:
+        while True:
+            if on_progress is not None:
+                progress = prediction.progress
+                update = ReplicateProgress(
+                    prediction_id=prediction.id,
+                    status=prediction.status,
+                    percentage=progress.percentage if progress else None,
+                )
+                if update != last:
+                    last = update
+                    await on_progress(update)
+
+            if prediction.status in REPLICATE_TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(poll_interval)
+            await prediction.async_reload()
+    except asyncio.CancelledError:
+        await asyncio.shield(client.predictions.async_cancel(prediction.id))
+        raise
+
+    if prediction.status != "succeeded":
+        raise ValueError(f"Prediction {prediction.status}: {prediction.error or 'Unknown error'}")
+
+    return prediction.output
+
+
+async def store_replicate_outputs(cache: ResultCache, key: str, urls: List[str]) -> List[str]:
+    """
+    Copy prediction outputs into our own storage. replicate.delivery links
+    expire about an hour after the prediction, so cached results must not
+    point at them. Returns the stored objects' keys.
+    """
+    http_pool = get_http_pool()
+    names = []
+    for index, url in enumerate(urls):
+        response = await http_pool.request("GET", url)
+        response.raise_for_status()
+        extension = os.path.splitext(urlparse(url).path)[1].lstrip(".").lower() or "webp"
+        name = cache.name_for(f"replicate-{index}", key, extension)
+        await cache.storage.put(name, response.content, response.headers.get("content-type"))
+        names.append(name)
+    return names
+
+
+async def generate_image_with_replicate(
+    request: ReplicateImageRequest,
+    api_token: str,
+    on_progress: Optional[ReplicateProgressCallback] = None,
+) -> ReplicateImageResponse:
+    """
+    Generate image using Replicate API, reporting prediction progress to `on_progress`
+    """
+    try:
+        model_input = {
+            "prompt": request.prompt,
+            "guidance_scale": request.guidance,
+            "num_outputs": request.num_outputs
+        }
+        if request.seed is not None:
+            model_input["seed"] = request.seed
+
+        # Only seeded generations are reproducible, so only those are cached
+        cache = get_result_cache()
+        cache_key = make_cache_key(REPLICATE_MODELS["flux-dev"], [], model_input)
+        use_cache = settings.RESULT_CACHE_ENABLED and request.seed is not None
+        if use_cache:
+            cached = await cache.get(cache_key)
+            if cached and cached.files:
+                return ReplicateImageResponse(
+                    task_id=f"replicate_{cache_key[:16]}",
+                    images=[GENERATED_IMAGES_URL_PREFIX + name for name in cached.files]
+                )
+
+        # Run the model as an async prediction
+        async with get_provider_governor().slot("replicate", api_token):
+            output = await run_replicate_prediction(
+                REPLICATE_MODELS["flux-dev"], model_input, api_token, on_progress=on_progress
+            )
+
+        # Convert outputs to URLs
         image_urls = []
         outputs = output if isinstance(output, list) else [output]
         for item in outputs:
-            # Get the URL from the FileOutput object
-            url = str(item) if hasattr(item, '__str__') else None
-            if url and url.endswith('.webp'):
+            # Outputs are URL strings (or FileOutput objects that render as URLs)
+            url = str(item) if item is not None else None
+            if url and url.startswith(("https://", "http://", "data:")):
                 image_urls.append(url)
 
+        if use_cache and image_urls:
+            # Serve the stored copies so the result outlives Replicate's links
+            names = await store_replicate_outputs(cache, cache_key, image_urls)
+            await cache.put(cache_key, files=names)
+            image_urls = [GENERATED_IMAGES_URL_PREFIX + name for name in names]
+
         return ReplicateImageResponse(
-            task_id=f"replicate_{hash(request.prompt) % 10000:04d}",
+            task_id=f"replicate_{cache_key[:16]}",
             images=image_urls
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise ValueError(f"Replicate API error: {str(e)}")
@@ -0,0 +1,171 @@
+"""
+Failure isolation for outbound provider calls.
+
+A circuit breaker per provider stops sending traffic to an upstream that keeps
+timing out or answering 5xx: after `failure_threshold` consecutive failures it
+opens and calls fail immediately with 503 for `recovery_seconds`, then a
+single half-open probe decides whether to close it again. Latency windows
+feed hedged requests, which start a duplicate call once the first one has
+been running longer than the provider's recent p95.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+import httpx
+from fastapi import HTTPException, status
+
+T = TypeVar("T")
+
+# Recent successful call durations kept per provider for the hedge delay
+LATENCY_SAMPLE_SIZE = 256
+HEDGE_PERCENTILE = 0.95
+
+
+class ProviderUnavailableException(HTTPException):
+    """Exception raised while a provider's circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        self.provider = provider
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{provider} is currently unavailable, try again shortly",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
+def is_outage(status_code: Optional[int], error: Optional[BaseException] = None) -> bool:
+    """Whether a call outcome says the upstream itself is down or overloaded"""
+    if status_code is not None:
+        return status_code >= 500
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one provider"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        provider: str,
+        failure_threshold: int = 5,
+        recovery_seconds: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    @property
+    def allows_calls(self) -> bool:
+        """Whether a call now would reach the upstream (closed, or due for a probe)"""
+        return self.state != self.OPEN or time.monotonic() >= self.opened_at + self.recovery_seconds
+
+    def admit(self) -> bool:
+        """
+        Let a call through or raise ProviderUnavailableException
+        Returns:
+            bool: True when the call is a half-open probe
+        """
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.recovery_seconds - time.monotonic()
+            if remaining > 0:
+                self.short_circuited += 1
+                raise ProviderUnavailableException(self.provider, remaining)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.short_circuited += 1
+                raise ProviderUnavailableException(self.provider, 1)
+            self._probes += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: bool) -> None:
+        if probe:
+            self._probes -= 1
+        if not failed:
+            self.consecutive_failures = 0
+            if probe:
+                self.state = self.CLOSED
+            return
+        self.consecutive_failures += 1
+        if probe or self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def abandon(self, probe: bool) -> None:
+        """The call was cancelled or never sent, so it says nothing about the upstream"""
+        if probe:
+            self._probes -= 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class LatencyWindow:
+    """Durations of recent successful calls"""
+
+    def __init__(self, size: int = LATENCY_SAMPLE_SIZE):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+async def hedged(call: Callable[[int], Awaitable[T]], delay: Optional[float]) -> T:
+    """
+    Await call(0); if it is still running after `delay` seconds, start
+    call(1) as well and return whichever succeeds first, cancelling the other.
+    A failing hedge never masks the primary call's own result or error.
+    Args:
+        call: Makes one attempt; receives 0 for the primary and 1 for the hedge
+        delay: Seconds before hedging, or None to never hedge
+    """
+    if delay is None:
+        return await call(0)
+
+    primary = asyncio.ensure_future(call(0))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(call(1)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
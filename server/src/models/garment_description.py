@@ -0,0 +1,16 @@
+"""
+Garment description model for the application
+"""
+from tortoise import fields, models
+
+class GarmentDescription(models.Model):
+    """GPT-4o description of a garment image, keyed by the SHA-256 of the image sent for analysis"""
+    image_hash = fields.CharField(max_length=64, pk=True)
+    description = fields.TextField()
+    model = fields.CharField(max_length=50)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    expires_at = fields.DatetimeField(null=True, db_index=True)
+
+    class Meta:
+        table = "garment_descriptions"
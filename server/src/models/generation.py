@@ -0,0 +1,43 @@
+"""
+Generation history models for the application
+"""
+from tortoise import fields, models
+from uuid import uuid4
+
+class GenerationJob(models.Model):
+    """One try-on or image generation request and its outcome"""
+    id = fields.UUIDField(pk=True, default=uuid4)
+    user = fields.ForeignKeyField("models.User", related_name="generations", null=True, on_delete=fields.SET_NULL)
+    kind = fields.CharField(max_length=50)
+    provider = fields.CharField(max_length=50)
+    model = fields.CharField(max_length=100, null=True)
+    # SHA-256 over the normalised inputs and parameters; equal hashes mean identical requests,
+    # whose results are reusable when the provider is deterministic
+    params_hash = fields.CharField(max_length=64)
+    params = fields.JSONField(null=True)
+    status = fields.CharField(max_length=20)
+    error = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField()
+    finished_at = fields.DatetimeField(null=True)
+    duration_ms = fields.IntField(null=True)
+
+    class Meta:
+        table = "generation_jobs"
+        indexes = (
+            # "My history", newest first
+            ("user_id", "created_at"),
+            # Result reuse lookups
+            ("params_hash", "status", "created_at"),
+        )
+
+class GenerationAsset(models.Model):
+    """An output of a generation job"""
+    id = fields.UUIDField(pk=True, default=uuid4)
+    job = fields.ForeignKeyField("models.GenerationJob", related_name="assets", on_delete=fields.CASCADE)
+    uri = fields.CharField(max_length=2048)
+    position = fields.SmallIntField(default=0)
+
+    class Meta:
+        table = "generation_assets"
+        indexes = (("job_id", "position"), ("uri",))
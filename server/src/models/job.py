@@ -0,0 +1,26 @@
+"""
+Background job model for the application
+"""
+from tortoise import fields, models
+from uuid import uuid4
+
+class Job(models.Model):
+    """Asynchronous job (e.g. a virtual try-on) tracked outside the request lifetime"""
+    id = fields.UUIDField(pk=True, default=uuid4)
+    kind = fields.CharField(max_length=50)
+    provider = fields.CharField(max_length=50)
+    # Signed-in submitter; only they can read the job. Anonymous jobs have none
+    user_id = fields.UUIDField(null=True)
+    status = fields.CharField(max_length=20, db_index=True)
+    # Latest progress a running job reported, e.g. a provider's percentage
+    progress = fields.JSONField(null=True)
+    result = fields.JSONField(null=True)
+    error = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+    started_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "jobs"
@@ -4,6 +4,7 @@ User model for the application
 from datetime import datetime
 from tortoise import fields, models
 import bcrypt
+from src.config import settings
 from uuid import uuid4
 
 class User(models.Model):
@@ -14,7 +15,7 @@ class User(models.Model):
     password_hash = fields.CharField(max_length=255, null=True)  # Optional for Google auth users
     avatar = fields.CharField(max_length=255, null=True)
     is_active = fields.BooleanField(default=True)
-    verified = fields.BooleanField(default=False)
+    verified = fields.BooleanField(default=False, db_index=True)
     verification_code = fields.CharField(max_length=6, null=True)
     verification_code_expires_at = fields.DatetimeField(null=True)
     
@@ -24,21 +25,23 @@ class User(models.Model):
     google_picture = fields.CharField(max_length=255, null=True)
     
     # Admin flag
-    is_admin = fields.BooleanField(default=False)
+    is_admin = fields.BooleanField(default=False, db_index=True)
     
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
 
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        """Hash password using bcrypt (blocking; async code should use auth.passwords)"""
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode()
 
     def verify_password(self, password: str) -> bool:
-        """Verify password"""
+        """Verify password (blocking; async code should use auth.passwords)"""
         if not self.password_hash:
             return False
         return bcrypt.checkpw(password.encode(), self.password_hash.encode())
 
     class Meta:
         table = "users"
+        # Keyset pagination of the admin user listing
+        indexes = (("created_at", "id"), ("name", "id"))
@@ -0,0 +1,80 @@
+"""
+In-process caches for authentication.
+
+Verified tokens map to their claims and user ids map to User rows, both for
+a short TTL. Changing or deleting a user invalidates its cached row and
+makes claims issued before the change fall back to the database, so a
+demoted, deactivated or deleted user can't keep riding on a stale token in
+this process. Other processes only see the change once their own caches
+expire, which is why privileged checks load the user instead of trusting
+claims (see dependencies.get_verified_principal).
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from src.config import settings
+from src.models.user import User
+from src.utils.cache import TTLCache
+from .constants import ACCESS_TOKEN_EXPIRE_DAYS
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as far as the token claims tell"""
+    id: str
+    email: Optional[str]
+    is_admin: bool
+    is_active: bool
+
+
+token_cache = TTLCache(max_entries=settings.AUTH_CACHE_SIZE, ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL_SECONDS)
+user_cache = TTLCache(max_entries=settings.AUTH_CACHE_SIZE, ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+# Longest lifetime of any token we issue; older changes can't affect a live token
+MAX_TOKEN_LIFETIME_SECONDS = max(ACCESS_TOKEN_EXPIRE_DAYS * 24 * 3600, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# user id -> time of the last change, oldest first; claims issued earlier are not trusted
+_invalidated_at: OrderedDict[str, float] = OrderedDict()
+
+
+def cache_token(token: str, payload: dict) -> None:
+    """Remember a verified token's claims, never past the token's own expiry"""
+    ttl = settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl_seconds=ttl)
+
+
+def claims_are_current(payload: dict) -> bool:
+    """Whether the user hasn't changed since the token was issued"""
+    changed_at = _invalidated_at.get(payload.get("sub"))
+    return changed_at is None or payload.get("iat", 0) > changed_at
+
+
+def invalidate_user(user_id) -> None:
+    """Drop everything cached about a user after it changes"""
+    user_id = str(user_id)
+    user_cache.invalidate(user_id)
+    now = time.time()
+    _invalidated_at[user_id] = now
+    _invalidated_at.move_to_end(user_id)
+    # Every token issued before the oldest changes has expired by now
+    while _invalidated_at:
+        oldest_id, changed_at = next(iter(_invalidated_at.items()))
+        if changed_at > now - MAX_TOKEN_LIFETIME_SECONDS:
+            break
+        del _invalidated_at[oldest_id]
+
+
+async def get_cached_user(user_id: str) -> Optional[User]:
+    """Get a user by id, served from the user cache when possible"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await User.get_or_none(id=user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
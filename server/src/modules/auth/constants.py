@@ -20,3 +20,5 @@ INACTIVE_USER_ERROR = "User account is inactive"
 UNVERIFIED_USER_ERROR = "User account is not verified"
 UNAUTHORIZED_ERROR = "Not authenticated"
 INVALID_TOKEN_ERROR = "Could not validate credentials"
+TOO_MANY_LOGIN_ATTEMPTS_ERROR = "Too many login attempts, please try again later"
+PASSWORD_HASHER_BUSY_ERROR = "Authentication is busy, please try again"
@@ -3,14 +3,17 @@ Dependencies for auth module
 """
 
 from functools import wraps
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from src.models.user import User
 from .service import UserService
 from .exceptions import UserNotFoundException
+from .cache import Principal, claims_are_current, get_cached_user
 from .jwt import verify_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 def require_auth(func):
     """Decorator to require authentication"""
@@ -24,32 +27,87 @@ def require_auth(func):
         return await func(*args, **kwargs)
     return wrapper
 
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """Get current authenticated user from JWT token"""
     payload = verify_token(token)
     user_id = payload.get("sub")
     if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
     
-    user = await User.get_or_none(id=user_id)
+    user = await get_cached_user(user_id)
     if not user:
+        raise _credentials_exception("User not found")
+    
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+            detail="Inactive user"
         )
     
+    return user
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Get the authenticated caller from the token claims alone. Falls back to
+    loading the user for tokens issued before the claims were embedded or
+    before the user last changed.
+    """
+    payload = verify_token(token)
+    user_id = payload.get("sub")
+    if not user_id:
+        raise _credentials_exception()
+
+    if "is_admin" in payload and "is_active" in payload and claims_are_current(payload):
+        principal = Principal(
+            id=user_id,
+            email=payload.get("email"),
+            is_admin=bool(payload["is_admin"]),
+            is_active=bool(payload["is_active"]),
+        )
+        if not principal.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Inactive user"
+            )
+        return principal
+
+    user = await get_current_user(token)
+    return Principal(id=str(user.id), email=user.email, is_admin=user.is_admin, is_active=user.is_active)
+
+async def get_verified_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Get the authenticated caller with admin and active flags read from the
+    database. Used for privileged checks, where long-lived claims and
+    per-process caches could still carry a revoked role.
+    """
+    payload = verify_token(token)
+    user_id = payload.get("sub")
+    if not user_id:
+        raise _credentials_exception()
+
+    user = await User.get_or_none(id=user_id)
+    if not user:
+        raise _credentials_exception("User not found")
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
-    
-    return user
+    return Principal(id=str(user.id), email=user.email, is_admin=user.is_admin, is_active=user.is_active)
+
+async def get_optional_principal(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[Principal]:
+    """Get the caller on endpoints that also serve anonymous requests; invalid tokens still fail"""
+    if not token:
+        return None
+    return await get_current_principal(token)
 
 async def get_user_or_404(user_id: str) -> User:
     """Dependency to get user by ID or raise 404"""
@@ -7,6 +7,8 @@ from .constants import (
     EMAIL_EXISTS_ERROR,
     USER_NOT_FOUND_ERROR,
     INVALID_CREDENTIALS_ERROR,
+    TOO_MANY_LOGIN_ATTEMPTS_ERROR,
+    PASSWORD_HASHER_BUSY_ERROR,
 )
 
 
@@ -39,3 +41,25 @@ class InvalidCredentialsException(HTTPException):
         super().__init__(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_CREDENTIALS_ERROR
         )
+
+
+class TooManyLoginAttemptsException(HTTPException):
+    """Exception raised when login attempts exceed the rate limit."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=TOO_MANY_LOGIN_ATTEMPTS_ERROR,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class PasswordHasherBusyException(HTTPException):
+    """Exception raised when too many password hashes are already queued."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=PASSWORD_HASHER_BUSY_ERROR,
+            headers={"Retry-After": "1"},
+        )
@@ -1,15 +1,140 @@
 """
 Google OAuth implementation
 """
-from typing import Optional
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+from jose import JWTError, jwt
 from src.config import settings
+from src.external_services.http_pool import HTTPClientPool, get_http_pool
 from src.models.user import User
-from .jwt import create_access_token
+from .cache import invalidate_user
+from .jwt import create_access_token, user_claims
 from datetime import timedelta
 from .schemas import Token, UserResponse
 
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Used when Google's response carries no Cache-Control max-age
+DEFAULT_JWKS_MAX_AGE_SECONDS = 3600
+# An unknown key id only triggers a refetch this often, so forged tokens can't hammer Google
+MIN_JWKS_REFRESH_INTERVAL_SECONDS = 60
+
+
+class GoogleIdentity:
+    """
+    Verifies Google identities without blocking the event loop. ID tokens
+    are checked locally against Google's signing keys, which are cached for
+    as long as Google's Cache-Control allows; opaque access tokens are
+    resolved through the userinfo endpoint over the shared async HTTP pool.
+    """
+
+    def __init__(self, client_id: str, http_pool: Optional[HTTPClientPool] = None):
+        self.client_id = client_id
+        self._http_pool = http_pool
+        self._keys: Dict[str, dict] = {}
+        self._keys_expire_at = 0.0
+        self._last_fetch = 0.0
+        self._refresh: Optional[asyncio.Future] = None
+
+    @property
+    def http_pool(self) -> HTTPClientPool:
+        return self._http_pool or get_http_pool()
+
+    async def _fetch_keys(self) -> None:
+        response = await self.http_pool.request("GET", GOOGLE_CERTS_URL)
+        response.raise_for_status()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        self._keys = {key["kid"]: key for key in response.json().get("keys", [])}
+        self._keys_expire_at = time.monotonic() + (int(max_age.group(1)) if max_age else DEFAULT_JWKS_MAX_AGE_SECONDS)
+        self._last_fetch = time.monotonic()
+
+    async def _refresh_keys(self) -> None:
+        # Concurrent logins share a single fetch
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self._fetch_keys())
+        await asyncio.shield(self._refresh)
+
+    async def signing_key(self, kid: str) -> dict:
+        """Get Google's public key for a key id, refreshing the cached set when needed"""
+        now = time.monotonic()
+        if now >= self._keys_expire_at or (
+            kid not in self._keys and now - self._last_fetch >= MIN_JWKS_REFRESH_INTERVAL_SECONDS
+        ):
+            await self._refresh_keys()
+        key = self._keys.get(kid)
+        if key is None:
+            raise ValueError("Unknown Google signing key")
+        return key
+
+    async def verify_id_token(self, token: str) -> dict:
+        """
+        Verify a Google ID token locally
+        Returns:
+            dict: Token claims (sub, email, name, picture, ...)
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+            key = await self.signing_key(header.get("kid", ""))
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[key.get("alg", "RS256")],
+                audience=self.client_id,
+                options={"verify_at_hash": False},
+            )
+        except JWTError as e:
+            raise ValueError(f"Invalid Google ID token: {str(e)}")
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError("Invalid Google ID token issuer")
+        return claims
+
+    async def fetch_userinfo(self, access_token: str) -> dict:
+        """Resolve an OAuth access token through Google's userinfo endpoint"""
+        response = await self.http_pool.request(
+            "GET", GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"}
+        )
+        if response.status_code != 200:
+            raise ValueError(f"Google userinfo request failed with status {response.status_code}")
+        return response.json()
+
+    async def identify(self, token: str) -> dict:
+        """
+        Get the Google user behind an ID token (verified locally) or an
+        access token (one userinfo call)
+
+        Raises:
+            ValueError: If the token is invalid or Google can't be reached
+        """
+        try:
+            if token.count(".") == 2:
+                google_user = await self.verify_id_token(token)
+            else:
+                google_user = await self.fetch_userinfo(token)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Google request failed: {str(e)}")
+        if not google_user.get("email"):
+            raise ValueError("Email not found in Google user info")
+        if google_user.get("email_verified") in (False, "false"):
+            raise ValueError("Google email is not verified")
+        return google_user
+
+
+_identity: Optional[GoogleIdentity] = None
+
+
+def get_google_identity() -> GoogleIdentity:
+    """Get the application Google identity verifier"""
+    global _identity
+    if _identity is None:
+        _identity = GoogleIdentity(settings.GOOGLE_CLIENT_ID)
+    return _identity
+
+
 class GoogleAuthService:
     """Service for handling Google OAuth authentication"""
 
@@ -17,11 +142,8 @@ class GoogleAuthService:
     async def verify_google_token(token: str) -> Optional[dict]:
         """Verify Google ID token and return user info"""
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, requests.Request(), settings.GOOGLE_CLIENT_ID
-            )
-            return idinfo
-        except ValueError:
+            return await get_google_identity().verify_id_token(token)
+        except (ValueError, httpx.HTTPError):
             return None
 
     @staticmethod
@@ -51,10 +173,11 @@ class GoogleAuthService:
             user.google_email = google_user["email"]
             user.google_picture = google_user.get("picture")
             await user.save()
+            invalidate_user(user.id)
 
         # Create access token
         access_token = create_access_token(
-            data={"sub": str(user.id)},
+            data=user_claims(user),
             expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
 
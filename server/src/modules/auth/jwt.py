@@ -8,6 +8,7 @@ from jose import JWTError, jwt
 from fastapi import HTTPException, status
 from src.config import settings
 
+from .cache import cache_token, token_cache
 from .constants import JWT_ALGORITHM, INVALID_TOKEN_ERROR
 
 
@@ -23,13 +24,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         str: Encoded JWT token
     """
     to_encode = data.copy()
-    expire = datetime.now(UTC) + (
+    now = datetime.now(UTC)
+    expire = now + (
         expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode.update({"exp": expire})
+    # Sub-second iat so tokens issued right after a user change are told apart from older ones
+    to_encode.update({"exp": expire, "iat": now.timestamp()})
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
+def user_claims(user) -> dict:
+    """
+    Claims embedded in a user's access token so hot endpoints can
+    authorise the caller without loading the user.
+
+    Args:
+        user (User): User the token is issued to
+
+    Returns:
+        dict: Token claims
+    """
+    return {
+        "sub": str(user.id),
+        "email": user.email,
+        "is_admin": user.is_admin,
+        "is_active": user.is_active,
+    }
+
+
 def verify_token(token: str) -> dict:
     """
     Verify and decode a JWT token.
@@ -43,8 +65,12 @@ def verify_token(token: str) -> dict:
     Raises:
         HTTPException: If token is invalid or expired
     """
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        cache_token(token, payload)
         return payload
     except JWTError:
         raise HTTPException(
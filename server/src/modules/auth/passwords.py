@@ -0,0 +1,152 @@
+"""
+Password hashing off the event loop.
+
+bcrypt deliberately burns 100-300 ms of CPU per call. Hashes and checks run
+on a small dedicated thread pool (bcrypt releases the GIL), with a cap on
+queued work so a login burst is rejected quickly instead of piling up, and
+a per-email / per-client login rate limiter in front of it.
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from src.config import settings
+from src.utils.cache import TTLCache
+from .exceptions import PasswordHasherBusyException, TooManyLoginAttemptsException
+
+
+def hash_cost(password_hash: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash such as "$2b$12$...", or None if it isn't one"""
+    parts = password_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool"""
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_pending: int = 64):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_workers + self.max_pending:
+            raise PasswordHasherBusyException()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password at the configured cost"""
+        hashed = await self._run(bcrypt.hashpw, password.encode(), bcrypt.gensalt(rounds=self.rounds))
+        return hashed.decode()
+
+    async def verify(self, password: str, password_hash: Optional[str]) -> bool:
+        """Check a password against a stored hash"""
+        if not password_hash:
+            return False
+        return await self._run(bcrypt.checkpw, password.encode(), password_hash.encode())
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a hash was made at a different cost than the configured one"""
+        return hash_cost(password_hash) != self.rounds
+
+    def stats(self) -> dict:
+        return {"rounds": self.rounds, "workers": self.max_workers, "pending": self._pending}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginRateLimiter:
+    """Sliding-window limit on failed login attempts per key (email or client address)"""
+
+    def __init__(self, max_attempts: int = 10, window_seconds: float = 300, max_keys: int = 100000):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self._attempts = TTLCache(max_entries=max_keys, ttl_seconds=window_seconds)
+
+    def _window(self, key: str, now: float) -> deque:
+        window = self._attempts.get(key) or deque()
+        while window and window[0] <= now - self.window_seconds:
+            window.popleft()
+        return window
+
+    def hit(self, *keys: str) -> float:
+        """
+        Record an attempt for each key. Attempts are counted before the password
+        is checked so concurrent guesses can't all slip under the limit.
+
+        Returns:
+            float: The attempt's timestamp, for refund()
+
+        Raises:
+            TooManyLoginAttemptsException: If any key is over its limit
+        """
+        now = time.monotonic()
+        windows = []
+        for key in keys:
+            window = self._window(key, now)
+            if len(window) >= self.max_attempts:
+                raise TooManyLoginAttemptsException(retry_after=int(window[0] + self.window_seconds - now) + 1)
+            windows.append((key, window))
+        for key, window in windows:
+            window.append(now)
+            self._attempts.set(key, window)
+        return now
+
+    def refund(self, key: str, attempt: float) -> None:
+        """Take back an attempt that succeeded, so only failures count against a key"""
+        window = self._attempts.get(key)
+        if window and attempt in window:
+            window.remove(attempt)
+
+    def reset(self, key: str) -> None:
+        """Forget attempts for a key, e.g. after a successful login"""
+        self._attempts.invalidate(key)
+
+
+_hasher: Optional[PasswordHasher] = None
+_limiter: Optional[LoginRateLimiter] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the application password hasher"""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            rounds=settings.BCRYPT_ROUNDS,
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+        )
+    return _hasher
+
+
+def get_login_rate_limiter() -> LoginRateLimiter:
+    """Get the application login rate limiter"""
+    global _limiter
+    if _limiter is None:
+        _limiter = LoginRateLimiter(
+            max_attempts=settings.LOGIN_RATE_LIMIT_ATTEMPTS,
+            window_seconds=settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS,
+        )
+    return _limiter
+
+
+def close_password_hasher() -> None:
+    """Shut down the hashing pool"""
+    global _hasher
+    if _hasher is not None:
+        _hasher.close()
+        _hasher = None
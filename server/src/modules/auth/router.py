@@ -3,7 +3,7 @@ Router for auth module
 """
 
 from typing import Annotated
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Request
 from .schemas import (
     UserCreate,
     UserResponse,
@@ -16,11 +16,15 @@ from .schemas import (
 from .service import UserService
 from .dependencies import get_current_user, require_auth
 from .exceptions import EmailAlreadyExistsException, UserNotFoundException
+from src.config import settings
 from src.models.user import User
+from src.utils.common import client_address, parse_networks
 
 # Create main router for auth module
 router = APIRouter(tags=["auth"], prefix="/auth")
 
+TRUSTED_PROXY_NETWORKS = parse_networks(settings.TRUSTED_PROXIES)
+
 
 @router.post(
     "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED
@@ -43,9 +47,15 @@ async def verify_email(verification_data: VerificationRequest):
 
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, request: Request):
     """Login user and return JWT token"""
-    return await UserService.authenticate_user(login_data.email, login_data.password)
+    return await UserService.authenticate_user(
+        login_data.email,
+        login_data.password,
+        client_host=client_address(
+            request.client.host if request.client else None, request.headers, TRUSTED_PROXY_NETWORKS
+        ),
+    )
 
 
 # User management routes
@@ -6,12 +6,14 @@ from typing import Optional, Tuple
 from datetime import timedelta, datetime, UTC
 import secrets
 from jose import jwt
-import requests
 from fastapi import HTTPException, status
 from src.models.user import User
 from .schemas import UserCreate, UserUpdate, Token, UserResponse
 from src.config.settings import GOOGLE_CLIENT_ID, ADMIN_EMAILS
-from .jwt import create_access_token
+from .cache import invalidate_user
+from .google import get_google_identity
+from .passwords import get_login_rate_limiter, get_password_hasher
+from .jwt import create_access_token, user_claims
 from .constants import (
     ACCESS_TOKEN_EXPIRE_DAYS,
     INVALID_CREDENTIALS_ERROR,
@@ -24,13 +26,14 @@ class UserService:
     """Service class for user operations"""
 
     @staticmethod
-    async def authenticate_user(email: str, password: str) -> Token:
+    async def authenticate_user(email: str, password: str, client_host: Optional[str] = None) -> Token:
         """
         Authenticate user and return JWT token
 
         Args:
             email: User's email
             password: User's password
+            client_host: Client address (behind trusted proxies), for rate limiting
 
         Returns:
             Token: JWT access token
@@ -38,13 +41,23 @@ class UserService:
         Raises:
             HTTPException: If authentication fails
         """
+        limiter = get_login_rate_limiter()
+        email_key = f"email:{email.lower()}"
+        client_key = f"client:{client_host}" if client_host else None
+        attempt = limiter.hit(email_key, *([client_key] if client_key else []))
+
+        hasher = get_password_hasher()
         user = await UserService.get_user_by_email(email)
-        if not user or not user.verify_password(password):
+        if not user or not await hasher.verify(password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=INVALID_CREDENTIALS_ERROR,
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        limiter.reset(email_key)
+        # Only failures count against the address, which many users may share
+        if client_key:
+            limiter.refund(client_key, attempt)
 
         if not user.is_active:
             raise HTTPException(
@@ -57,9 +70,14 @@ class UserService:
                 detail=UNVERIFIED_USER_ERROR,
             )
 
+        # Upgrade hashes made at an older cost factor while we have the plain password
+        if hasher.needs_rehash(user.password_hash):
+            user.password_hash = await hasher.hash(password)
+            await user.save(update_fields=["password_hash"])
+
         # Create access token
         access_token = create_access_token(
-            data={"sub": str(user.id)},
+            data=user_claims(user),
             expires_delta=timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS),
         )
 
@@ -85,12 +103,13 @@ class UserService:
 
         # Generate verification code
         code, expires_at = UserService.generate_verification_code()
+        password_hash = await get_password_hasher().hash(user_data.password)
 
         # Create user
         user = await User.create(
             name=user_data.name,
             email=user_data.email,
-            password_hash=User.hash_password(user_data.password),
+            password_hash=password_hash,
             avatar=user_data.avatar,
             is_active=True,
             verified=False,
@@ -127,6 +146,7 @@ class UserService:
         user.verification_code = None
         user.verification_code_expires_at = None
         await user.save()
+        invalidate_user(user.id)
 
         return True
 
@@ -151,6 +171,7 @@ class UserService:
 
         await user.update_from_dict(update_data)
         await user.save()
+        invalidate_user(user.id)
         return user
 
     @staticmethod
@@ -160,22 +181,15 @@ class UserService:
         if not user:
             return False
         await user.delete()
+        invalidate_user(user_id)
         return True
 
     @staticmethod
     async def google_auth(token: str) -> Token:
         """Authenticate with Google and return JWT token"""
         try:
-            # Get user info using the access token
-            response = requests.get(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
-                headers={'Authorization': f'Bearer {token}'}
-            )
-            response.raise_for_status()
-            google_user = response.json()
-            
-            if not google_user.get("email"):
-                raise ValueError("Email not found in Google user info")
+            # Access tokens cost one async userinfo call; ID tokens are verified locally
+            google_user = await get_google_identity().identify(token)
 
             # Check if user exists
             user = await User.get_or_none(email=google_user["email"])
@@ -199,16 +213,17 @@ class UserService:
                 user.google_picture = google_user.get("picture")
                 user.is_admin = google_user["email"] in ADMIN_EMAILS
                 await user.save()
+                invalidate_user(user.id)
 
             # Create access token
             access_token = create_access_token(
-                data={"sub": str(user.id)},
+                data=user_claims(user),
                 expires_delta=timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS),
             )
 
             return Token(access_token=access_token, user=UserResponse.model_validate(user))
 
-        except (requests.RequestException, ValueError) as e:
+        except ValueError as e:
             print("Google auth error:", str(e))
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,19 @@
+"""
+Constants for history module
+"""
+
+# Generation kinds
+GENERATION_KIND_VIRTUAL_TRY_ON = "virtual-try-on"
+GENERATION_KIND_IMAGE = "image-generation"
+
+# Generation statuses
+GENERATION_STATUS_SUCCEED = "succeed"
+GENERATION_STATUS_FAILED = "failed"
+
+# History page sizes
+DEFAULT_HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+# Error messages
+GENERATION_NOT_FOUND_ERROR = "Generation not found"
+INVALID_HISTORY_CURSOR_ERROR = "Invalid cursor"
@@ -0,0 +1,26 @@
+"""
+Custom exceptions for history module
+"""
+
+from fastapi import HTTPException, status
+from .constants import GENERATION_NOT_FOUND_ERROR, INVALID_HISTORY_CURSOR_ERROR
+
+
+class GenerationNotFoundException(HTTPException):
+    """Exception raised when a generation doesn't exist or belongs to another user."""
+
+    def __init__(self, generation_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{GENERATION_NOT_FOUND_ERROR}: {generation_id}",
+        )
+
+
+class InvalidHistoryCursorException(HTTPException):
+    """Exception raised when a history cursor can't be decoded."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=INVALID_HISTORY_CURSOR_ERROR,
+        )
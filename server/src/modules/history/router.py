@@ -0,0 +1,30 @@
+"""
+Router for history module
+"""
+
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal
+from .constants import DEFAULT_HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE
+from .schemas import GenerationHistoryPage, GenerationResponse
+from .service import get_generation, list_history
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+
+@router.get("", response_model=GenerationHistoryPage)
+async def get_history(
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    principal: Principal = Depends(get_current_principal),
+):
+    """The caller's generations, newest first"""
+    return await list_history(principal.id, limit, cursor)
+
+
+@router.get("/{generation_id}", response_model=GenerationResponse)
+async def get_history_entry(generation_id: str, principal: Principal = Depends(get_current_principal)):
+    """One of the caller's generations"""
+    return await get_generation(principal.id, generation_id)
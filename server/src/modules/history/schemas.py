@@ -0,0 +1,31 @@
+"""
+Pydantic schemas for history module
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class GenerationResponse(BaseModel):
+    """Schema for one entry of a user's generation history"""
+
+    id: str = Field(..., description="Generation ID in UUID format")
+    kind: str
+    provider: str
+    model: Optional[str] = None
+    params_hash: str
+    params: Optional[Dict[str, Any]] = None
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    images: List[str] = Field(default_factory=list, description="Output URIs in order")
+
+
+class GenerationHistoryPage(BaseModel):
+    """Schema for a page of generation history"""
+
+    items: List[GenerationResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to get the next page; null on the last page")
@@ -0,0 +1,401 @@
+"""
+Service layer for history module.
+
+Every try-on and image generation is recorded as a GenerationJob with its
+output assets. Records are buffered in memory and written in batches by a
+background task, so requests never wait on the inserts; the history and
+reuse lookups then run against indexed columns instead of scanning
+OUTPUT_DIR.
+
+Only deterministic requests reuse results: the caller decides that (seeded
+or fixed-seed providers) and passes `reuse` to track_generation, and every
+input image must be content-addressed (upload id or data URL), since a
+remote URL can serve different bytes tomorrow. The recorded outputs must
+be in our own storage as well; provider links expire long before
+GENERATION_REUSE_MAX_AGE_SECONDS does.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, UTC
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+from uuid import UUID, uuid4
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from src.config import settings
+from src.models.generation import GenerationAsset, GenerationJob
+from src.modules.uploads.utils import is_upload_id
+from src.utils.result_cache import GENERATED_IMAGES_URL_PREFIX, input_fingerprint, make_cache_key
+from .constants import GENERATION_STATUS_FAILED, GENERATION_STATUS_SUCCEED
+from .exceptions import GenerationNotFoundException, InvalidHistoryCursorException
+from .schemas import GenerationHistoryPage, GenerationResponse
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class GenerationRecord:
+    """A finished generation waiting to be written"""
+    kind: str
+    provider: str
+    params_hash: str
+    status: str
+    created_at: datetime
+    id: UUID = field(default_factory=uuid4)
+    user_id: Optional[str] = None
+    model: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    finished_at: Optional[datetime] = None
+    images: List[str] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> Optional[int]:
+        if self.finished_at is None:
+            return None
+        return int((self.finished_at - self.created_at).total_seconds() * 1000)
+
+
+def _loggable_input(value: str) -> str:
+    # Inline images are recorded by digest, not by their (multi-MB) content
+    if value.startswith("data:"):
+        return f"data:sha256:{hashlib.sha256(input_fingerprint(value)).hexdigest()}"
+    return value
+
+
+def generation_params(
+    kind: str, provider: str, inputs: Dict[str, Optional[str]], params: Dict[str, Any]
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the params hash and the stored params for a generation
+    Args:
+        inputs: Image references (URLs, upload ids or data URLs) by name
+        params: Other request parameters
+    Returns:
+        Tuple[str, dict]: Params hash and JSON-safe params to store
+    """
+    present = {name: value for name, value in sorted(inputs.items()) if value}
+    params_hash = make_cache_key(
+        f"{kind}:{provider}",
+        [name.encode() + b"=" + input_fingerprint(value) for name, value in present.items()],
+        params,
+    )
+    stored = {**params, **{name: _loggable_input(value) for name, value in present.items()}}
+    return params_hash, stored
+
+
+def _content_addressed(value: str) -> bool:
+    return is_upload_id(value) or value.startswith("data:")
+
+
+class GenerationHistoryWriter:
+    """Buffers generation records and inserts them in batches"""
+
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 500, max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: List[GenerationRecord] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, record: GenerationRecord) -> None:
+        """Queue a record for the next batch; never blocks"""
+        if len(self._pending) >= self.max_pending:
+            # The database is falling behind; history is best effort
+            self._pending.pop(0)
+            self.dropped += 1
+        self._pending.append(record)
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    @staticmethod
+    async def _insert(records: List[GenerationRecord]) -> None:
+        # Jobs and their assets land together or not at all
+        async with in_transaction() as connection:
+            await GenerationJob.bulk_create([
+                GenerationJob(
+                    id=record.id,
+                    user_id=record.user_id,
+                    kind=record.kind,
+                    provider=record.provider,
+                    model=record.model,
+                    params_hash=record.params_hash,
+                    params=record.params,
+                    status=record.status,
+                    error=record.error,
+                    created_at=record.created_at,
+                    finished_at=record.finished_at,
+                    duration_ms=record.duration_ms,
+                )
+                for record in records
+            ], using_db=connection)
+            await GenerationAsset.bulk_create([
+                GenerationAsset(job_id=record.id, uri=uri, position=position)
+                for record in records
+                for position, uri in enumerate(record.images)
+            ], using_db=connection)
+
+    async def _insert_one_by_one(self, batch: List[GenerationRecord]) -> int:
+        # A rejected row rolled back its whole batch; keep the rows that are fine
+        written = 0
+        for record in batch:
+            try:
+                await self._insert([record])
+            except Exception as e:
+                logger.warning(f"Failed to write generation record {record.id}: {e}")
+                self.dropped += 1
+                continue
+            written += 1
+        return written
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of jobs written"""
+        written = 0
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            try:
+                await self._insert(batch)
+            except IntegrityError:
+                written += await self._insert_one_by_one(batch)
+                continue
+            except Exception as e:
+                logger.warning(f"Failed to write {len(batch)} generation records: {e}")
+                self.dropped += len(batch)
+                continue
+            written += len(batch)
+        self.written += written
+        return written
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped}
+
+
+_writer: Optional[GenerationHistoryWriter] = None
+
+
+def init_history_writer() -> GenerationHistoryWriter:
+    """Create and start the application history writer"""
+    global _writer
+    if _writer is None:
+        _writer = GenerationHistoryWriter(
+            flush_interval=settings.GENERATION_HISTORY_FLUSH_SECONDS,
+            max_batch=settings.GENERATION_HISTORY_BATCH_SIZE,
+            max_pending=settings.GENERATION_HISTORY_MAX_PENDING,
+        )
+    _writer.start()
+    return _writer
+
+
+def get_history_writer() -> Optional[GenerationHistoryWriter]:
+    """Get the application history writer, if it is running"""
+    return _writer
+
+
+async def close_history_writer() -> None:
+    """Flush pending records and stop the writer"""
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+        _writer = None
+
+
+async def referenced_outputs(names: List[str]) -> Set[str]:
+    """Which of the given generated-image objects a recorded or queued generation still points at"""
+    names_by_uri = {GENERATED_IMAGES_URL_PREFIX + name: name for name in names}
+    pending = _writer._pending if _writer is not None else []
+    referenced = {names_by_uri[uri] for record in pending for uri in record.images if uri in names_by_uri}
+    stored = await GenerationAsset.filter(uri__in=list(names_by_uri)).values_list("uri", flat=True)
+    return referenced | {names_by_uri[uri] for uri in stored}
+
+
+def record_generation(
+    kind: str,
+    provider: str,
+    inputs: Dict[str, Optional[str]],
+    params: Dict[str, Any],
+    started_at: datetime,
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    images: Sequence[str] = (),
+    error: Optional[str] = None,
+) -> Optional[GenerationRecord]:
+    """
+    Record a finished generation in the history, if the writer is running
+    """
+    if _writer is None:
+        return None
+    params_hash, stored_params = generation_params(kind, provider, inputs, params)
+    record = GenerationRecord(
+        kind=kind,
+        provider=provider,
+        model=model,
+        params_hash=params_hash,
+        params=stored_params,
+        status=GENERATION_STATUS_FAILED if error else GENERATION_STATUS_SUCCEED,
+        error=error,
+        user_id=user_id,
+        created_at=started_at,
+        finished_at=datetime.now(UTC),
+        images=[_loggable_input(image) for image in images],
+    )
+    _writer.record(record)
+    return record
+
+
+async def _reusable_result(
+    kind: str, provider: str, inputs: Dict[str, Optional[str]], params: Dict[str, Any]
+) -> Optional[GenerationResponse]:
+    if _writer is None or settings.GENERATION_REUSE_MAX_AGE_SECONDS <= 0:
+        return None
+    if not all(_content_addressed(value) for value in inputs.values() if value):
+        return None
+    params_hash, _ = generation_params(kind, provider, inputs, params)
+    try:
+        previous = await find_reusable_result(params_hash, settings.GENERATION_REUSE_MAX_AGE_SECONDS)
+    except Exception as e:
+        # History is best effort; generate as usual
+        logger.warning(f"Failed to look up a reusable generation: {e}")
+        return None
+    # Inline outputs are only stored by digest and provider URLs expire, so
+    # only results served from our own storage can be replayed
+    if previous is None or not previous.images or not all(
+        image.startswith(GENERATED_IMAGES_URL_PREFIX) for image in previous.images
+    ):
+        return None
+    return previous
+
+
+async def track_generation(
+    kind: str,
+    provider: str,
+    inputs: Dict[str, Optional[str]],
+    params: Dict[str, Any],
+    run: Callable[[], Awaitable[T]],
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    reuse: Optional[Callable[[GenerationResponse], T]] = None,
+) -> T:
+    """
+    Run a generation and record its outcome; `run` must return something with `images`.
+    Deterministic callers pass `reuse` to build their result from a recent
+    successful generation with the same inputs and parameters instead of running it.
+    """
+    started_at = datetime.now(UTC)
+    if reuse is not None:
+        previous = await _reusable_result(kind, provider, inputs, params)
+        if previous is not None:
+            record_generation(kind, previous.provider, inputs, params, started_at, user_id=user_id, model=model,
+                              images=previous.images)
+            return reuse(previous)
+    try:
+        result = await run()
+    except Exception as e:
+        record_generation(kind, provider, inputs, params, started_at, user_id=user_id, model=model,
+                          error=str(getattr(e, "detail", e)))
+        raise
+    # Routed requests report the provider that actually served them
+    provider = getattr(result, "provider", None) or provider
+    record_generation(kind, provider, inputs, params, started_at, user_id=user_id, model=model,
+                      images=getattr(result, "images", None) or ())
+    return result
+
+
+def _to_response(job: GenerationJob) -> GenerationResponse:
+    return GenerationResponse(
+        id=str(job.id),
+        kind=job.kind,
+        provider=job.provider,
+        model=job.model,
+        params_hash=job.params_hash,
+        params=job.params,
+        status=job.status,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        duration_ms=job.duration_ms,
+        images=[asset.uri for asset in sorted(job.assets, key=lambda asset: asset.position)],
+    )
+
+
+def _encode_cursor(job: GenerationJob) -> str:
+    return base64.urlsafe_b64encode(json.dumps([job.created_at.isoformat(), str(job.id)]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), job_id
+    except (ValueError, TypeError):
+        raise InvalidHistoryCursorException()
+
+
+async def list_history(user_id: str, limit: int, cursor: Optional[str] = None) -> GenerationHistoryPage:
+    """A user's generations, newest first, one keyset page at a time"""
+    queryset = GenerationJob.filter(user_id=user_id)
+    if cursor:
+        created_at, job_id = _decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=job_id))
+    jobs = await queryset.order_by("-created_at", "-id").limit(limit + 1).prefetch_related("assets")
+    next_cursor = _encode_cursor(jobs[limit - 1]) if len(jobs) > limit else None
+    return GenerationHistoryPage(items=[_to_response(job) for job in jobs[:limit]], next_cursor=next_cursor)
+
+
+async def get_generation(user_id: str, generation_id: str) -> GenerationResponse:
+    """One of a user's generations"""
+    try:
+        job = await GenerationJob.get_or_none(id=generation_id, user_id=user_id).prefetch_related("assets")
+    except ValueError:
+        job = None
+    if job is None:
+        raise GenerationNotFoundException(generation_id)
+    return _to_response(job)
+
+
+async def find_reusable_result(params_hash: str, max_age_seconds: float) -> Optional[GenerationResponse]:
+    """The most recent successful generation with the same inputs and parameters, if recent enough"""
+    job = await (
+        GenerationJob.filter(
+            params_hash=params_hash,
+            status=GENERATION_STATUS_SUCCEED,
+            created_at__gte=datetime.now(UTC) - timedelta(seconds=max_age_seconds),
+        )
+        .order_by("-created_at")
+        .first()
+        .prefetch_related("assets")
+    )
+    return _to_response(job) if job else None
@@ -0,0 +1,231 @@
+"""
+Streaming image proxy.
+
+Remote provider images are piped to the client chunk by chunk with their
+original Content-Type, ETag and Range semantics instead of being buffered
+and base64-encoded into JSON. Complete responses can optionally be kept in
+an on-disk cache keyed by the SHA-256 of the URL.
+
+Only hosts on the allowlist (the provider CDNs by default) are fetched, and
+only image responses are relayed, always with `X-Content-Type-Options:
+nosniff` so a browser never renders them as anything else.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import AsyncIterator, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from src.config import settings
+from src.config.constants import OUTPUT_DIR
+from src.external_services.http_pool import HTTPClientPool, get_http_pool
+from src.utils.result_cache import ResultCache
+
+# Client headers passed through to the upstream request
+FORWARD_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+# Upstream headers passed back to the client
+FORWARD_RESPONSE_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-range",
+    "content-encoding",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "cache-control",
+)
+CACHED_RESPONSE_CACHE_CONTROL = "public, max-age=86400"
+PROXY_CACHE_PREFIX = "proxy"
+# Hosts the providers deliver results from; subdomains are included
+DEFAULT_ALLOWED_HOSTS = frozenset({"replicate.delivery", "fal.media", "klingai.com", "kling.ai"})
+# Allowlist entry that lets any host through
+ANY_HOST = "*"
+SECURITY_HEADERS = {"X-Content-Type-Options": "nosniff"}
+
+
+class ImageProxy:
+    """Relays remote images and optionally caches complete responses on disk"""
+
+    def __init__(
+        self,
+        cache: Optional[ResultCache] = None,
+        max_object_bytes: int = 50 * 1024 * 1024,
+        allowed_hosts: Optional[set] = None,
+        http_pool: Optional[HTTPClientPool] = None,
+    ):
+        self.cache = cache
+        self.max_object_bytes = max_object_bytes
+        self.allowed_hosts = set(DEFAULT_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts)
+        self._http_pool = http_pool
+
+    @property
+    def http_pool(self) -> HTTPClientPool:
+        return self._http_pool or get_http_pool()
+
+    def _validate(self, url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise HTTPException(status_code=400, detail="Only absolute http(s) image URLs can be proxied")
+        if not self._host_allowed(parts.hostname.lower()):
+            raise HTTPException(status_code=400, detail=f"Host {parts.hostname} is not allowed")
+
+    def allows(self, url: str) -> bool:
+        """Whether `url` is an absolute http(s) URL on an allowed host"""
+        parts = urlsplit(url)
+        return parts.scheme in ("http", "https") and bool(parts.hostname) and self._host_allowed(parts.hostname.lower())
+
+    def _host_allowed(self, host: str) -> bool:
+        if ANY_HOST in self.allowed_hosts:
+            return True
+        return any(host == allowed or host.endswith(f".{allowed}") for allowed in self.allowed_hosts)
+
+    async def serve(self, url: str, request_headers: Mapping[str, str]) -> Response:
+        """
+        Build the response for `url`, honouring conditional and Range request headers
+        """
+        self._validate(url)
+        key = hashlib.sha256(url.encode()).hexdigest()
+
+        cached = await self._cached_response(key, request_headers)
+        if cached is not None:
+            return cached
+
+        client = self.http_pool.client_for(url)
+        upstream_request = client.build_request(
+            "GET",
+            url,
+            headers={name: request_headers[name] for name in FORWARD_REQUEST_HEADERS if name in request_headers},
+        )
+        try:
+            upstream = await client.send(upstream_request, stream=True)
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=502, detail=f"Failed to fetch image: {str(e)}")
+
+        if upstream.status_code >= 400:
+            await upstream.aclose()
+            raise HTTPException(
+                status_code=404 if upstream.status_code == 404 else 502,
+                detail=f"Failed to fetch image: upstream returned {upstream.status_code}",
+            )
+
+        # 304s carry no body, so they needn't say what it is
+        content_type = upstream.headers.get("content-type", "")
+        if upstream.status_code != 304 and not content_type.lower().startswith("image/"):
+            await upstream.aclose()
+            raise HTTPException(status_code=502, detail="Failed to fetch image: upstream did not return an image")
+
+        headers = {name: upstream.headers[name] for name in FORWARD_RESPONSE_HEADERS if name in upstream.headers}
+        headers.update(SECURITY_HEADERS)
+        body = upstream.aiter_raw()
+        content_length = int(upstream.headers.get("content-length") or 0)
+        if (
+            self.cache is not None
+            and upstream.status_code == 200
+            and content_length <= self.max_object_bytes
+        ):
+            body = self._tee_to_cache(key, body, headers)
+
+        return StreamingResponse(
+            body,
+            status_code=upstream.status_code,
+            headers=headers,
+            background=BackgroundTask(upstream.aclose),
+        )
+
+    async def _cached_response(self, key: str, request_headers: Mapping[str, str]) -> Optional[Response]:
+        if self.cache is None or await self.cache.get(key) is None:
+            return None
+
+        meta = await asyncio.to_thread(_read_json, self.cache.path_for(PROXY_CACHE_PREFIX, key, "json"))
+        etag = meta.get("etag") or f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": CACHED_RESPONSE_CACHE_CONTROL, **SECURITY_HEADERS}
+        if meta.get("last-modified"):
+            headers["Last-Modified"] = meta["last-modified"]
+        if meta.get("content-encoding"):
+            headers["Content-Encoding"] = meta["content-encoding"]
+
+        if request_headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        # FileResponse serves Range requests itself
+        return FileResponse(
+            self.cache.path_for(PROXY_CACHE_PREFIX, key, "bin"),
+            media_type=meta.get("content-type", "application/octet-stream"),
+            headers=headers,
+        )
+
+    async def _tee_to_cache(
+        self, key: str, body: AsyncIterator[bytes], headers: Dict[str, str]
+    ) -> AsyncIterator[bytes]:
+        """Relay chunks to the client while writing them to a temp file"""
+        data_path = self.cache.path_for(PROXY_CACHE_PREFIX, key, "bin")
+        temp_path = f"{data_path}.{os.getpid()}.{id(body)}.tmp"
+        written = 0
+        completed = False
+        f = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in body:
+                yield chunk
+                written += len(chunk)
+                if written <= self.max_object_bytes:
+                    await asyncio.to_thread(f.write, chunk)
+            completed = written <= self.max_object_bytes
+        finally:
+            await asyncio.to_thread(f.close)
+            if completed:
+                meta_path = self.cache.path_for(PROXY_CACHE_PREFIX, key, "json")
+                await asyncio.to_thread(_write_json, meta_path, headers)
+                await asyncio.to_thread(os.replace, temp_path, data_path)
+                await self.cache.put(key, files=[data_path, meta_path])
+            else:
+                # Client went away or the object was too large: don't keep a partial body
+                await asyncio.to_thread(_remove, temp_path)
+
+
+def _read_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_proxy: Optional[ImageProxy] = None
+
+
+def get_image_proxy() -> ImageProxy:
+    """
+    Get the application image proxy; its disk cache index is loaded by the first lookup
+    """
+    global _proxy
+    if _proxy is None:
+        cache = None
+        if settings.IMAGE_PROXY_CACHE_ENABLED:
+            root = os.path.join(OUTPUT_DIR, "proxy-cache")
+            os.makedirs(root, exist_ok=True)
+            cache = ResultCache(
+                root=root,
+                ttl_seconds=settings.IMAGE_PROXY_CACHE_TTL_SECONDS,
+                max_bytes=settings.IMAGE_PROXY_CACHE_MAX_BYTES,
+            )
+        _proxy = ImageProxy(
+            cache=cache,
+            max_object_bytes=settings.IMAGE_PROXY_MAX_OBJECT_BYTES,
+            allowed_hosts={host.strip().lower() for host in settings.IMAGE_PROXY_ALLOWED_HOSTS.split(",") if host.strip()},
+        )
+    return _proxy
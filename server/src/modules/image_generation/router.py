@@ -1,45 +1,67 @@
-from fastapi import APIRouter, HTTPException, Response
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Body
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import hmac
+from pydantic import BaseModel, Field, model_validator
 import time
-import aiohttp
 
 from .service import (
     generate_image,
     ImageGenerationResult,
-    virtual_try_on_with_fal,
-    virtual_try_on_with_catvton,
+    route_virtual_try_on,
+    stage_shared_image,
+    GenerationShard,
+    plan_generation_shards,
+    SEEDED_PROVIDERS,
+    generation_reuse,
+    try_on_reuse,
     generate_campaign_content,
     CampaignGenerationResult
 )
 from ...config import settings
+from ...external_services.kling import get_kling_tracker
+from ..auth.cache import Principal
+from ..auth.dependencies import get_current_principal, get_optional_principal
+from ..history.constants import GENERATION_KIND_IMAGE, GENERATION_KIND_VIRTUAL_TRY_ON
+from ..history.service import track_generation
+from ...utils.concurrency import fan_out
+from .proxy import get_image_proxy
 
 
-import base64
+router = APIRouter(prefix="/image-generation", tags=["image-generation"])
 
-async def fetch_image(url: str) -> tuple[str, str]:
-    """Fetch image from URL and return as base64 data URL"""
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            content_type = response.headers.get('Content-Type', 'image/png')
-            image_data = await response.read()
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            return f"data:{content_type};base64,{base64_data}", content_type
+T = TypeVar("T")
 
 
-router = APIRouter(prefix="/image-generation", tags=["image-generation"])
+@router.get("/view-image")
+async def view_image(url: str, request: Request):
+    """
+    Stream a remote image through the server with its original Content-Type,
+    ETag and Range support
+    """
+    return await get_image_proxy().serve(url, request.headers)
 
 
-@router.get("/view-image")
-async def view_image(url: str):
+@router.post("/kling/callback")
+async def kling_callback(payload: Dict[str, Any] = Body(...), token: str = ""):
     """
-    Convert an image URL to base64 data URL
+    Webhook for Kling task status callbacks; resolves waiting generations without polling
     """
-    try:
-        data_url, _ = await fetch_image(url)
-        return {"data_url": data_url}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to fetch image: {str(e)}")
+    # Without a shared secret anyone could resolve tasks with forged results
+    if not settings.KLING_CALLBACK_SECRET or not hmac.compare_digest(token, settings.KLING_CALLBACK_SECRET):
+        raise HTTPException(status_code=403, detail="Invalid callback token")
+
+    task_data = payload["data"] if isinstance(payload.get("data"), dict) else payload
+    if not task_data.get("task_id"):
+        raise HTTPException(status_code=400, detail="Missing task_id")
+
+    return {"resolved": get_kling_tracker().resolve(task_data)}
+
+
+def _check_seeds_supported(provider: str, seeded: bool) -> None:
+    """Reject seeds for providers that would silently ignore them"""
+    if seeded and provider.lower() not in SEEDED_PROVIDERS:
+        raise ValueError(f"Seeds are only supported for {', '.join(SEEDED_PROVIDERS)}, not {provider}")
 
 
 class ImageGenerationRequest(BaseModel):
@@ -47,26 +69,129 @@ class ImageGenerationRequest(BaseModel):
     Request model for image generation
     """
     prompt: str = Field(..., description="Text description of the image to generate")
-    garment_image_url: Optional[str] = Field(None, description="URL of the garment image to analyze")
+    garment_image_url: Optional[str] = Field(None, description="URL or upload id of the garment image to analyze")
     provider: str = Field(..., description="Image generation provider (kling or replicate)")
     model: Optional[str] = Field(None, description="Model to use (for replicate, only 'flux-dev' is supported)")
     num_images: Optional[int] = Field(1, description="Number of images to generate", ge=1, le=10)
     width: Optional[int] = Field(1024, description="Image width (for Kling only)", ge=256, le=2048)
     height: Optional[int] = Field(1024, description="Image height (for Kling only)", ge=256, le=2048)
     negative_prompt: Optional[str] = Field(None, description="Negative prompt for image generation (Kling only)")
-    reference_image: Optional[str] = Field(None, description="Reference image URL for image generation (Kling only)")
+    reference_image: Optional[str] = Field(None, description="Reference image URL or upload id for image generation (Kling only)")
     aspect_ratio: Optional[str] = Field(None, description="Aspect ratio for the generated image (Kling only)")
     guidance: Optional[float] = Field(3.5, description="Guidance scale for Replicate flux-dev model", ge=1.0, le=20.0)
+    seed: Optional[int] = Field(None, description="Seed for reproducible results; seeded requests are served from the result cache (Replicate only)")
+    garment_analysis_timeout: Optional[float] = Field(None, description="Seconds to wait for garment analysis (0 for no limit, default from settings)", ge=0)
+    garment_analysis_fallback: bool = Field(True, description="Use the bare prompt if garment analysis misses its deadline instead of failing with 504")
+
+    @model_validator(mode="after")
+    def seed_supported(self) -> "ImageGenerationRequest":
+        _check_seeds_supported(self.provider, self.seed is not None)
+        return self
+
+
+class BatchImageGenerationRequest(BaseModel):
+    """
+    Request model for batch image generation: every prompt, or every prompt x seed
+    """
+    prompts: List[str] = Field(..., min_length=1, description="Prompts to generate")
+    seeds: Optional[List[int]] = Field(None, min_length=1, description="Seeds; each prompt is generated once per seed (Replicate only)")
+    images_per_prompt: int = Field(1, ge=1, description="Images per prompt (or per prompt and seed); split into provider-sized calls")
+    garment_image_url: Optional[str] = Field(None, description="URL or upload id of the garment image to analyze, shared by every prompt")
+    provider: str = Field(..., description="Image generation provider (kling or replicate)")
+    model: Optional[str] = Field(None, description="Model to use (for replicate, only 'flux-dev' is supported)")
+    width: Optional[int] = Field(1024, description="Image width (for Kling only)", ge=256, le=2048)
+    height: Optional[int] = Field(1024, description="Image height (for Kling only)", ge=256, le=2048)
+    negative_prompt: Optional[str] = Field(None, description="Negative prompt for image generation (Kling only)")
+    reference_image: Optional[str] = Field(None, description="Reference image URL or upload id, shared by every prompt (Kling only)")
+    aspect_ratio: Optional[str] = Field(None, description="Aspect ratio for the generated images (Kling only)")
+    guidance: Optional[float] = Field(3.5, description="Guidance scale for Replicate flux-dev model", ge=1.0, le=20.0)
+    concurrency: Optional[int] = Field(None, ge=1, description="Provider calls in flight at once (capped by the server)")
+
+    @model_validator(mode="after")
+    def seeds_supported(self) -> "BatchImageGenerationRequest":
+        _check_seeds_supported(self.provider, bool(self.seeds))
+        return self
+
+    @model_validator(mode="after")
+    def within_batch_limit(self) -> "BatchImageGenerationRequest":
+        total = len(self.prompts) * len(self.seeds or [None]) * self.images_per_prompt
+        if total > settings.BATCH_GENERATION_MAX_IMAGES:
+            raise ValueError(f"A batch can generate at most {settings.BATCH_GENERATION_MAX_IMAGES} images, got {total}")
+        return self
 
 
 class VirtualTryOnRequest(BaseModel):
     """
     Request model for virtual try-on
     """
-    human_image_url: str = Field(..., description="URL of the person image")
-    garment_image_url: str = Field(..., description="URL of the garment image to try on")
-    model: str = Field(..., description="Model to use for virtual try-on (leffa, cat-vton, or kling)")
+    human_image_url: str = Field(..., description="URL or upload id of the person image")
+    garment_image_url: str = Field(..., description="URL or upload id of the garment image to try on")
+    model: str = Field(..., description="Model to use for virtual try-on (leffa, cat-vton, kolors/kling, or auto)")
+    garment_type: str = Field("overall", description="Type of garment (upper, lower, or overall)")
+    routing: Optional[str] = Field(None, pattern="^(fastest|cheapest|strict)$", description="Provider routing policy; named models default to strict, auto to the server default")
+
+
+class BatchVirtualTryOnRequest(BaseModel):
+    """
+    Request model for batch virtual try-on: one garment on many people, or
+    one person in many garments
+    """
+    human_image_url: Optional[str] = Field(None, description="Person image shared by every item")
+    garment_image_url: Optional[str] = Field(None, description="Garment image shared by every item")
+    human_image_urls: List[str] = Field(default_factory=list, max_length=settings.BATCH_TRYON_MAX_ITEMS, description="Person images, one item each")
+    garment_image_urls: List[str] = Field(default_factory=list, max_length=settings.BATCH_TRYON_MAX_ITEMS, description="Garment images, one item each")
+    model: str = Field("auto", description="Model to use for virtual try-on (leffa, cat-vton, kolors/kling, or auto)")
     garment_type: str = Field("overall", description="Type of garment (upper, lower, or overall)")
+    routing: Optional[str] = Field(None, pattern="^(fastest|cheapest|strict)$", description="Provider routing policy")
+    concurrency: Optional[int] = Field(None, ge=1, description="Items in flight at once (capped by the server)")
+
+    @model_validator(mode="after")
+    def one_shared_image(self) -> "BatchVirtualTryOnRequest":
+        if self.garment_image_url and self.human_image_urls and not (self.human_image_url or self.garment_image_urls):
+            return self
+        if self.human_image_url and self.garment_image_urls and not (self.garment_image_url or self.human_image_urls):
+            return self
+        raise ValueError("Give garment_image_url with human_image_urls, or human_image_url with garment_image_urls")
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """(person, garment) for every item"""
+        if self.garment_image_url:
+            return [(human, self.garment_image_url) for human in self.human_image_urls]
+        return [(self.human_image_url, garment) for garment in self.garment_image_urls]
+
+
+class BatchVirtualTryOnItem(BaseModel):
+    """
+    One line of the batch virtual try-on stream
+    """
+    index: int = Field(..., description="Position of the item in the request")
+    human_image_url: str
+    garment_image_url: str
+    code: int = Field(0, description="Error code (0 for success)")
+    message: str = Field("Success", description="Error message or success status")
+    data: Optional[ImageGenerationResult] = Field(None, description="Result data (null if error)")
+
+
+class BatchSummary(BaseModel):
+    """
+    Last line of a batch stream
+    """
+    done: bool = True
+    total: int
+    succeeded: int
+    failed: int
+
+
+class BatchImageGenerationItem(BaseModel):
+    """
+    One line of the batch image generation stream (one provider call)
+    """
+    index: int = Field(..., description="Position of the call in the batch plan")
+    prompt_index: int = Field(..., description="Position of the prompt in the request")
+    seed: Optional[int] = None
+    code: int = Field(0, description="Error code (0 for success)")
+    message: str = Field("Success", description="Error message or success status")
+    data: Optional[ImageGenerationResult] = Field(None, description="Result data (null if error)")
 
 
 class CampaignGenerationRequest(BaseModel):
@@ -74,7 +199,7 @@ class CampaignGenerationRequest(BaseModel):
     Request model for campaign generation
     """
     prompt: str = Field(..., description="Campaign type/theme")
-    garment_image_url: str = Field(..., description="Base64 data of the garment image")
+    garment_image_url: str = Field(..., description="Upload id or base64 data of the garment image")
 
 class CampaignGenerationResponse(BaseModel):
     """
@@ -107,7 +232,7 @@ async def generate_campaign_endpoint(
     
     Parameters:
     - prompt: Campaign type or theme
-    - garment_image_url: Base64 data of the garment image
+    - garment_image_url: Upload id (see /api/uploads) or base64 data of the garment image
     """
     try:
         result = await generate_campaign_content(
@@ -141,44 +266,38 @@ async def generate_campaign_endpoint(
 
 @router.post("/virtual-try-on", response_model=ImageGenerationResponse)
 async def virtual_try_on_endpoint(
-        request: VirtualTryOnRequest
+        request: VirtualTryOnRequest,
+        principal: Optional[Principal] = Depends(get_optional_principal),
 ) -> ImageGenerationResponse:
     """
-    Perform virtual try-on with FAL.AI.
+    Perform virtual try-on with Leffa (FAL.AI), CatVTON or Kolors.
     
-    This endpoint uses FAL.AI's virtual try-on service to generate an image of a person
-    wearing a specified garment. The service processes the request asynchronously and
-    provides real-time logs of the generation process.
+    This endpoint generates an image of a person wearing a specified garment. With
+    model "auto" or a routing policy, the provider is picked from live latency and
+    error figures and the request fails over to the next provider on errors; the
+    provider that served it is returned in `data.provider`.
     
     Parameters:
-    - human_image_url: URL of the person image
-    - garment_image_url: URL of the garment to try on
+    - human_image_url: URL or upload id of the person image
+    - garment_image_url: URL or upload id of the garment to try on
+    - routing: fastest, cheapest or strict
     """
     try:
-        if request.model == 'leffa':
-            result = await virtual_try_on_with_fal(
+        result = await track_generation(
+            kind=GENERATION_KIND_VIRTUAL_TRY_ON,
+            provider=request.model.lower(),
+            inputs={"human_image_url": request.human_image_url, "garment_image_url": request.garment_image_url},
+            params={"garment_type": request.garment_type},
+            user_id=principal.id if principal else None,
+            reuse=try_on_reuse(request.model),
+            run=lambda: route_virtual_try_on(
                 human_image_url=request.human_image_url,
                 garment_image_url=request.garment_image_url,
-                api_key=settings.FAL_API_KEY,
-                garment_type=request.garment_type
-            )
-        elif request.model.lower() == 'cat-vton':
-            result = await virtual_try_on_with_catvton(
-                human_image_url=request.human_image_url,
-                garment_image_url=request.garment_image_url,
-                garment_type=request.garment_type
-            )
-        else:
-            # Placeholder for other models
-            current_time = int(time.time() * 1000)
-            result = ImageGenerationResult(
-                task_id=f"placeholder_{current_time}",
-                images=[request.human_image_url],  # Return original image for now
-                status="succeed",
-                created_at=current_time,
-                updated_at=current_time,
-                logs=[f"Placeholder response for {request.model} model"]
-            )
+                model=request.model,
+                garment_type=request.garment_type,
+                routing=request.routing,
+            ),
+        )
 
         request_id = f"vton_{int(time.time() * 1000)}_{hash(request.human_image_url) % 10000:04d}"
 
@@ -205,9 +324,85 @@ async def virtual_try_on_endpoint(
         )
 
 
+async def _stream_batch(
+    items: Sequence[T],
+    run: Callable[[T], Awaitable[ImageGenerationResult]],
+    concurrency: int,
+    line: Callable[[int, T], Any],
+) -> AsyncIterator[str]:
+    """
+    NDJSON for a fanned-out batch: the `line(index, item)` model of each
+    item with its result or error as it completes, then a BatchSummary
+    """
+    failed = 0
+    async for index, result, error in fan_out(items, run, concurrency):
+        entry = line(index, items[index])
+        if error is not None:
+            failed += 1
+            entry.code = error.status_code if isinstance(error, HTTPException) else 500
+            entry.message = str(error.detail) if isinstance(error, HTTPException) else str(error)
+        else:
+            entry.data = result
+        yield entry.model_dump_json() + "\n"
+    yield BatchSummary(total=len(items), succeeded=len(items) - failed, failed=failed).model_dump_json() + "\n"
+
+
+@router.post("/virtual-try-on/batch")
+async def batch_virtual_try_on_endpoint(
+        request: BatchVirtualTryOnRequest,
+        principal: Principal = Depends(get_current_principal),
+) -> StreamingResponse:
+    """
+    Try one garment on many people (or one person in many garments).
+
+    Requires sign-in: the shared image is decoded and stored once (counted
+    against the caller's upload quota), items run concurrently
+    across providers (see /virtual-try-on for routing), and results are
+    streamed as NDJSON in completion order: one BatchVirtualTryOnItem line per
+    item, then a BatchSummary line. Disconnecting cancels unfinished items.
+    """
+    if request.garment_image_url:
+        request.garment_image_url = await stage_shared_image(request.garment_image_url, principal.id)
+    else:
+        request.human_image_url = await stage_shared_image(request.human_image_url, principal.id)
+    pairs = request.pairs()
+    concurrency = min(request.concurrency or settings.BATCH_TRYON_CONCURRENCY, settings.BATCH_TRYON_CONCURRENCY)
+
+    def run_item(pair: Tuple[str, str]):
+        human_image_url, garment_image_url = pair
+        return track_generation(
+            kind=GENERATION_KIND_VIRTUAL_TRY_ON,
+            provider=request.model.lower(),
+            inputs={"human_image_url": human_image_url, "garment_image_url": garment_image_url},
+            params={"garment_type": request.garment_type},
+            user_id=principal.id,
+            reuse=try_on_reuse(request.model),
+            run=lambda: route_virtual_try_on(
+                human_image_url=human_image_url,
+                garment_image_url=garment_image_url,
+                model=request.model,
+                garment_type=request.garment_type,
+                routing=request.routing,
+            ),
+        )
+
+    return StreamingResponse(
+        _stream_batch(
+            pairs, run_item, concurrency,
+            lambda index, pair: BatchVirtualTryOnItem(index=index, human_image_url=pair[0], garment_image_url=pair[1]),
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+def _generation_token(provider: str) -> str:
+    return settings.KLING_API_KEY if provider.lower() == "kling" else settings.REPLICATE_API_TOKEN
+
+
 @router.post("/generate-image", response_model=ImageGenerationResponse)
 async def generate_image_endpoint(
-        request: ImageGenerationRequest
+        request: ImageGenerationRequest,
+        principal: Optional[Principal] = Depends(get_optional_principal),
 ) -> ImageGenerationResponse:
     """
     Generate images using specified provider.
@@ -224,19 +419,31 @@ async def generate_image_endpoint(
        - Immediate URL response
     """
     try:
-        result = await generate_image(
-            prompt=request.prompt,
-            garment_image_url=request.garment_image_url,
-            provider=request.provider,
+        result = await track_generation(
+            kind=GENERATION_KIND_IMAGE,
+            provider=request.provider.lower(),
             model=request.model,
-            num_images=request.num_images,
-            width=request.width,
-            height=request.height,
-            negative_prompt=request.negative_prompt if request.negative_prompt else 'low quality, unrealistic, no cloths',
-            reference_image=request.reference_image,
-            aspect_ratio=request.aspect_ratio,
-            guidance=request.guidance,
-            access_token=settings.KLING_API_KEY if request.provider.lower() == "kling" else settings.REPLICATE_API_TOKEN
+            inputs={"garment_image_url": request.garment_image_url, "reference_image": request.reference_image},
+            params=request.model_dump(exclude={"garment_image_url", "reference_image", "provider", "model"}),
+            user_id=principal.id if principal else None,
+            reuse=generation_reuse(request.provider, request.seed, request.garment_image_url),
+            run=lambda: generate_image(
+                prompt=request.prompt,
+                garment_image_url=request.garment_image_url,
+                provider=request.provider,
+                model=request.model,
+                num_images=request.num_images,
+                width=request.width,
+                height=request.height,
+                negative_prompt=request.negative_prompt if request.negative_prompt else 'low quality, unrealistic, no cloths',
+                reference_image=request.reference_image,
+                aspect_ratio=request.aspect_ratio,
+                guidance=request.guidance,
+                seed=request.seed,
+                garment_analysis_timeout=request.garment_analysis_timeout,
+                garment_analysis_fallback=request.garment_analysis_fallback,
+                access_token=_generation_token(request.provider)
+            ),
         )
 
         # Generate a unique request ID using timestamp and random suffix
@@ -265,3 +472,59 @@ async def generate_image_endpoint(
             request_id=f"req_{int(time.time() * 1000)}_{hash(str(e)) % 10000:04d}",
             data=None
         )
+
+
+@router.post("/generate-image/batch")
+async def batch_generate_image_endpoint(
+        request: BatchImageGenerationRequest,
+        principal: Principal = Depends(get_current_principal),
+) -> StreamingResponse:
+    """
+    Generate images for many prompts, or a prompt x seed grid.
+
+    The batch is split into provider-sized calls (Kling returns up to 9
+    images per task, Replicate flux-dev up to 4), which run concurrently
+    within the provider quotas. Shared garment and reference images are
+    loaded and stored once, against the caller's upload quota, so the
+    endpoint requires sign-in. Results stream as NDJSON in completion order: one
+    BatchImageGenerationItem line per call, then a BatchSummary line.
+    """
+    garment_image_url = await stage_shared_image(request.garment_image_url, principal.id) if request.garment_image_url else None
+    reference_image = await stage_shared_image(request.reference_image, principal.id) if request.reference_image else None
+    shards = plan_generation_shards(request.prompts, request.provider, request.images_per_prompt, request.seeds)
+    concurrency = min(request.concurrency or settings.BATCH_GENERATION_CONCURRENCY, settings.BATCH_GENERATION_CONCURRENCY)
+    params = request.model_dump(exclude={"prompts", "seeds", "garment_image_url", "reference_image", "provider", "model", "concurrency"})
+
+    def run_shard(shard: GenerationShard):
+        return track_generation(
+            kind=GENERATION_KIND_IMAGE,
+            provider=request.provider.lower(),
+            model=request.model,
+            inputs={"garment_image_url": garment_image_url, "reference_image": reference_image},
+            params={**params, "prompt": shard.prompt, "seed": shard.seed, "num_images": shard.num_images},
+            user_id=principal.id,
+            reuse=generation_reuse(request.provider, shard.seed, garment_image_url),
+            run=lambda: generate_image(
+                prompt=shard.prompt,
+                garment_image_url=garment_image_url,
+                provider=request.provider,
+                model=request.model,
+                num_images=shard.num_images,
+                width=request.width,
+                height=request.height,
+                negative_prompt=request.negative_prompt if request.negative_prompt else 'low quality, unrealistic, no cloths',
+                reference_image=reference_image,
+                aspect_ratio=request.aspect_ratio,
+                guidance=request.guidance,
+                seed=shard.seed,
+                access_token=_generation_token(request.provider),
+            ),
+        )
+
+    return StreamingResponse(
+        _stream_batch(
+            shards, run_shard, concurrency,
+            lambda index, shard: BatchImageGenerationItem(index=index, prompt_index=shard.prompt_index, seed=shard.seed),
+        ),
+        media_type="application/x-ndjson",
+    )
@@ -1,9 +1,12 @@
-from typing import List, Optional
+from typing import Callable, List, Optional, Sequence, Tuple
 from pydantic import BaseModel
 from fastapi import HTTPException
+import asyncio
+import logging
 import time
 import os
 
+from src.config import settings
 from src.external_services.openai import analyze_image, generate_campaign
 
 from src.external_services.kling import (
@@ -15,6 +18,7 @@ from src.external_services.replicate import (
     ReplicateImageRequest,
 )
 from src.external_services.fal import (
+    upload_image as fal_upload_image,
     virtual_try_on as fal_virtual_try_on,
     FalVirtualTryOnRequest,
 )
@@ -22,7 +26,20 @@ from src.external_services.catvton import (
     virtual_try_on as catvton_virtual_try_on,
     CatVTONRequest,
 )
-from src.external_services.openai import analyze_image
+from src.external_services.kolors import (
+    virtual_try_on as kolors_virtual_try_on,
+    KolorsTryOnRequest,
+)
+from src.modules.history.schemas import GenerationResponse
+from src.modules.jobs.service import report_job_progress
+from src.modules.services.garment_descriptions import get_garment_description_cache
+from src.modules.services.image_preprocessing import get_image_preprocessor
+from src.modules.services.tryon_routing import get_tryon_router
+from src.modules.uploads.service import get_upload_quota, get_upload_store, load_image
+from src.modules.uploads.utils import is_upload_id
+from src.utils.result_cache import GENERATED_IMAGES_URL_PREFIX
+
+logger = logging.getLogger(__name__)
 
 class ImageGenerationResult(BaseModel):
     """
@@ -35,6 +52,7 @@ class ImageGenerationResult(BaseModel):
     updated_at: int
     logs: Optional[List[str]] = None
     campaign_content: Optional[str] = None
+    provider: Optional[str] = None
 
 class CampaignGenerationResult(BaseModel):
     """
@@ -46,6 +64,96 @@ class CampaignGenerationResult(BaseModel):
     created_at: int
     updated_at: int
 
+class GenerationShard(BaseModel):
+    """
+    One provider call of a batch generation
+    """
+    prompt_index: int
+    prompt: str
+    seed: Optional[int] = None
+    num_images: int
+
+# Most images a single provider call returns (Kling `n`, Replicate flux-dev `num_outputs`)
+PROVIDER_MAX_IMAGES_PER_CALL = {"kling": 9, "replicate": 4}
+# Providers that take a seed; the others would silently ignore one
+SEEDED_PROVIDERS = ("replicate",)
+# Try-on providers that always run with a fixed seed, so equal inputs give equal outputs
+DETERMINISTIC_TRY_ON_PROVIDERS = ("cat-vton",)
+
+def result_from_history(generation: GenerationResponse) -> ImageGenerationResult:
+    """
+    Rebuild a generation result from a recorded generation, for requests that
+    reuse an identical earlier one
+    """
+    return ImageGenerationResult(
+        task_id=f"reused_{generation.id}",
+        images=generation.images,
+        status="succeed",
+        created_at=int(generation.created_at.timestamp() * 1000),
+        updated_at=int((generation.finished_at or generation.created_at).timestamp() * 1000),
+        logs=[f"Reused the result of generation {generation.id}"],
+        provider=generation.provider,
+    )
+
+def try_on_reuse(model: str) -> Optional[Callable[[GenerationResponse], ImageGenerationResult]]:
+    """How a try-on on `model` is rebuilt from history, if its results are reusable"""
+    return result_from_history if model.lower() in DETERMINISTIC_TRY_ON_PROVIDERS else None
+
+def generation_reuse(
+    provider: str, seed: Optional[int], garment_image_url: Optional[str]
+) -> Optional[Callable[[GenerationResponse], ImageGenerationResult]]:
+    """How an image generation is rebuilt from history, if its results are reusable"""
+    # Unseeded outputs differ per run, and garment analysis puts a GPT-4o
+    # description into the prompt that isn't guaranteed to repeat
+    if seed is None or provider.lower() not in SEEDED_PROVIDERS or garment_image_url:
+        return None
+    return result_from_history
+
+async def _openai_image(image: str) -> str:
+    return (await get_image_preprocessor().prepare(image, "openai")).to_data_url()
+
+async def describe_garment(garment_image_url: str) -> str:
+    """
+    Describe a garment with GPT-4o, reusing earlier descriptions of the same image
+    """
+    prepared = await get_image_preprocessor().prepare(garment_image_url, "openai")
+    if not settings.GARMENT_DESCRIPTION_CACHE_ENABLED:
+        return await analyze_image(prepared.to_data_url())
+    return await get_garment_description_cache().get_or_create(
+        prepared.digest, lambda: analyze_image(prepared.to_data_url())
+    )
+
+def _consume_result(task: asyncio.Future) -> None:
+    # Analyses that outlive their deadline still warm the description cache;
+    # retrieve their outcome so failures aren't reported as unhandled
+    if not task.cancelled():
+        task.exception()
+
+async def _enrich_prompt(
+    prompt: str,
+    analysis: Optional[asyncio.Future],
+    timeout: float,
+    fallback: bool,
+) -> str:
+    """
+    Append the garment description to the prompt, waiting at most `timeout` seconds
+    """
+    if analysis is None:
+        return prompt
+    analysis.add_done_callback(_consume_result)
+    try:
+        description = await asyncio.wait_for(asyncio.shield(analysis), timeout or None)
+    except asyncio.TimeoutError:
+        if not fallback:
+            raise HTTPException(status_code=504, detail=f"Garment analysis did not finish within {timeout:g}s")
+        logger.warning("Garment analysis exceeded %gs, continuing with the original prompt", timeout)
+        return prompt
+    except Exception as e:
+        # Log the error but continue with original prompt
+        logger.warning("Failed to analyze garment image: %s", e)
+        return prompt
+    return f"{prompt}, wearing {description}"
+
 async def generate_campaign_content(
     prompt: str,
     garment_image_url: str,
@@ -58,7 +166,7 @@ async def generate_campaign_content(
         
         # Generate campaign content using OpenAI
         campaign_content = await generate_campaign(
-            image_url=garment_image_url,
+            image_url=await _openai_image(garment_image_url),
             prompt=prompt
         )
         
@@ -70,6 +178,8 @@ async def generate_campaign_content(
             updated_at=current_time
         )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -97,7 +207,7 @@ async def virtual_try_on_with_catvton(
         catvton_result = await catvton_virtual_try_on(catvton_request)
         
         # For cat-vton, return just the path part - frontend will prepend NEXT_PUBLIC_API_URL
-        image_url = f"api/generated-images/{os.path.basename(catvton_result.image_path)}"
+        image_url = GENERATED_IMAGES_URL_PREFIX + os.path.basename(catvton_result.image_path)
         
         return ImageGenerationResult(
             task_id=catvton_result.task_id,
@@ -108,11 +218,19 @@ async def virtual_try_on_with_catvton(
             logs=catvton_result.logs
         )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to perform CatVTON virtual try-on: {str(e)}")
 
+async def _fal_url(image: str, api_key: str) -> Tuple[str, str]:
+    """Upload the prepared image to FAL; returns its URL and content digest"""
+    prepared = await get_image_preprocessor().prepare(image, "leffa")
+    url = await fal_upload_image(prepared.digest, prepared.data, prepared.content_type, api_key)
+    return url, prepared.digest
+
 async def virtual_try_on_with_fal(
     human_image_url: str,
     garment_image_url: str,
@@ -125,10 +243,18 @@ async def virtual_try_on_with_fal(
     try:
         current_time = int(time.time() * 1000)
 
+        # Send FAL downscaled copies, each pushed to FAL storage once
+        (human_image_url, human_digest), (garment_image_url, garment_digest) = await asyncio.gather(
+            _fal_url(human_image_url, api_key),
+            _fal_url(garment_image_url, api_key),
+        )
+
         # Create request for FAL.AI
         vton_request = FalVirtualTryOnRequest(
             human_image_url=human_image_url,
             garment_image_url=garment_image_url,
+            human_image_digest=human_digest,
+            garment_image_digest=garment_digest,
         )
         
         # Perform virtual try-on
@@ -143,11 +269,168 @@ async def virtual_try_on_with_fal(
             logs=vton_result.logs
         )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to perform virtual try-on: {str(e)}")
 
+async def _kolors_image(image: str) -> str:
+    return (await get_image_preprocessor().prepare(image, "kolors")).to_base64()
+
+async def virtual_try_on_with_kolors(
+    human_image_url: str,
+    garment_image_url: str,
+    api_key: str,
+) -> ImageGenerationResult:
+    """
+    Perform virtual try-on with Kolors
+    """
+    try:
+        if not api_key:
+            raise HTTPException(status_code=503, detail="Kolors virtual try-on is not configured")
+        current_time = int(time.time() * 1000)
+
+        human_image, cloth_image = await asyncio.gather(
+            _kolors_image(human_image_url),
+            _kolors_image(garment_image_url),
+        )
+        kolors_result = await kolors_virtual_try_on(
+            KolorsTryOnRequest(human_image=human_image, cloth_image=cloth_image),
+            api_key,
+        )
+
+        return ImageGenerationResult(
+            task_id=kolors_result.task_id,
+            images=kolors_result.result_images,
+            status="succeed",
+            created_at=current_time,
+            updated_at=int(time.time() * 1000),
+            logs=kolors_result.logs
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to perform Kolors virtual try-on: {str(e)}")
+
+async def route_virtual_try_on(
+    human_image_url: str,
+    garment_image_url: str,
+    model: str,
+    garment_type: str = "overall",
+    routing: Optional[str] = None,
+) -> ImageGenerationResult:
+    """
+    Run a virtual try-on on the provider picked by the routing policy, failing
+    over to the next provider on errors (see tryon_routing.TryOnRouter)
+    """
+    async def attempt(provider: str) -> ImageGenerationResult:
+        result = await run_virtual_try_on(
+            human_image_url=human_image_url,
+            garment_image_url=garment_image_url,
+            model=provider,
+            garment_type=garment_type,
+        )
+        return result.model_copy(update={"provider": provider})
+
+    return await get_tryon_router().run(model, routing, attempt)
+
+async def stage_shared_image(image: str, user_id: str) -> str:
+    """
+    Decode or download an image used by every item of a batch once and keep
+    it in the upload store, so items reference it by upload id instead of
+    each re-decoding the same base64 payload. The stored copy counts against
+    the user's upload quota like any other upload.
+    """
+    if is_upload_id(image):
+        return image
+    quota = get_upload_quota()
+    max_bytes = min(settings.UPLOAD_MAX_BYTES, quota.remaining(user_id))
+    try:
+        loaded = await load_image(image)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load shared image: {str(e)}")
+    stored = await get_upload_store().save_bytes(loaded.data, max_bytes)
+    quota.charge(user_id, stored.size)
+    return stored.image_id
+
+async def run_virtual_try_on(
+    human_image_url: str,
+    garment_image_url: str,
+    model: str,
+    garment_type: str = "overall",
+) -> ImageGenerationResult:
+    """
+    Dispatch a virtual try-on to the provider named by `model`
+    """
+    if model.lower() == 'kolors':
+        return await virtual_try_on_with_kolors(
+            human_image_url=human_image_url,
+            garment_image_url=garment_image_url,
+            api_key=settings.KOLORS_API_KEY,
+        )
+    if model == 'leffa':
+        return await virtual_try_on_with_fal(
+            human_image_url=human_image_url,
+            garment_image_url=garment_image_url,
+            api_key=settings.FAL_API_KEY,
+            garment_type=garment_type
+        )
+    if model.lower() == 'cat-vton':
+        return await virtual_try_on_with_catvton(
+            human_image_url=human_image_url,
+            garment_image_url=garment_image_url,
+            garment_type=garment_type
+        )
+
+    # Placeholder for other models
+    current_time = int(time.time() * 1000)
+    return ImageGenerationResult(
+        task_id=f"placeholder_{current_time}",
+        images=[human_image_url],  # Return original image for now
+        status="succeed",
+        created_at=current_time,
+        updated_at=current_time,
+        logs=[f"Placeholder response for {model} model"]
+    )
+
+def plan_generation_shards(
+    prompts: Sequence[str],
+    provider: str,
+    images_per_prompt: int = 1,
+    seeds: Optional[Sequence[int]] = None,
+) -> List[GenerationShard]:
+    """
+    Split a batch (every prompt, or every prompt x seed) into provider calls
+    of at most PROVIDER_MAX_IMAGES_PER_CALL images. When a seeded cell needs n
+    calls, its k-th call uses seed * n + k: distinct for every (seed, k) in the
+    grid, and just the seed itself when one call is enough.
+    """
+    if seeds and provider.lower() not in SEEDED_PROVIDERS:
+        raise ValueError(f"Seeds are not supported by {provider}")
+    per_call = PROVIDER_MAX_IMAGES_PER_CALL.get(provider.lower(), 1)
+    calls_per_cell = -(-images_per_prompt // per_call)
+    shards = []
+    for prompt_index, prompt in enumerate(prompts):
+        for seed in (seeds or [None]):
+            remaining = images_per_prompt
+            while remaining > 0:
+                call_index = (images_per_prompt - remaining) // per_call
+                shards.append(GenerationShard(
+                    prompt_index=prompt_index,
+                    prompt=prompt,
+                    seed=seed * calls_per_cell + call_index if seed is not None else None,
+                    num_images=min(per_call, remaining),
+                ))
+                remaining -= per_call
+    return shards
+
 async def generate_image(
     prompt: str,
     provider: str,
@@ -160,25 +443,44 @@ async def generate_image(
     reference_image: Optional[str] = None,
     aspect_ratio: Optional[str] = None,
     guidance: Optional[float] = 3.5,
+    seed: Optional[int] = None,
     access_token: str = None,
+    garment_analysis_timeout: Optional[float] = None,
+    garment_analysis_fallback: bool = True,
 ) -> ImageGenerationResult:
     """
     Generate images using the specified provider and model
+
+    Garment analysis runs under `garment_analysis_timeout` seconds (the
+    GARMENT_ANALYSIS_TIMEOUT_SECONDS setting by default, 0 for no limit).
+    When it misses the deadline the bare prompt is used, or the request
+    fails with 504 if `garment_analysis_fallback` is False.
     """
     try:
         current_time = int(time.time() * 1000)  # Convert to milliseconds
+        if garment_analysis_timeout is None:
+            garment_analysis_timeout = settings.GARMENT_ANALYSIS_TIMEOUT_SECONDS
+
+        # Garment analysis and reference image preparation run concurrently
+        analysis = asyncio.ensure_future(describe_garment(garment_image_url)) if garment_image_url else None
+        reference = None
+        if provider.lower() == "kling" and reference_image:
+            reference = asyncio.ensure_future(get_image_preprocessor().prepare(reference_image, "kling"))
 
-        # Get garment description from OpenAI if image URL is provided
-        enhanced_prompt = prompt
-        if garment_image_url:
-            try:
-                description = await analyze_image(garment_image_url)
-                enhanced_prompt = f"{prompt}, wearing {description}"
-            except Exception as e:
-                # Log the error but continue with original prompt
-                print(f"Warning: Failed to analyze garment image: {str(e)}")
+        try:
+            enhanced_prompt = await _enrich_prompt(
+                prompt, analysis, garment_analysis_timeout, garment_analysis_fallback
+            )
+        except BaseException:
+            if reference is not None:
+                reference.cancel()
+            raise
 
         if provider.lower() == "kling":
+            # Kling takes a URL or bare base64 for the reference image
+            if reference is not None:
+                reference_image = (await reference).to_base64()
+
             # Use Kling AI service
             request = KlingImageRequest(
                 prompt=enhanced_prompt,
@@ -206,9 +508,15 @@ async def generate_image(
             request = ReplicateImageRequest(
                 prompt=enhanced_prompt,
                 guidance=guidance,
-                num_outputs=num_images
+                num_outputs=num_images,
+                seed=seed
+            )
+            # Surfaces prediction progress when this runs as a background job
+            result = await generate_image_with_replicate(
+                request,
+                access_token,
+                on_progress=lambda progress: report_job_progress(progress.model_dump()),
             )
-            result = await generate_image_with_replicate(request, access_token)
             
             return ImageGenerationResult(
                 task_id=result.task_id,
@@ -221,6 +529,8 @@ async def generate_image(
         else:
             raise ValueError(f"Unsupported provider: {provider}. Supported providers: kling, replicate")
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -0,0 +1,32 @@
+"""
+Constants for jobs module
+"""
+
+# Job kinds
+JOB_KIND_VIRTUAL_TRY_ON = "virtual-try-on"
+
+# Job statuses
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEED = "succeed"
+JOB_STATUS_FAILED = "failed"
+TERMINAL_JOB_STATUSES = (JOB_STATUS_SUCCEED, JOB_STATUS_FAILED)
+
+# Store backends
+JOB_STORE_MEMORY = "memory"
+JOB_STORE_DATABASE = "database"
+
+# Minimum seconds between sweeps of the database job store
+JOB_PRUNE_INTERVAL_SECONDS = 60
+
+# Default in-flight limit per provider when JOB_PROVIDER_CONCURRENCY doesn't name it
+DEFAULT_PROVIDER_CONCURRENCY = 8
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+
+# Error messages
+JOB_NOT_FOUND_ERROR = "Job not found"
+JOB_QUEUE_FULL_ERROR = "Job queue is full, try again later"
+UNKNOWN_JOB_PROVIDER_ERROR = "Unknown job provider"
+JOB_ABANDONED_ERROR = "Job was interrupted before it finished, please submit it again"
@@ -0,0 +1,10 @@
+"""
+Dependencies for jobs module
+"""
+
+from .service import JobManager, current_job_manager
+
+
+def get_job_manager() -> JobManager:
+    """Dependency to get the application job manager"""
+    return current_job_manager()
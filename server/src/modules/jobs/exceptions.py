@@ -0,0 +1,37 @@
+"""
+Custom exceptions for jobs module
+"""
+
+from fastapi import HTTPException, status
+from .constants import JOB_NOT_FOUND_ERROR, JOB_QUEUE_FULL_ERROR, UNKNOWN_JOB_PROVIDER_ERROR
+
+
+class JobNotFoundException(HTTPException):
+    """Exception raised when a job id is unknown."""
+
+    def __init__(self, job_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{JOB_NOT_FOUND_ERROR}: {job_id}",
+        )
+
+
+class JobQueueFullException(HTTPException):
+    """Exception raised when the job queue cannot accept more work."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=JOB_QUEUE_FULL_ERROR,
+            headers={"Retry-After": "5"},
+        )
+
+
+class UnknownJobProviderException(HTTPException):
+    """Exception raised when a job names a provider the manager has no queue for."""
+
+    def __init__(self, provider: str):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{UNKNOWN_JOB_PROVIDER_ERROR}: {provider}",
+        )
@@ -0,0 +1,145 @@
+"""
+Router for jobs module
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_optional_principal
+from src.modules.history.constants import GENERATION_KIND_VIRTUAL_TRY_ON
+from src.modules.history.service import track_generation
+from src.modules.image_generation.service import route_virtual_try_on, try_on_reuse
+from src.modules.services.tryon_routing import get_tryon_router
+from .constants import EVENT_STREAM_KEEPALIVE_SECONDS, JOB_KIND_VIRTUAL_TRY_ON
+from .dependencies import get_job_manager
+from .schemas import JobResponse, JobSubmitted, VirtualTryOnJobCreate
+from .service import JobManager
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _submitted(request: Request, job: JobResponse) -> JobSubmitted:
+    return JobSubmitted(
+        job_id=job.id,
+        status=job.status,
+        status_url=str(request.url_for("get_job", job_id=job.id)),
+        events_url=str(request.url_for("stream_job_events", job_id=job.id)),
+    )
+
+
+def _caller_id(principal: Optional[Principal]) -> Optional[str]:
+    return principal.id if principal else None
+
+
+@router.post("/virtual-try-on", response_model=JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_virtual_try_on(
+    request: Request,
+    job_data: VirtualTryOnJobCreate,
+    manager: JobManager = Depends(get_job_manager),
+    principal: Optional[Principal] = Depends(get_optional_principal),
+):
+    """Queue a virtual try-on and return its job id without waiting for inference"""
+    # Routed jobs wait in the queue of the provider they'll most likely run on,
+    # so per-provider concurrency limits still hold for "auto"
+    job = await manager.submit(
+        kind=JOB_KIND_VIRTUAL_TRY_ON,
+        provider=get_tryon_router().pick(job_data.model, job_data.routing),
+        handler=lambda: track_generation(
+            kind=GENERATION_KIND_VIRTUAL_TRY_ON,
+            provider=job_data.model.lower(),
+            inputs={"human_image_url": job_data.human_image_url, "garment_image_url": job_data.garment_image_url},
+            params={"garment_type": job_data.garment_type},
+            user_id=_caller_id(principal),
+            reuse=try_on_reuse(job_data.model),
+            run=lambda: route_virtual_try_on(
+                human_image_url=job_data.human_image_url,
+                garment_image_url=job_data.garment_image_url,
+                model=job_data.model,
+                garment_type=job_data.garment_type,
+                routing=job_data.routing,
+            ),
+        ),
+        user_id=_caller_id(principal),
+    )
+    return _submitted(request, job)
+
+
+@router.get("/stats")
+async def get_job_stats(manager: JobManager = Depends(get_job_manager)):
+    """Queue depth and worker counts for this process"""
+    return manager.stats()
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    manager: JobManager = Depends(get_job_manager),
+    principal: Optional[Principal] = Depends(get_optional_principal),
+):
+    """Poll the state of a job"""
+    return await manager.get_visible(job_id, _caller_id(principal))
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    manager: JobManager = Depends(get_job_manager),
+    principal: Optional[Principal] = Depends(get_optional_principal),
+):
+    """Stream job state changes as server-sent events until the job finishes"""
+    # Fail with a regular 404 before the stream starts
+    await manager.get_visible(job_id, _caller_id(principal))
+
+    async def event_stream() -> AsyncIterator[str]:
+        events = manager.events(job_id).__aiter__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_event}, timeout=EVENT_STREAM_KEEPALIVE_SECONDS)
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                try:
+                    job = next_event.result()
+                except StopAsyncIteration:
+                    return
+                yield f"event: {job.status}\ndata: {job.model_dump_json()}\n\n"
+                next_event = asyncio.ensure_future(events.__anext__())
+        finally:
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/{job_id}/ws")
+async def job_websocket(websocket: WebSocket, job_id: str):
+    """
+    Push job state changes over a WebSocket until the job finishes. Browsers
+    can't set headers on WebSockets, so the access token may also be passed
+    as the `token` query parameter.
+    """
+    manager = get_job_manager()
+    await websocket.accept()
+    try:
+        token = websocket.query_params.get("token")
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and credentials:
+            token = credentials
+        principal = await get_optional_principal(token)
+        await manager.get_visible(job_id, _caller_id(principal))
+        async for job in manager.events(job_id):
+            await websocket.send_text(job.model_dump_json())
+        await websocket.close()
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+    except WebSocketDisconnect:
+        pass
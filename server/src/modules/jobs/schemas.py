@@ -0,0 +1,57 @@
+"""
+Pydantic schemas for jobs module
+"""
+
+from typing import Any, Dict, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+class VirtualTryOnJobCreate(BaseModel):
+    """Schema for submitting a virtual try-on job"""
+
+    human_image_url: str = Field(..., description="URL or upload id of the person image")
+    garment_image_url: str = Field(..., description="URL, upload id or base64 data of the garment image")
+    model: str = Field(..., description="Model to use for virtual try-on (leffa, cat-vton, kolors or auto)")
+    garment_type: str = Field("overall", description="Type of garment (upper, lower, or overall)")
+    routing: Optional[str] = Field(None, pattern="^(fastest|cheapest|strict)$", description="Provider routing policy")
+
+
+class JobResponse(BaseModel):
+    """Schema for job state"""
+
+    id: str = Field(..., description="Job ID in UUID format")
+    kind: str
+    provider: str
+    user_id: Optional[str] = Field(None, exclude=True)
+    status: str
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def validate_uuid(cls, v):
+        """Convert UUID to string if needed"""
+        return str(v) if not isinstance(v, str) else v
+
+    @field_validator("user_id", mode="before")
+    @classmethod
+    def validate_user_id(cls, v):
+        """Convert UUID to string if needed"""
+        return str(v) if v is not None and not isinstance(v, str) else v
+
+
+class JobSubmitted(BaseModel):
+    """Schema for the immediate response to a job submission"""
+
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
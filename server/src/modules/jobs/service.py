@@ -0,0 +1,246 @@
+"""
+Service layer for jobs module.
+
+Jobs are accepted immediately and executed by a bounded pool of background
+workers, so long provider inferences no longer hold an HTTP request (and a
+server worker slot) open. Each provider gets its own queue and worker set,
+which caps its concurrency without blocking jobs for other providers.
+
+Handlers can publish intermediate progress (e.g. a provider's status and
+percentage) with report_job_progress; it reaches the same SSE and WebSocket
+subscribers as the status changes.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, UTC
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from src.config import settings
+from src.modules.services.tryon_routing import get_tryon_router
+from src.utils.common import parse_int_mapping
+from .constants import (
+    DEFAULT_PROVIDER_CONCURRENCY,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_RUNNING,
+    JOB_STATUS_SUCCEED,
+    TERMINAL_JOB_STATUSES,
+)
+from .exceptions import JobNotFoundException, JobQueueFullException, UnknownJobProviderException
+from .schemas import JobResponse
+from .store import JobStore, create_job_store
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[], Awaitable[Any]]
+
+# The manager and id of the job the current task is running, if any
+_running_job: ContextVar[Optional[Tuple["JobManager", str]]] = ContextVar("running_job", default=None)
+
+
+class JobManager:
+    """Bounded background executor with per-provider concurrency limits"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        max_workers: int = 32,
+        max_queued: int = 10000,
+        provider_limits: Optional[Dict[str, int]] = None,
+        poll_interval: float = 2.0,
+        providers: Optional[Iterable[str]] = None,
+    ):
+        self.store = store
+        self.max_queued = max_queued
+        self.provider_limits = provider_limits or {}
+        # Providers that may get a queue (and its workers); None allows any
+        self.providers = {provider.lower() for provider in providers} if providers is not None else None
+        # Store re-read interval for event streams; covers jobs run by another process
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(max_workers)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._queued = 0
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def _queue_for(self, provider: str) -> asyncio.Queue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            if self.providers is not None and provider.lower() not in self.providers:
+                raise UnknownJobProviderException(provider)
+            queue = asyncio.Queue()
+            self._queues[provider] = queue
+            limit = self.provider_limits.get(provider.lower(), DEFAULT_PROVIDER_CONCURRENCY)
+            for _ in range(max(1, limit)):
+                self._workers.append(asyncio.create_task(self._worker(queue)))
+        return queue
+
+    async def submit(
+        self, kind: str, provider: str, handler: JobHandler, user_id: Optional[str] = None
+    ) -> JobResponse:
+        """
+        Queue a job and return it immediately in the queued state
+
+        Args:
+            kind: Job kind, e.g. "virtual-try-on"
+            provider: Provider the job runs against (concurrency is limited per provider)
+            handler: Coroutine factory producing the job result
+            user_id: Signed-in submitter; only they can read the job afterwards
+
+        Raises:
+            JobQueueFullException: If the queue is at capacity
+            UnknownJobProviderException: If the provider isn't one the manager runs jobs for
+        """
+        if self._queued >= self.max_queued:
+            raise JobQueueFullException()
+
+        queue = self._queue_for(provider)
+        job = await self.store.create(kind=kind, provider=provider, user_id=user_id)
+        self._queued += 1
+        queue.put_nowait((job.id, handler))
+        return job
+
+    async def get(self, job_id: str) -> JobResponse:
+        """Get a job or raise 404"""
+        job = await self.store.get(job_id)
+        if not job:
+            raise JobNotFoundException(job_id)
+        return job
+
+    async def get_visible(self, job_id: str, user_id: Optional[str]) -> JobResponse:
+        """
+        Get a job the caller may read or raise 404. Jobs submitted by a
+        signed-in user are hidden from everyone else, without revealing that
+        they exist.
+        """
+        job = await self.get(job_id)
+        if job.user_id is not None and job.user_id != user_id:
+            raise JobNotFoundException(job_id)
+        return job
+
+    async def events(self, job_id: str) -> AsyncIterator[JobResponse]:
+        """
+        Yield the job's current state and then every change until it finishes
+        """
+        updates: asyncio.Queue = asyncio.Queue()
+        self._subscribers[job_id].add(updates)
+        try:
+            job = await self.get(job_id)
+            yield job
+            while job.status not in TERMINAL_JOB_STATUSES:
+                try:
+                    job = await asyncio.wait_for(updates.get(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    latest = await self.get(job_id)
+                    if latest.updated_at == job.updated_at:
+                        continue
+                    job = latest
+                yield job
+        finally:
+            self._subscribers[job_id].discard(updates)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    async def report_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        """Record a running job's latest progress and push it to subscribers"""
+        await self._update(job_id, progress=progress)
+
+    async def _update(self, job_id: str, **changes: Any) -> None:
+        job = await self.store.update(job_id, **changes)
+        if not job:
+            return
+        for updates in self._subscribers.get(job_id, ()):
+            updates.put_nowait(job)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job_id, handler = await queue.get()
+            try:
+                async with self._slots:
+                    self._queued -= 1
+                    await self._run(job_id, handler)
+            except Exception:
+                logger.exception("Job worker error for %s", job_id)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str, handler: JobHandler) -> None:
+        await self._update(job_id, status=JOB_STATUS_RUNNING, started_at=datetime.now(UTC))
+        running = _running_job.set((self, job_id))
+        try:
+            result = await handler()
+        except HTTPException as e:
+            await self._update(job_id, status=JOB_STATUS_FAILED, error=str(e.detail), finished_at=datetime.now(UTC))
+        except Exception as e:
+            await self._update(job_id, status=JOB_STATUS_FAILED, error=str(e), finished_at=datetime.now(UTC))
+        else:
+            if isinstance(result, BaseModel):
+                result = result.model_dump()
+            await self._update(job_id, status=JOB_STATUS_SUCCEED, result=result, finished_at=datetime.now(UTC))
+        finally:
+            _running_job.reset(running)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and worker counts"""
+        return {
+            "queued": self._queued,
+            "workers": len(self._workers),
+            "providers": {provider: queue.qsize() for provider, queue in self._queues.items()},
+        }
+
+    async def close(self) -> None:
+        """Cancel all workers; queued jobs are abandoned"""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queues.clear()
+
+
+_manager: Optional[JobManager] = None
+
+
+async def init_job_manager() -> JobManager:
+    """Create the application job manager (called from the FastAPI lifespan)"""
+    global _manager
+    if _manager is None:
+        store = create_job_store(
+            settings.JOB_STORE_BACKEND, settings.JOB_RESULT_TTL_SECONDS, settings.JOB_STALE_SECONDS
+        )
+        await store.start()
+        _manager = JobManager(
+            store=store,
+            max_workers=settings.JOB_WORKERS,
+            max_queued=settings.JOB_QUEUE_SIZE,
+            provider_limits=parse_int_mapping(settings.JOB_PROVIDER_CONCURRENCY),
+            providers=get_tryon_router().providers,
+        )
+    return _manager
+
+
+async def close_job_manager() -> None:
+    """Stop the application job manager (called from the FastAPI lifespan)"""
+    global _manager
+    if _manager is not None:
+        await _manager.close()
+        _manager = None
+
+
+async def report_job_progress(progress: Dict[str, Any]) -> None:
+    """Publish progress for the job the calling task runs; a no-op outside a job"""
+    running = _running_job.get()
+    if running is not None:
+        manager, job_id = running
+        await manager.report_progress(job_id, progress)
+
+
+def current_job_manager() -> JobManager:
+    """Get the application job manager"""
+    if _manager is None:
+        raise RuntimeError("Job manager is not running")
+    return _manager
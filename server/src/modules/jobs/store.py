@@ -0,0 +1,154 @@
+"""
+Pluggable persistence backends for jobs
+"""
+
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from src.models.job import Job
+from .constants import (
+    JOB_ABANDONED_ERROR,
+    JOB_PRUNE_INTERVAL_SECONDS,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    JOB_STORE_DATABASE,
+    JOB_STORE_MEMORY,
+    TERMINAL_JOB_STATUSES,
+)
+from .schemas import JobResponse
+
+
+class JobStore(ABC):
+    """Interface every job store backend implements"""
+
+    async def start(self) -> None:
+        """Prepare the store before the manager accepts jobs"""
+
+    @abstractmethod
+    async def create(self, kind: str, provider: str, user_id: Optional[str] = None) -> JobResponse:
+        """Create a queued job, owned by `user_id` if given, and return it"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[JobResponse]:
+        """Get a job by ID"""
+
+    @abstractmethod
+    async def update(self, job_id: str, **changes: Any) -> Optional[JobResponse]:
+        """Apply field changes to a job and return the updated job"""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Process-local job store. Fast, but jobs are only visible to the worker
+    process that accepted them and are lost on restart.
+    """
+
+    def __init__(self, result_ttl_seconds: int = 3600):
+        self.result_ttl_seconds = result_ttl_seconds
+        self._jobs: Dict[str, JobResponse] = {}
+        self._finished_at: Dict[str, float] = {}
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        for job_id in [job_id for job_id, finished in self._finished_at.items() if finished < cutoff]:
+            self._jobs.pop(job_id, None)
+            self._finished_at.pop(job_id, None)
+
+    async def create(self, kind: str, provider: str, user_id: Optional[str] = None) -> JobResponse:
+        self._prune()
+        now = datetime.now(UTC)
+        job = JobResponse(
+            id=str(uuid4()),
+            kind=kind,
+            provider=provider,
+            user_id=user_id,
+            status=JOB_STATUS_QUEUED,
+            created_at=now,
+            updated_at=now,
+        )
+        self._jobs[job.id] = job
+        return job
+
+    async def get(self, job_id: str) -> Optional[JobResponse]:
+        return self._jobs.get(job_id)
+
+    async def update(self, job_id: str, **changes: Any) -> Optional[JobResponse]:
+        job = self._jobs.get(job_id)
+        if not job:
+            return None
+        job = job.model_copy(update={**changes, "updated_at": datetime.now(UTC)})
+        self._jobs[job_id] = job
+        if job.status in TERMINAL_JOB_STATUSES:
+            self._finished_at[job_id] = time.monotonic()
+        return job
+
+
+class TortoiseJobStore(JobStore):
+    """
+    Postgres-backed job store, shared by every worker process.
+
+    Finished jobs are deleted once older than the result TTL. Queued or
+    running jobs that haven't changed for `stale_seconds` belonged to a
+    process that went away, so they are marked failed. Both sweeps run on
+    start and then at most once per JOB_PRUNE_INTERVAL_SECONDS as jobs are
+    created. The staleness window, rather than "everything unfinished at
+    start", keeps one worker restarting from failing its siblings' jobs.
+    """
+
+    def __init__(self, result_ttl_seconds: int = 3600, stale_seconds: int = 1800):
+        self.result_ttl_seconds = result_ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._pruned_at: Optional[float] = None
+
+    async def start(self) -> None:
+        await self._prune()
+
+    async def _prune(self) -> None:
+        if self._pruned_at is not None and time.monotonic() - self._pruned_at < JOB_PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = time.monotonic()
+        now = datetime.now(UTC)
+        await Job.filter(
+            status__in=(JOB_STATUS_QUEUED, JOB_STATUS_RUNNING),
+            updated_at__lt=now - timedelta(seconds=self.stale_seconds),
+        ).update(status=JOB_STATUS_FAILED, error=JOB_ABANDONED_ERROR, finished_at=now, updated_at=now)
+        await Job.filter(
+            status__in=TERMINAL_JOB_STATUSES,
+            finished_at__lt=now - timedelta(seconds=self.result_ttl_seconds),
+        ).delete()
+
+    async def create(self, kind: str, provider: str, user_id: Optional[str] = None) -> JobResponse:
+        await self._prune()
+        job = await Job.create(kind=kind, provider=provider, user_id=user_id, status=JOB_STATUS_QUEUED)
+        return JobResponse.model_validate(job)
+
+    async def get(self, job_id: str) -> Optional[JobResponse]:
+        try:
+            job = await Job.get_or_none(id=job_id)
+        except ValueError:
+            # Not a valid UUID
+            return None
+        return JobResponse.model_validate(job) if job else None
+
+    async def update(self, job_id: str, **changes: Any) -> Optional[JobResponse]:
+        job = await Job.get_or_none(id=job_id)
+        if not job:
+            return None
+        job.update_from_dict(changes)
+        await job.save()
+        return JobResponse.model_validate(job)
+
+
+def create_job_store(backend: str, result_ttl_seconds: int = 3600, stale_seconds: int = 1800) -> JobStore:
+    """
+    Build the job store configured by JOB_STORE_BACKEND
+    """
+    if backend == JOB_STORE_MEMORY:
+        return InMemoryJobStore(result_ttl_seconds=result_ttl_seconds)
+    if backend == JOB_STORE_DATABASE:
+        return TortoiseJobStore(result_ttl_seconds=result_ttl_seconds, stale_seconds=stale_seconds)
+    raise ValueError(f"Unsupported job store backend: {backend}. Supported backends: memory, database")
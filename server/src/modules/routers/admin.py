@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
 from src.models.user import User
-from src.modules.auth.dependencies import get_current_user
-from typing import List
+from src.models.garment_description import GarmentDescription
+from src.modules.services.garment_descriptions import get_garment_description_cache
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_verified_principal
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from pydantic import BaseModel
+from datetime import datetime
 from tortoise.contrib.pydantic import pydantic_model_creator
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -13,7 +25,7 @@ UserPydantic = pydantic_model_creator(
     exclude=("password_hash", "verification_code", "verification_code_expires_at")
 )
 
-async def check_admin_access(current_user: User = Depends(get_current_user)):
+async def check_admin_access(current_user: Principal = Depends(get_verified_principal)):
     """Check if the current user has admin access"""
     if not current_user.is_admin:
         raise HTTPException(
@@ -22,7 +34,165 @@ async def check_admin_access(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+# Sortable columns for the user listing; the id breaks ties so pages never overlap
+USER_SORT_FIELDS = ("created_at", "email", "name")
+MAX_USERS_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+class UserFilters(BaseModel):
+    is_admin: Optional[bool] = None
+    verified: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        if self.is_admin is not None:
+            queryset = queryset.filter(is_admin=self.is_admin)
+        if self.verified is not None:
+            queryset = queryset.filter(verified=self.verified)
+        if self.created_after is not None:
+            queryset = queryset.filter(created_at__gte=self.created_after)
+        if self.created_before is not None:
+            queryset = queryset.filter(created_at__lt=self.created_before)
+        return queryset
+
+
+def _encode_cursor(user, field: str) -> str:
+    value = getattr(user, field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, str(user.id)]).encode()).decode()
+
+
+def _decode_cursor(cursor: str, field: str) -> Tuple[Any, str]:
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if field == "created_at":
+            value = datetime.fromisoformat(value)
+        return value, user_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_sort(sort: str) -> Tuple[str, bool]:
+    field = sort.lstrip("-")
+    if field not in USER_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field: {field}. Use one of {', '.join(USER_SORT_FIELDS)}")
+    return field, sort.startswith("-")
+
+
+async def _users_page(
+    filters: UserFilters, field: str, descending: bool, limit: int, cursor: Optional[str] = None
+) -> Tuple[list, Optional[str]]:
+    """One keyset page of users plus the cursor for the next page (None on the last page)"""
+    queryset = filters.apply(User.all())
+    if cursor:
+        value, user_id = _decode_cursor(cursor, field)
+        op = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": user_id})
+        )
+    direction = "-" if descending else ""
+    users = await UserPydantic.from_queryset(
+        queryset.order_by(f"{direction}{field}", f"{direction}id").limit(limit + 1)
+    )
+    next_cursor = _encode_cursor(users[limit - 1], field) if len(users) > limit else None
+    return users[:limit], next_cursor
+
+
 @router.get("/users", response_model=List[UserPydantic])
-async def get_users(current_user: User = Depends(check_admin_access)):
-    """Get all users in the system"""
-    return await UserPydantic.from_queryset(User.all())
+async def get_users(
+    request: Request,
+    response: Response,
+    filters: UserFilters = Depends(),
+    sort: str = "-created_at",
+    limit: int = Query(100, ge=1, le=MAX_USERS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(check_admin_access),
+):
+    """
+    Get one page of users. The next page is requested with the cursor from
+    the X-Next-Cursor header (also given as a Link header); the header is
+    absent on the last page.
+    """
+    field, descending = _parse_sort(sort)
+    users, next_cursor = await _users_page(filters, field, descending, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return users
+
+
+@router.get("/users/export")
+async def export_users(
+    filters: UserFilters = Depends(),
+    sort: str = "created_at",
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: Principal = Depends(check_admin_access),
+):
+    """Stream every matching user as NDJSON or CSV, reading the table in keyset batches"""
+    field, descending = _parse_sort(sort)
+    columns = list(UserPydantic.model_fields)
+
+    async def rows() -> AsyncIterator[str]:
+        if format == "csv":
+            yield _csv_line(columns)
+        cursor = None
+        while True:
+            users, cursor = await _users_page(filters, field, descending, EXPORT_BATCH_SIZE, cursor)
+            chunk = []
+            for user in users:
+                data = user.model_dump(mode="json")
+                chunk.append(_csv_line([data[column] for column in columns]) if format == "csv" else json.dumps(data) + "\n")
+            yield "".join(chunk)
+            if cursor is None:
+                break
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+class GarmentDescriptionPydantic(BaseModel):
+    image_hash: str
+    description: str
+    model: str
+    created_at: datetime
+    expires_at: datetime | None = None
+
+
+@router.get("/garment-descriptions", response_model=List[GarmentDescriptionPydantic])
+async def get_garment_descriptions(limit: int = 100, current_user: Principal = Depends(check_admin_access)):
+    """List the most recent cached garment descriptions"""
+    rows = await GarmentDescription.all().order_by("-created_at").limit(min(limit, 1000))
+    return [GarmentDescriptionPydantic.model_validate(row, from_attributes=True) for row in rows]
+
+
+@router.get("/garment-descriptions/stats")
+async def get_garment_description_stats(current_user: Principal = Depends(check_admin_access)):
+    """In-process garment description cache counters"""
+    return get_garment_description_cache().stats()
+
+
+@router.delete("/garment-descriptions/{image_hash}")
+async def invalidate_garment_description(image_hash: str, current_user: Principal = Depends(check_admin_access)):
+    """Forget a cached garment description so the next request re-analyses the image"""
+    if not await get_garment_description_cache().invalidate(image_hash):
+        raise HTTPException(status_code=404, detail="Garment description not found")
+    return {"deleted": image_hash}
+
+
+@router.post("/garment-descriptions/purge-expired")
+async def purge_expired_garment_descriptions(current_user: Principal = Depends(check_admin_access)):
+    """Delete garment descriptions past their TTL"""
+    return {"deleted": await get_garment_description_cache().purge_expired()}
@@ -1,30 +1,129 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
 from pathlib import Path
-from ...config.constants import OUTPUT_DIR
+from ...config.constants import IMMUTABLE_CACHE_CONTROL
+from ..services.image_variants import VARIANT_FORMATS, get_image_variants, variant_width
+from ...utils.storage import ObjectStorage, StoredObject, get_storage
 
 generated_images_router = APIRouter(tags=["generated-images"])
 
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _not_modified(headers: Mapping[str, str], etag: str, modified: float) -> bool:
+    """Whether a conditional GET can be answered with 304"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _single_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into an inclusive (start, end); None serves
+    the whole image, which is also the answer to multi-range requests
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            first, last = int(start), min(int(end), size - 1) if end else size - 1
+        else:
+            first, last = max(size - int(end), 0), size - 1
+    except ValueError:
+        return None
+    if first > last or first >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return first, last
+
+
+async def _stored_response(request: Request, storage: ObjectStorage, stored: StoredObject, headers: dict) -> Response:
+    # Backends without local files: the image is small, so slice it in memory
+    try:
+        data = await storage.read(stored.key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Image not found: {stored.key}")
+    headers = {**headers, "Accept-Ranges": "bytes", "Content-Disposition": f'attachment; filename="{stored.key}"'}
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == headers["ETag"]:
+        byte_range = _single_range(request.headers.get("range"), len(data))
+    if byte_range is None:
+        return Response(data, media_type=stored.content_type, headers=headers)
+    first, last = byte_range
+    return Response(
+        data[first:last + 1],
+        status_code=206,
+        media_type=stored.content_type,
+        headers={**headers, "Content-Range": f"bytes {first}-{last}/{len(data)}"},
+    )
+
+
 @generated_images_router.get("/generated-images/{image_name}")
-async def get_generated_image(image_name: str):
+async def get_generated_image(
+    image_name: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Maximum width; rounded up to a standard breakpoint"),
+    fmt: Optional[str] = Query(None, pattern=f"^({'|'.join(VARIANT_FORMATS)})$", description="Output format"),
+):
     """
-    Serve generated images from the output directory
+    Serve generated images from storage, or a resized / re-encoded variant
+    of one when `w` or `fmt` is given (e.g. ?w=256&fmt=webp for gallery grids).
+
+    Images never change once written, so responses carry a year-long
+    immutable Cache-Control and a strong ETag from the content hash;
+    conditional requests get 304 and Range requests get 206.
     """
     # Ensure the image name is safe and doesn't contain path traversal
     safe_name = Path(image_name).name
-    image_path = os.path.join(OUTPUT_DIR, safe_name)
-    
-    print(f"Debug - Looking for image at: {image_path}")
-    print(f"Debug - Current directory: {os.getcwd()}")
-    print(f"Debug - Directory contents: {os.listdir(OUTPUT_DIR)}")
-    
-    if not os.path.exists(image_path):
-        raise HTTPException(status_code=404, detail=f"Image not found at {image_path}")
-    
-    # Serve the image file with appropriate content type
-    return FileResponse(
-        image_path,
-        media_type="image/png",
-        filename=safe_name
-    )
+    storage = get_storage()
+
+    # The index answers most lookups; another worker may have written the image since
+    stored = storage.stat(safe_name) or await storage.refresh(safe_name)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Image not found: {safe_name}")
+    stored = await storage.ensure_digest(stored)
+
+    if w is not None or fmt is not None:
+        variants = get_image_variants()
+        fmt = fmt or ("png" if stored.content_type == "image/png" else "jpeg")
+        try:
+            stored = await variants.get(storage, stored, variant_width(w), fmt)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Image not found: {safe_name}")
+        except OSError:
+            raise HTTPException(status_code=415, detail=f"Cannot render a variant of {safe_name}")
+        storage = variants.storage
+        stored = await storage.ensure_digest(stored)
+
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{stored.digest}"',
+        "Last-Modified": formatdate(stored.modified, usegmt=True),
+    }
+    if _not_modified(request.headers, headers["ETag"], stored.modified):
+        return Response(status_code=304, headers=headers)
+
+    if stored.path:
+        # FileResponse streams the file and serves Range / If-Range itself
+        return FileResponse(
+            stored.path,
+            media_type=stored.content_type,
+            filename=stored.key,
+            headers=headers,
+        )
+    return await _stored_response(request, storage, stored, headers)
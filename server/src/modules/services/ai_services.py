@@ -86,22 +86,25 @@ async def generate_captions(product_description: str, campaign_context: str) ->
     return response.choices[0].message.content.strip()
 
 
-def pil_image_to_base64(image, format: str = "PNG") -> str:
+def pil_image_to_bytes(image, format: str = "PNG", **save_options) -> bytes:
     try:
         # If image is a file path, open it
         if isinstance(image, str):
             image = Image.open(image)
         elif not isinstance(image, Image.Image):
             raise ValueError("Input must be either a file path or a PIL Image object")
-        
-        # Convert the image to Base64
+
+        # Encode the image in the requested format
         buffered = BytesIO()
-        image.save(buffered, format=format)
-        buffered.seek(0)  # Go to the start of the BytesIO stream
-        image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        return image_base64
+        image.save(buffered, format=format, **save_options)
+        return buffered.getvalue()
     except Exception as e:
-        print(f"Error converting image to Base64: {e}")
+        print(f"Error encoding image: {e}")
         raise e
 
 
+def pil_image_to_base64(image, format: str = "PNG", **save_options) -> str:
+    # Convert the image to Base64
+    return base64.b64encode(pil_image_to_bytes(image, format, **save_options)).decode("utf-8")
+
+
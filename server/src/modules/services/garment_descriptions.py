@@ -0,0 +1,100 @@
+# src/modules/services/garment_descriptions.py
+
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Awaitable, Callable, Optional
+
+from src.config import settings
+from src.models.garment_description import GarmentDescription
+from src.utils.cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Stored alongside each description; rows written by a different model are treated as misses
+GARMENT_DESCRIPTION_MODEL = "gpt-4o"
+
+
+class GarmentDescriptionCache:
+    """
+    Garment descriptions keyed by image content hash: an in-process LRU in
+    front of the garment_descriptions table, with concurrent lookups for the
+    same image sharing one OpenAI call.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, max_entries: int = 1024, persist: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self._memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._flight = SingleFlight()
+
+    async def get_or_create(self, image_hash: str, describe: Callable[[], Awaitable[str]]) -> str:
+        """Return the cached description for `image_hash`, calling `describe` on a miss"""
+        description = self._memory.get(image_hash)
+        if description is not None:
+            return description
+        return await self._flight.do(image_hash, lambda: self._load_or_describe(image_hash, describe))
+
+    async def _load_or_describe(self, image_hash: str, describe: Callable[[], Awaitable[str]]) -> str:
+        description = await self._load(image_hash)
+        if description is None:
+            description = await describe()
+            await self._store(image_hash, description)
+        self._memory.set(image_hash, description)
+        return description
+
+    async def _load(self, image_hash: str) -> Optional[str]:
+        if not self.persist:
+            return None
+        try:
+            row = await GarmentDescription.get_or_none(image_hash=image_hash)
+        except Exception as e:
+            # The cache must never make a generation fail
+            logger.warning(f"Garment description lookup failed: {e}")
+            return None
+        if row is None or row.model != GARMENT_DESCRIPTION_MODEL:
+            return None
+        if row.expires_at is not None and row.expires_at <= datetime.now(UTC):
+            return None
+        return row.description
+
+    async def _store(self, image_hash: str, description: str) -> None:
+        if not self.persist:
+            return
+        expires_at = datetime.now(UTC) + timedelta(seconds=self.ttl_seconds) if self.ttl_seconds else None
+        try:
+            await GarmentDescription.update_or_create(
+                defaults={"description": description, "model": GARMENT_DESCRIPTION_MODEL, "expires_at": expires_at},
+                image_hash=image_hash,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store garment description: {e}")
+
+    async def invalidate(self, image_hash: str) -> bool:
+        """Drop a description from memory and the database"""
+        removed = self._memory.invalidate(image_hash)
+        if self.persist:
+            removed = bool(await GarmentDescription.filter(image_hash=image_hash).delete()) or removed
+        return removed
+
+    async def purge_expired(self) -> int:
+        """Delete expired rows; returns how many were removed"""
+        if not self.persist:
+            return 0
+        return await GarmentDescription.filter(expires_at__lte=datetime.now(UTC)).delete()
+
+    def stats(self) -> dict:
+        return {**self._memory.stats(), "in_flight": len(self._flight)}
+
+
+_cache: Optional[GarmentDescriptionCache] = None
+
+
+def get_garment_description_cache() -> GarmentDescriptionCache:
+    """Get the application garment description cache"""
+    global _cache
+    if _cache is None:
+        _cache = GarmentDescriptionCache(
+            ttl_seconds=settings.GARMENT_DESCRIPTION_TTL_SECONDS or None,
+            max_entries=settings.GARMENT_DESCRIPTION_CACHE_SIZE,
+        )
+    return _cache
@@ -0,0 +1,159 @@
+# src/modules/services/image_preprocessing.py
+
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.config import settings
+from src.external_services.http_pool import HTTPClientPool
+from src.modules.uploads.exceptions import InvalidImageException
+from src.modules.uploads.service import load_image
+from src.utils.cache import SingleFlight
+from .ai_services import pil_image_to_bytes
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+@dataclass(frozen=True)
+class ProviderImageProfile:
+    """How images are prepared for one provider"""
+    max_size: Tuple[int, int]
+    format: str = "JPEG"
+    quality: int = 90
+    # Images that already fit and are upright are sent untouched below this size
+    passthrough_bytes: int = 1024 * 1024
+
+
+# Largest resolution each provider makes use of; anything bigger is wasted upload time
+PROVIDER_IMAGE_PROFILES = {
+    "cat-vton": ProviderImageProfile(max_size=(768, 1024), quality=95),
+    "leffa": ProviderImageProfile(max_size=(768, 1024), quality=92),
+    "kling": ProviderImageProfile(max_size=(1024, 1024)),
+    "kolors": ProviderImageProfile(max_size=(1024, 1024), quality=92),
+    "openai": ProviderImageProfile(max_size=(1024, 1024), format="WEBP", quality=85),
+}
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+
+
+@dataclass
+class PreprocessedImage:
+    """Provider-ready image bytes"""
+    data: bytes
+    content_type: str
+    width: int
+    height: int
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    @property
+    def filename(self) -> str:
+        return f"image.{self.content_type.split('/')[-1].replace('jpeg', 'jpg')}"
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    def to_data_url(self) -> str:
+        return f"data:{self.content_type};base64,{self.to_base64()}"
+
+
+def preprocess_image(data: bytes, profile: ProviderImageProfile) -> PreprocessedImage:
+    """
+    Fix EXIF orientation, downscale to the provider's max size and re-encode.
+    CPU bound; run it off the event loop.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            source_format = img.format
+            rotated = img.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1
+            fits = img.width <= profile.max_size[0] and img.height <= profile.max_size[1]
+
+            if fits and not rotated and len(data) <= profile.passthrough_bytes and source_format in CONTENT_TYPES:
+                return PreprocessedImage(data, CONTENT_TYPES[source_format], img.width, img.height)
+
+            image = ImageOps.exif_transpose(img)
+            image.thumbnail(profile.max_size, Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImageException(str(e))
+
+    image_format = profile.format
+    if image_format == "JPEG" and image.mode in ("RGBA", "LA", "P"):
+        # Keep transparency (garment cut-outs) instead of flattening onto black
+        image_format = "PNG"
+    elif image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    options = {"optimize": True} if image_format == "PNG" else {"quality": profile.quality}
+    encoded = pil_image_to_bytes(image, image_format, **options)
+    return PreprocessedImage(encoded, CONTENT_TYPES[image_format], image.width, image.height)
+
+
+class ImagePreprocessor:
+    """
+    Prepares images for providers and remembers recent results. Only
+    byte-identical inputs (same sha256) reuse a prepared payload: two
+    different photos can look nearly the same, so substituting one for the
+    other would send a different (possibly another user's) image to the
+    provider.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], PreprocessedImage]" = OrderedDict()
+        # Batch items sharing one image wait for a single resize instead of each doing it
+        self._flight = SingleFlight()
+        self.hits = 0
+
+    def _remember(self, key: Tuple[str, str], image: PreprocessedImage) -> None:
+        self._entries[key] = image
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def process(self, data: bytes, provider: str) -> PreprocessedImage:
+        """Prepare raw image bytes for `provider`"""
+        key = (provider, hashlib.sha256(data).hexdigest())
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        return await self._flight.do(key, lambda: self._process(key, data, provider))
+
+    async def _process(self, key: Tuple[str, str], data: bytes, provider: str) -> PreprocessedImage:
+        profile = PROVIDER_IMAGE_PROFILES[provider]
+        image = await asyncio.to_thread(preprocess_image, data, profile)
+        self._remember(key, image)
+        return image
+
+    async def prepare(
+        self, image: str, provider: str, http_pool: Optional[HTTPClientPool] = None
+    ) -> PreprocessedImage:
+        """Load an upload id, data URL or remote URL and prepare it for `provider`"""
+        loaded = await load_image(image, http_pool)
+        return await self.process(loaded.data, provider)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits}
+
+
+_preprocessor: Optional[ImagePreprocessor] = None
+
+
+def get_image_preprocessor() -> ImagePreprocessor:
+    """Get the application image preprocessor"""
+    global _preprocessor
+    if _preprocessor is None:
+        _preprocessor = ImagePreprocessor(max_entries=settings.IMAGE_DEDUPE_MAX_ENTRIES)
+    return _preprocessor
@@ -0,0 +1,133 @@
+# src/modules/services/image_variants.py
+
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from src.config import settings
+from src.config.constants import OUTPUT_DIR
+from src.utils.cache import SingleFlight
+from src.utils.result_cache import ResultCache, make_cache_key
+from src.utils.storage import LocalStorage, ObjectStorage, StoredObject
+
+# Requested widths are rounded up to one of these so the cache can't be filled with one-pixel steps
+VARIANT_WIDTHS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048)
+# Output format -> (Pillow format, file extension, encoder options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "png": ("PNG", "png", {"optimize": True}),
+}
+VARIANT_CACHE_PREFIX = "variant"
+
+
+def variant_width(requested: Optional[int]) -> Optional[int]:
+    """The breakpoint a requested width is served at"""
+    if requested is None:
+        return None
+    return next((width for width in VARIANT_WIDTHS if width >= requested), VARIANT_WIDTHS[-1])
+
+
+def render_variant(data: bytes, width: Optional[int], fmt: str) -> bytes:
+    """
+    Resize (never upscale) and re-encode an image. Runs in a worker process.
+    """
+    pil_format, _, options = VARIANT_FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if width and image.width > width:
+            image.thumbnail((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+class ImageVariantService:
+    """
+    Resized / re-encoded copies of stored images, rendered once in a process
+    pool and kept in a size-capped LRU disk cache. Concurrent requests for the
+    same variant share one render.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 ** 3, max_workers: int = 2):
+        self.cache = ResultCache(storage=LocalStorage(root), ttl_seconds=None, max_bytes=max_bytes)
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._flight = SingleFlight()
+        self.renders = 0
+
+    @property
+    def storage(self) -> LocalStorage:
+        return self.cache.storage
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def get(
+        self, source: ObjectStorage, original: StoredObject, width: Optional[int], fmt: str
+    ) -> StoredObject:
+        """
+        Get a variant of `original`, rendering it on a miss
+        Args:
+            original: Indexed object with its digest filled in
+            width: Maximum width in pixels, already snapped with variant_width()
+            fmt: One of VARIANT_FORMATS
+        """
+        key = make_cache_key(VARIANT_CACHE_PREFIX, [original.digest.encode()], {"w": width, "fmt": fmt})
+        name = self.cache.name_for(VARIANT_CACHE_PREFIX, key, VARIANT_FORMATS[fmt][1])
+        if await self.cache.get(key) is not None:
+            return self.storage.stat(name)
+        return await self._flight.do(key, lambda: self._render(source, original, key, name, width, fmt))
+
+    async def _render(
+        self, source: ObjectStorage, original: StoredObject, key: str, name: str, width: Optional[int], fmt: str
+    ) -> StoredObject:
+        data = await source.read(original.key)
+        pool = self._pool()
+        if pool is None:
+            rendered = await asyncio.to_thread(render_variant, data, width, fmt)
+        else:
+            rendered = await asyncio.get_running_loop().run_in_executor(pool, render_variant, data, width, fmt)
+        self.renders += 1
+        stored = await self.storage.put(name, rendered)
+        await self.cache.put(key, files=[name])
+        return stored
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "renders": self.renders, "in_flight": len(self._flight)}
+
+
+_variants: Optional[ImageVariantService] = None
+
+
+def get_image_variants() -> ImageVariantService:
+    """Get the application image variant service"""
+    global _variants
+    if _variants is None:
+        _variants = ImageVariantService(
+            root=os.path.join(OUTPUT_DIR, "variants"),
+            max_bytes=settings.IMAGE_VARIANT_CACHE_MAX_BYTES,
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+        )
+    return _variants
+
+
+def close_image_variants() -> None:
+    """Stop the render workers"""
+    global _variants
+    if _variants is not None:
+        _variants.close()
+        _variants = None
@@ -0,0 +1,187 @@
+# src/modules/services/tryon_routing.py
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+
+from src.config import settings
+from src.external_services.governor import ProviderGovernor, get_provider_governor
+from src.utils.common import parse_int_mapping
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ROUTING_POLICIES = ("fastest", "cheapest", "strict")
+AUTO_MODEL = "auto"
+# Earlier model names for the same provider
+MODEL_ALIASES = {"kling": "kolors"}
+# Caused by the request itself (422 covers unusable input images), so every
+# other provider would reject it too. Provider errors surface as 400 and 5xx.
+NON_RETRYABLE_STATUS_CODES = {401, 403, 404, 413, 415, 422}
+# Assumed for a provider until it has completed a call, so new providers get tried
+DEFAULT_EXPECTED_SECONDS = 30.0
+SCORE_SMOOTHING = 0.2
+
+
+@dataclass
+class ProviderScore:
+    """Live latency and error figures for one provider"""
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    successes: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    last_error: Optional[str] = None
+
+    def expected_seconds(self) -> float:
+        """Expected time to a successful result, counting failed attempts as full-length calls"""
+        latency = self.latency if self.latency is not None else DEFAULT_EXPECTED_SECONDS
+        return latency / max(1 - self.error_rate, 0.05)
+
+    def record(self, seconds: float, error: Optional[str] = None) -> None:
+        failed = error is not None
+        self.error_rate += SCORE_SMOOTHING * (failed - self.error_rate)
+        if failed:
+            self.failures += 1
+            self.last_error = error
+            return
+        self.successes += 1
+        self.latency = seconds if self.latency is None else self.latency + SCORE_SMOOTHING * (seconds - self.latency)
+
+    def as_dict(self) -> dict:
+        return {
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "expected_seconds": round(self.expected_seconds(), 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "last_error": self.last_error,
+        }
+
+
+class TryOnRouter:
+    """
+    Picks the virtual try-on provider for each request from a live scoreboard
+    and fails over to the next one when it errors:
+
+    - fastest: lowest expected time to a result (latency inflated by error rate)
+    - cheapest: lowest configured cost, then fastest
+    - strict: only the named provider, no failover
+
+    Providers whose circuit breaker is open are tried last.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[str],
+        costs: Optional[Dict[str, int]] = None,
+        default_policy: str = "fastest",
+        governor: Optional[ProviderGovernor] = None,
+    ):
+        self.providers = list(providers)
+        self.costs = costs or {}
+        self.default_policy = default_policy
+        self._governor = governor
+        self._scores: Dict[str, ProviderScore] = {provider: ProviderScore() for provider in self.providers}
+
+    @property
+    def governor(self) -> ProviderGovernor:
+        return self._governor or get_provider_governor()
+
+    def score(self, provider: str) -> ProviderScore:
+        # Names outside the pool come from requests, so they aren't kept on the scoreboard
+        return self._scores.get(provider) or ProviderScore()
+
+    def resolve_policy(self, model: str, policy: Optional[str]) -> str:
+        """Named providers are strict unless a policy is given; "auto" uses the default"""
+        if policy:
+            return policy
+        return self.default_policy if model == AUTO_MODEL else "strict"
+
+    def candidates(self, model: str, policy: str) -> List[str]:
+        """
+        Providers to try, in order
+
+        Raises:
+            HTTPException: 422 if the model is neither "auto" nor a provider in the pool
+        """
+        model = MODEL_ALIASES.get(model.lower(), model.lower())
+        if model != AUTO_MODEL and model not in self.providers:
+            raise HTTPException(status_code=422, detail=f"Unknown virtual try-on model: {model}")
+        if policy == "strict" and model != AUTO_MODEL:
+            return [model]
+
+        def rank(provider: str):
+            available = self.governor.breaker(provider).allows_calls
+            expected = self.score(provider).expected_seconds()
+            if policy == "cheapest":
+                return (not available, self.costs.get(provider, 0), expected)
+            return (not available, expected)
+
+        ranked = sorted(self.providers, key=rank)
+        return ranked[:1] if policy == "strict" else ranked
+
+    def pick(self, model: str, policy: Optional[str]) -> str:
+        """The provider a request would be sent to first right now"""
+        candidates = self.candidates(model, self._checked_policy(model, policy))
+        if not candidates:
+            raise HTTPException(status_code=503, detail="No virtual try-on provider is configured")
+        return candidates[0]
+
+    def _checked_policy(self, model: str, policy: Optional[str]) -> str:
+        policy = self.resolve_policy(model, policy)
+        if policy not in ROUTING_POLICIES:
+            raise HTTPException(status_code=400, detail=f"Unknown routing policy: {policy}")
+        return policy
+
+    async def run(self, model: str, policy: Optional[str], call: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Run `call(provider)` on the best provider, failing over down the ranking
+        """
+        policy = self._checked_policy(model, policy)
+
+        error: Optional[HTTPException] = None
+        for provider in self.candidates(model, policy):
+            score = self.score(provider)
+            score.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await call(provider)
+            except HTTPException as e:
+                if e.status_code in NON_RETRYABLE_STATUS_CODES:
+                    raise
+                score.record(time.monotonic() - started, error=str(e.detail))
+                logger.warning("Virtual try-on on %s failed (%s), failing over", provider, e.detail)
+                error = e
+                continue
+            finally:
+                score.in_flight -= 1
+            score.record(time.monotonic() - started)
+            return result
+        raise error or HTTPException(status_code=503, detail="No virtual try-on provider is configured")
+
+    def stats(self) -> dict:
+        return {
+            "default_policy": self.default_policy,
+            "providers": {provider: score.as_dict() for provider, score in self._scores.items()},
+        }
+
+
+_router: Optional[TryOnRouter] = None
+
+
+def get_tryon_router() -> TryOnRouter:
+    """Get the application try-on router"""
+    global _router
+    if _router is None:
+        _router = TryOnRouter(
+            providers=[name.strip().lower() for name in settings.TRYON_PROVIDERS.split(",") if name.strip()],
+            costs=parse_int_mapping(settings.TRYON_PROVIDER_COSTS),
+            default_policy=settings.TRYON_ROUTING_POLICY,
+        )
+    return _router
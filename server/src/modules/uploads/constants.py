@@ -0,0 +1,32 @@
+"""
+Constants for uploads module
+"""
+
+# Upload ids are "img_" followed by the first 32 hex chars of the content SHA-256
+UPLOAD_ID_PREFIX = "img_"
+UPLOAD_ID_HEX_LENGTH = 32
+
+# Bytes read per chunk while receiving an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Presigned upload tokens
+PRESIGNED_UPLOAD_PURPOSE = "image-upload"
+PRESIGNED_UPLOAD_EXPIRE_SECONDS = 15 * 60
+
+# Supported image types, detected from the file signature
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+# File extensions stored images can have, probed when an id isn't indexed yet
+STORED_IMAGE_EXTENSIONS = (".png", ".jpg", ".gif", ".webp")
+
+# Error messages
+UPLOAD_NOT_FOUND_ERROR = "Uploaded image not found"
+UPLOAD_TOO_LARGE_ERROR = "Image is too large"
+INVALID_IMAGE_ERROR = "Invalid input image"
+UNSUPPORTED_IMAGE_ERROR = "Unsupported image type, expected PNG, JPEG, WebP or GIF"
+INVALID_UPLOAD_TOKEN_ERROR = "Invalid, expired or already used upload token"
+UPLOAD_QUOTA_EXCEEDED_ERROR = "Upload quota exceeded, please try again later"
@@ -0,0 +1,74 @@
+"""
+Custom exceptions for uploads module
+"""
+
+from fastapi import HTTPException, status
+from .constants import (
+    INVALID_IMAGE_ERROR,
+    INVALID_UPLOAD_TOKEN_ERROR,
+    UNSUPPORTED_IMAGE_ERROR,
+    UPLOAD_NOT_FOUND_ERROR,
+    UPLOAD_QUOTA_EXCEEDED_ERROR,
+    UPLOAD_TOO_LARGE_ERROR,
+)
+
+
+class UploadNotFoundException(HTTPException):
+    """Exception raised when an image id doesn't match a stored upload."""
+
+    def __init__(self, image_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{UPLOAD_NOT_FOUND_ERROR}: {image_id}",
+        )
+
+
+class UploadTooLargeException(HTTPException):
+    """Exception raised when an upload exceeds the size limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{UPLOAD_TOO_LARGE_ERROR} (max {max_bytes} bytes)",
+        )
+
+
+class UnsupportedImageException(HTTPException):
+    """Exception raised when uploaded bytes are not a supported image."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=UNSUPPORTED_IMAGE_ERROR,
+        )
+
+
+class InvalidImageException(HTTPException):
+    """Exception raised when an input image can't be loaded or decoded."""
+
+    def __init__(self, reason: str):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{INVALID_IMAGE_ERROR}: {reason}",
+        )
+
+
+class InvalidUploadTokenException(HTTPException):
+    """Exception raised when a presigned upload token is invalid or expired."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=INVALID_UPLOAD_TOKEN_ERROR,
+        )
+
+
+class UploadQuotaExceededException(HTTPException):
+    """Exception raised when a user has uploaded too much within the quota window."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=UPLOAD_QUOTA_EXCEEDED_ERROR,
+            headers={"Retry-After": str(retry_after)},
+        )
@@ -0,0 +1,92 @@
+"""
+Router for uploads module
+"""
+
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, File, Request, UploadFile, status
+from fastapi.responses import FileResponse
+
+from src.config import settings
+from src.config.constants import IMMUTABLE_CACHE_CONTROL
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal
+from .constants import UPLOAD_CHUNK_SIZE
+from .exceptions import UnsupportedImageException, UploadNotFoundException, UploadTooLargeException
+from .schemas import PresignRequest, PresignResponse, UploadResponse
+from .service import StoredImage, consume_upload_token, create_upload_token, get_upload_quota, get_upload_store
+from .utils import is_upload_id
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+def _response(request: Request, stored: StoredImage) -> UploadResponse:
+    return UploadResponse(
+        image_id=stored.image_id,
+        content_type=stored.content_type,
+        size=stored.size,
+        url=request.url_for("get_upload", image_id=stored.image_id).path,
+    )
+
+
+async def _save_within_quota(chunks: AsyncIterator[bytes], max_bytes: int, user_id: str) -> StoredImage:
+    quota = get_upload_quota()
+    stored = await get_upload_store().save_stream(chunks, min(max_bytes, quota.remaining(user_id)))
+    quota.charge(user_id, stored.size)
+    return stored
+
+
+@router.post("", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_image(
+    request: Request,
+    file: UploadFile = File(...),
+    principal: Principal = Depends(get_current_principal),
+):
+    """Store a multipart/form-data image and return its id"""
+    async def chunks() -> AsyncIterator[bytes]:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+    stored = await _save_within_quota(chunks(), settings.UPLOAD_MAX_BYTES, principal.id)
+    return _response(request, stored)
+
+
+@router.post("/presign", response_model=PresignResponse)
+async def presign_upload(
+    request: Request,
+    presign_data: PresignRequest,
+    principal: Principal = Depends(get_current_principal),
+):
+    """Issue a short-lived, single-use URL the client can PUT raw image bytes to"""
+    if presign_data.content_type and not presign_data.content_type.startswith("image/"):
+        raise UnsupportedImageException()
+    if presign_data.size and presign_data.size > settings.UPLOAD_MAX_BYTES:
+        raise UploadTooLargeException(settings.UPLOAD_MAX_BYTES)
+
+    max_bytes = min(presign_data.size or settings.UPLOAD_MAX_BYTES, get_upload_quota().remaining(principal.id))
+    token, expires_at = create_upload_token(max_bytes, principal.id)
+    return PresignResponse(
+        upload_url=str(request.url_for("upload_presigned", token=token)),
+        expires_at=expires_at,
+        max_bytes=max_bytes,
+    )
+
+
+@router.put("/presigned/{token}", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_presigned(request: Request, token: str):
+    """Store the raw request body as an image"""
+    max_bytes, user_id = consume_upload_token(token)
+    stored = await _save_within_quota(request.stream(), max_bytes, user_id)
+    return _response(request, stored)
+
+
+@router.get("/{image_id}")
+async def get_upload(image_id: str):
+    """Fetch a stored image"""
+    stored = await get_upload_store().get(image_id) if is_upload_id(image_id) else None
+    if not stored:
+        raise UploadNotFoundException(image_id)
+    return FileResponse(
+        stored.path,
+        media_type=stored.content_type,
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{stored.image_id}"'},
+    )
@@ -0,0 +1,31 @@
+"""
+Pydantic schemas for uploads module
+"""
+
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class UploadResponse(BaseModel):
+    """Schema for a stored image"""
+
+    image_id: str = Field(..., description="Short id to pass to try-on, campaign and generation routes")
+    content_type: str
+    size: int
+    url: str = Field(..., description="Path the image can be fetched from")
+
+
+class PresignRequest(BaseModel):
+    """Schema for requesting a presigned upload"""
+
+    content_type: Optional[str] = Field(None, description="Expected image MIME type")
+    size: Optional[int] = Field(None, ge=1, description="Expected size in bytes")
+
+
+class PresignResponse(BaseModel):
+    """Schema for a presigned upload"""
+
+    upload_url: str = Field(..., description="URL to PUT the raw image bytes to")
+    expires_at: datetime
+    max_bytes: int
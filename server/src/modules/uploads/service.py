@@ -0,0 +1,313 @@
+"""
+Service layer for uploads module.
+
+Images are received once (multipart or presigned PUT), stored under a
+content-addressed id and then referenced by that id from the try-on,
+campaign and generation routes, so large images don't travel as base64
+inside JSON bodies on every call.
+
+Uploading needs a signed-in user and counts against a per-user byte quota.
+Presigned upload tokens carry that user and a nonce, and are spent on first
+use.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import mimetypes
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from jose import JWTError, jwt
+
+from src.config import settings
+from src.config.constants import OUTPUT_DIR
+from src.external_services.http_pool import HTTPClientPool, get_http_pool
+from src.modules.image_generation.proxy import get_image_proxy
+from src.utils.cache import TTLCache
+from .constants import PRESIGNED_UPLOAD_EXPIRE_SECONDS, PRESIGNED_UPLOAD_PURPOSE, STORED_IMAGE_EXTENSIONS
+from .exceptions import (
+    InvalidImageException,
+    InvalidUploadTokenException,
+    UnsupportedImageException,
+    UploadNotFoundException,
+    UploadQuotaExceededException,
+    UploadTooLargeException,
+)
+from .utils import detect_image_type, is_upload_id, upload_id_for
+
+
+@dataclass
+class StoredImage:
+    """An image held by the upload store"""
+    image_id: str
+    path: str
+    content_type: str
+    size: int
+
+
+@dataclass
+class LoadedImage:
+    """Raw image bytes resolved from an upload id, data URL or remote URL"""
+    data: bytes
+    content_type: str
+    filename: str = "image"
+
+
+class UploadStore:
+    """Content-addressed image store on local disk"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._index: Optional[Dict[str, StoredImage]] = None
+
+    def _scan(self) -> Dict[str, StoredImage]:
+        os.makedirs(self.root, exist_ok=True)
+        index = {}
+        with os.scandir(self.root) as entries:
+            for item in entries:
+                image_id, extension = os.path.splitext(item.name)
+                if is_upload_id(image_id) and item.is_file():
+                    content_type = mimetypes.guess_type(item.name)[0] or "application/octet-stream"
+                    index[image_id] = StoredImage(image_id, item.path, content_type, item.stat().st_size)
+        return index
+
+    async def _load_index(self) -> Dict[str, StoredImage]:
+        if self._index is None:
+            # Scanning is idempotent, so concurrent first lookups may both scan
+            index = await asyncio.to_thread(self._scan)
+            if self._index is None:
+                self._index = index
+        return self._index
+
+    async def get(self, image_id: str) -> Optional[StoredImage]:
+        """Get a stored image by id, looking on disk for images another worker stored"""
+        index = await self._load_index()
+        stored = index.get(image_id)
+        if stored is None:
+            stored = await asyncio.to_thread(self._find_file, image_id)
+            if stored is not None:
+                index[image_id] = stored
+        return stored
+
+    def _find_file(self, image_id: str) -> Optional[StoredImage]:
+        for extension in STORED_IMAGE_EXTENSIONS:
+            path = os.path.join(self.root, f"{image_id}{extension}")
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                continue
+            return StoredImage(image_id, path, mimetypes.guess_type(path)[0] or "application/octet-stream", size)
+        return None
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], max_bytes: int) -> StoredImage:
+        """
+        Store an image from a stream of chunks, hashing while writing.
+        Identical content always yields the same id and is stored once.
+
+        Raises:
+            UploadTooLargeException: If the stream exceeds max_bytes
+            UnsupportedImageException: If the bytes aren't a supported image
+        """
+        index = await self._load_index()
+        temp_path = os.path.join(self.root, f".{uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        header = b""
+        f = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeException(max_bytes)
+                if len(header) < 16:
+                    header += chunk[:16]
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(f.close)
+
+            content_type = detect_image_type(header)
+            if content_type is None:
+                raise UnsupportedImageException()
+
+            image_id = upload_id_for(digest.hexdigest())
+            existing = await self.get(image_id)
+            if existing:
+                await asyncio.to_thread(os.remove, temp_path)
+                return existing
+
+            extension = mimetypes.guess_extension(content_type) or ".bin"
+            path = os.path.join(self.root, f"{image_id}{extension}")
+            await asyncio.to_thread(os.replace, temp_path, path)
+            stored = StoredImage(image_id, path, content_type, size)
+            index[image_id] = stored
+            return stored
+        finally:
+            if not f.closed:
+                await asyncio.to_thread(f.close)
+            if os.path.exists(temp_path):
+                await asyncio.to_thread(os.remove, temp_path)
+
+    async def save_bytes(self, data: bytes, max_bytes: int) -> StoredImage:
+        """Store an image that is already in memory"""
+        async def single_chunk():
+            yield data
+        return await self.save_stream(single_chunk(), max_bytes)
+
+    async def read(self, image_id: str) -> Tuple[bytes, StoredImage]:
+        """Read a stored image or raise 404"""
+        stored = await self.get(image_id)
+        if not stored:
+            raise UploadNotFoundException(image_id)
+
+        def read_file() -> bytes:
+            with open(stored.path, "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read_file), stored
+
+
+_store: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """Get the application upload store"""
+    global _store
+    if _store is None:
+        _store = UploadStore(os.path.join(OUTPUT_DIR, "uploads"))
+    return _store
+
+
+class UploadQuota:
+    """Sliding-window limit on the bytes each user uploads"""
+
+    def __init__(self, max_bytes: int, window_seconds: float, max_users: int = 100000):
+        self.max_bytes = max_bytes
+        self.window_seconds = window_seconds
+        self._usage = TTLCache(max_entries=max_users, ttl_seconds=window_seconds)
+
+    def _window(self, user_id: str) -> deque:
+        window = self._usage.get(user_id) or deque()
+        now = time.monotonic()
+        while window and window[0][0] <= now - self.window_seconds:
+            window.popleft()
+        return window
+
+    def remaining(self, user_id: str) -> int:
+        """
+        Bytes the user may still upload in the current window
+
+        Raises:
+            UploadQuotaExceededException: If nothing is left
+        """
+        window = self._window(user_id)
+        remaining = self.max_bytes - sum(size for _, size in window)
+        if remaining <= 0:
+            retry_after = window[0][0] + self.window_seconds - time.monotonic() if window else self.window_seconds
+            raise UploadQuotaExceededException(retry_after=int(retry_after) + 1)
+        return remaining
+
+    def charge(self, user_id: str, size: int) -> None:
+        """Record a stored upload against the user"""
+        window = self._window(user_id)
+        window.append((time.monotonic(), size))
+        self._usage.set(user_id, window)
+
+
+_quota: Optional[UploadQuota] = None
+# Nonces of spent presigned upload tokens, kept until the tokens expire anyway
+_used_nonces = TTLCache(max_entries=100000, ttl_seconds=PRESIGNED_UPLOAD_EXPIRE_SECONDS)
+
+
+def get_upload_quota() -> UploadQuota:
+    """Get the application upload quota"""
+    global _quota
+    if _quota is None:
+        _quota = UploadQuota(settings.UPLOAD_QUOTA_BYTES, settings.UPLOAD_QUOTA_WINDOW_SECONDS)
+    return _quota
+
+
+def create_upload_token(max_bytes: int, user_id: str) -> Tuple[str, datetime]:
+    """Create a signed single-use token authorising one image upload by a user"""
+    expires_at = datetime.now(UTC) + timedelta(seconds=PRESIGNED_UPLOAD_EXPIRE_SECONDS)
+    token = jwt.encode(
+        {
+            "purpose": PRESIGNED_UPLOAD_PURPOSE,
+            "sub": user_id,
+            "max_bytes": max_bytes,
+            "nonce": uuid4().hex,
+            "exp": expires_at,
+        },
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    return token, expires_at
+
+
+def consume_upload_token(token: str) -> Tuple[int, str]:
+    """
+    Verify a presigned upload token and mark it used
+    Returns:
+        Tuple[int, str]: Maximum number of bytes the token allows, and the user it was issued to
+    """
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        raise InvalidUploadTokenException()
+    nonce = claims.get("nonce")
+    if claims.get("purpose") != PRESIGNED_UPLOAD_PURPOSE or not claims.get("sub") or not nonce:
+        raise InvalidUploadTokenException()
+    if _used_nonces.get(nonce):
+        raise InvalidUploadTokenException()
+    _used_nonces.set(nonce, True)
+    return int(claims.get("max_bytes", settings.UPLOAD_MAX_BYTES)), claims["sub"]
+
+
+async def load_image(image: str, http_pool: Optional[HTTPClientPool] = None) -> LoadedImage:
+    """
+    Resolve an image reference to raw bytes. Accepts an upload id, a base64
+    data URL or an http(s) URL on a host allowed by IMAGE_PROXY_ALLOWED_HOSTS.
+    """
+    if is_upload_id(image):
+        data, stored = await get_upload_store().read(image)
+        return LoadedImage(data=data, content_type=stored.content_type, filename=os.path.basename(stored.path))
+
+    if image.startswith("data:"):
+        header, _, payload = image.partition(",")
+        content_type = header[5:].split(";")[0] or "application/octet-stream"
+        try:
+            data = base64.b64decode(payload)
+        except binascii.Error as e:
+            raise InvalidImageException(f"bad base64 data: {str(e)}")
+        return LoadedImage(data=data, content_type=content_type, filename=f"image{mimetypes.guess_extension(content_type) or '.bin'}")
+
+    # Fetched images can be re-served by stage_shared_image, so only provider
+    # CDNs are fetched, as for the image proxy
+    if not get_image_proxy().allows(image):
+        raise InvalidImageException(f"{urlsplit(image).hostname or image} is not an allowed image host")
+
+    response = await (http_pool or get_http_pool()).request("GET", image)
+    if 400 <= response.status_code < 500:
+        # The caller gave us a URL that doesn't serve an image; no provider could use it
+        raise InvalidImageException(f"{image} returned {response.status_code}")
+    response.raise_for_status()
+    content_type = response.headers.get("Content-Type", "").split(";")[0] or detect_image_type(response.content[:16]) or "application/octet-stream"
+    return LoadedImage(data=response.content, content_type=content_type, filename=f"image{mimetypes.guess_extension(content_type) or '.bin'}")
+
+
+async def to_data_url(image: str) -> str:
+    """
+    Turn an upload id into a base64 data URL for providers that only take
+    URLs; other references are returned unchanged
+    """
+    if not is_upload_id(image):
+        return image
+    data, stored = await get_upload_store().read(image)
+    return f"data:{stored.content_type};base64,{base64.b64encode(data).decode()}"
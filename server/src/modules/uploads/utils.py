@@ -0,0 +1,33 @@
+"""
+Utility functions for uploads module
+"""
+
+import re
+from typing import Optional
+from .constants import IMAGE_SIGNATURES, UPLOAD_ID_HEX_LENGTH, UPLOAD_ID_PREFIX
+
+UPLOAD_ID_PATTERN = re.compile(rf"^{UPLOAD_ID_PREFIX}[0-9a-f]{{{UPLOAD_ID_HEX_LENGTH}}}$")
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """
+    Detect the image MIME type from the first bytes of a file
+    Returns:
+        Optional[str]: MIME type, or None if the bytes aren't a supported image
+    """
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_upload_id(value: str) -> bool:
+    """Check whether a string is an upload image id"""
+    return bool(UPLOAD_ID_PATTERN.match(value))
+
+
+def upload_id_for(digest: str) -> str:
+    """Build the upload id for a content SHA-256 hex digest"""
+    return f"{UPLOAD_ID_PREFIX}{digest[:UPLOAD_ID_HEX_LENGTH]}"
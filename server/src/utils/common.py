@@ -1,5 +1,8 @@
+import ipaddress
 import os
-from typing import Any, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
 
 
 def validate_environment() -> bool:
@@ -25,3 +28,66 @@ def format_error(
         dict: Formatted response
     """
     return {"message": message, "data": data}
+
+
+def parse_int_mapping(raw: str) -> Dict[str, int]:
+    """
+    Parse a "key=value,key=value" setting into a mapping of integers
+    Args:
+        raw: Comma-separated key=value pairs; malformed entries are skipped
+    Returns:
+        dict: Lower-cased keys mapped to integer values
+    """
+    mapping: Dict[str, int] = {}
+    for entry in raw.split(","):
+        key, _, value = entry.strip().partition("=")
+        if key and value.strip().isdigit():
+            mapping[key.strip().lower()] = int(value)
+    return mapping
+
+
+def parse_networks(raw: str) -> List[IPNetwork]:
+    """
+    Parse a comma-separated list of IP addresses and CIDR ranges
+    Args:
+        raw: e.g. "10.0.0.0/8,127.0.0.1"; malformed entries are skipped
+    Returns:
+        list: The parsed networks
+    """
+    networks: List[IPNetwork] = []
+    for entry in raw.split(","):
+        try:
+            networks.append(ipaddress.ip_network(entry.strip(), strict=False))
+        except ValueError:
+            continue
+    return networks
+
+
+def _in_networks(address: str, networks: Sequence[IPNetwork]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(
+    peer: Optional[str], headers: Mapping[str, str], trusted_proxies: Sequence[IPNetwork]
+) -> Optional[str]:
+    """
+    Address of the client behind any trusted reverse proxies
+    Args:
+        peer: Address of the directly connected peer
+        headers: Request headers; X-Forwarded-For is only read when the peer is a trusted proxy
+        trusted_proxies: Networks of the proxies in front of the app
+    Returns:
+        Optional[str]: The right-most X-Forwarded-For hop that isn't a trusted proxy, else the peer
+    """
+    if not peer or not _in_networks(peer, trusted_proxies):
+        return peer
+    hops = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    # Hops are appended by each proxy, so anything left of the first untrusted one may be forged
+    for hop in reversed(hops):
+        if not _in_networks(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
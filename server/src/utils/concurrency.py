@@ -0,0 +1,41 @@
+"""
+Bounded fan-out for batch endpoints.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def fan_out(
+    items: Sequence[T],
+    run: Callable[[T], Awaitable[R]],
+    concurrency: int,
+) -> AsyncIterator[Tuple[int, Optional[R], Optional[Exception]]]:
+    """
+    Run `run(item)` for every item with at most `concurrency` calls in flight
+    and yield (index, result, error) in completion order. Closing the iterator
+    early (e.g. the client disconnected) cancels the remaining work.
+    """
+    pending = iter(enumerate(items))
+    finished: asyncio.Queue = asyncio.Queue()
+
+    async def worker() -> None:
+        for index, item in pending:
+            try:
+                result = await run(item)
+            except Exception as e:
+                finished.put_nowait((index, None, e))
+            else:
+                finished.put_nowait((index, result, None))
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+    try:
+        for _ in range(len(items)):
+            yield await finished.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
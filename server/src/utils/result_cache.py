@@ -0,0 +1,291 @@
+"""
+Content-addressed cache for provider outputs.
+
+Keys are a SHA-256 over the normalised input image bytes plus the model
+parameters, so identical try-ons map to the same stored result no matter
+which request produced them. Local outputs are stored as objects named after
+the key, which lets the index be rebuilt from the storage index on startup;
+remote output URLs are kept in memory only.
+
+The index is loaded on first use, and anything that touches storage (the
+initial scan, sizing new files, deleting evicted ones) goes through the
+backend's coroutines, so none of it blocks the event loop.
+
+The application cache indexes the shared generated-image storage, whose
+objects are also served under /api/generated-images and referenced by
+generation history. Evicting an entry there deletes only the files history
+no longer references (see init_result_cache), so RESULT_CACHE_MAX_BYTES
+bounds the disk used by results nobody can reach any more. Caches with a
+storage of their own (proxy, variants) delete evicted files outright.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from src.config import settings
+from .storage import LocalStorage, ObjectStorage, get_storage
+
+# Stored objects are named "<prefix>_<sha256>.<ext>"
+CACHED_FILE_PATTERN = re.compile(r"^[a-z0-9-]+_([0-9a-f]{64})\.[a-z0-9]+$")
+
+# Relative URL the shared generated-image storage is served under
+GENERATED_IMAGES_URL_PREFIX = "api/generated-images/"
+
+logger = logging.getLogger(__name__)
+
+# Given stored object keys, returns those that are still referenced elsewhere
+ReferenceCheck = Callable[[List[str]], Awaitable[Set[str]]]
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cached result: stored objects and/or remote URLs
+    """
+    key: str
+    files: List[str] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    size: int = 0
+    created_at: float = field(default_factory=time.time)
+    ttl_seconds: Optional[float] = None
+
+    def expired(self, now: float) -> bool:
+        return self.ttl_seconds is not None and now - self.created_at > self.ttl_seconds
+
+
+def input_fingerprint(value: str) -> bytes:
+    """
+    Normalise an image input for hashing: data URLs hash by their decoded bytes
+    (so the MIME prefix doesn't matter), anything else by its string value
+    """
+    if value.startswith("data:") and "," in value:
+        try:
+            return base64.b64decode(value.split(",", 1)[1])
+        except ValueError:
+            pass
+    return value.encode()
+
+
+def make_cache_key(namespace: str, inputs: Iterable[bytes], params: Dict[str, Any]) -> str:
+    """
+    Build the SHA-256 cache key for a provider call
+    Args:
+        namespace: Provider/model identifier
+        inputs: Normalised input image bytes, in a fixed order
+        params: Model parameters that influence the output
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256(namespace.encode())
+    for data in inputs:
+        # Length-prefix each input so boundaries can't be shifted between inputs
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of provider results with a size cap on local files
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 5 * 1024 ** 3,
+        storage: Optional[ObjectStorage] = None,
+        referenced: Optional[ReferenceCheck] = None,
+    ):
+        # A bare root keeps results as flat files in that directory
+        self.storage = storage or LocalStorage(root, shard_depth=0)
+        # Evicting an entry only forgets the files this reports as still in use
+        self.referenced = referenced
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        """
+        Rebuild the index from objects already in storage, oldest first so
+        the LRU order roughly matches their age. Runs once; later calls return
+        immediately.
+        """
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if not self._loaded:
+                await self._index_stored_objects()
+                self._loaded = True
+
+    async def _index_stored_objects(self) -> None:
+        found = []
+        # Listing a local backend scans its directory tree the first time
+        for item in await asyncio.to_thread(self.storage.list):
+            match = CACHED_FILE_PATTERN.match(item.key)
+            if match:
+                found.append((item.modified, match.group(1), item.key, item.size))
+        for mtime, key, name, size in sorted(found):
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = CacheEntry(key=key, created_at=mtime, ttl_seconds=self.ttl_seconds)
+                self._entries[key] = entry
+            entry.files.append(name)
+            entry.size += size
+            self._bytes += size
+        await self._enforce_limits()
+
+    @staticmethod
+    def name_for(prefix: str, key: str, extension: str) -> str:
+        """Storage key a result object for `key` is stored under"""
+        return f"{prefix}_{key}.{extension}"
+
+    def path_for(self, prefix: str, key: str, extension: str) -> str:
+        """Path a result file for `key` should be written to (local storage only)"""
+        return self.storage.path_for(self.name_for(prefix, key, extension))
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """Get a live entry and mark it most recently used"""
+        await self.load()
+        entry = self._entries.get(key)
+        if entry is not None and (
+            entry.expired(time.time())
+            or not all(self.storage.stat(name) for name in entry.files)
+        ):
+            await self._evict(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    async def put(
+        self,
+        key: str,
+        files: Iterable[str] = (),
+        urls: Iterable[str] = (),
+        ttl_seconds: Optional[float] = None,
+    ) -> CacheEntry:
+        """
+        Record a result. `files` are storage keys, or paths written via path_for().
+        """
+        await self.load()
+        if key in self._entries:
+            await self._evict(key, delete_files=False)
+
+        names = [path.replace("\\", "/").rsplit("/", 1)[-1] for path in files]
+        size = 0
+        for name in names:
+            # Files written via path_for() aren't in the storage index yet
+            stored = self.storage.stat(name) or await self.storage.refresh(name)
+            if stored is None:
+                raise FileNotFoundError(name)
+            size += stored.size
+        entry = CacheEntry(
+            key=key,
+            files=names,
+            urls=list(urls),
+            size=size,
+            ttl_seconds=ttl_seconds if ttl_seconds is not None else self.ttl_seconds,
+        )
+        self._entries[key] = entry
+        self._bytes += size
+        await self._enforce_limits()
+        return entry
+
+    async def invalidate(self, key: str) -> bool:
+        """Drop an entry, deleting its files unless they are still referenced"""
+        await self.load()
+        if key not in self._entries:
+            return False
+        await self._evict(key)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def _evict(self, key: str, delete_files: bool = True) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        if delete_files and entry.files:
+            keep = await self._still_referenced(entry.files)
+            for name in entry.files:
+                if name in keep:
+                    continue
+                try:
+                    await self.storage.delete(name)
+                except Exception as e:
+                    # The entry is gone either way; a leftover file is picked up on the next load
+                    logger.warning(f"Failed to delete cached result {name}: {e}")
+
+    async def _still_referenced(self, names: List[str]) -> Set[str]:
+        if self.referenced is None:
+            return set()
+        try:
+            return set(await self.referenced(names))
+        except Exception as e:
+            # Without an answer, keeping a file is safer than breaking a link to it
+            logger.warning(f"Failed to check references to cached results: {e}")
+            return set(names)
+
+    async def _enforce_limits(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            await self._evict(oldest)
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Get the application result cache; its index is loaded by the first get/put
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResultCache(
+            storage=get_storage(),
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+        )
+    return _cache
+
+
+def init_result_cache(referenced: ReferenceCheck) -> ResultCache:
+    """
+    Set up the application result cache. Its files are shared with
+    /api/generated-images and history, so evicted files that `referenced`
+    reports as still in use are kept.
+    """
+    cache = get_result_cache()
+    cache.referenced = referenced
+    return cache
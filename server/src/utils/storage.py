@@ -0,0 +1,512 @@
+"""
+Object storage for generated images.
+
+Objects are addressed by a flat key (e.g. "catvton_<sha256>.png") and kept
+either on local disk or in an S3-compatible bucket. Both backends hold an
+in-memory index of what they store, so existence checks and listings never
+touch the filesystem or the network; a miss is confirmed with a single stat
+or HEAD before giving up, since another worker may have written the object.
+
+On disk, objects live in subdirectories named after the leading hex digits
+of the SHA-256 of their key ("ab/cd/<key>"), which keeps directories small
+no matter how many images accumulate. Writes go to a temp file in the
+target directory and are renamed into place, so readers never see a partial
+image.
+
+Each object also carries a strong content digest (SHA-256, computed when it
+is written or on first use) and a MIME type sniffed from its leading bytes,
+which the HTTP layer turns into ETag and Content-Type headers.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote, unquote, urlsplit
+from uuid import uuid4
+from xml.etree import ElementTree
+
+import httpx
+
+from src.config import settings
+from src.config.constants import OUTPUT_DIR
+from src.external_services.http_pool import HTTPClientPool, get_http_pool
+from src.modules.uploads.utils import detect_image_type
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR_PATTERN = re.compile(r"^[0-9a-f]{2}$")
+EMPTY_PAYLOAD_SHA256 = hashlib.sha256(b"").hexdigest()
+S3_XML_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+DIGEST_CHUNK_SIZE = 1024 * 1024
+# STORAGE_FSYNC values: "off" leaves flushing to the OS, "data" syncs each file
+# before it is renamed into place, "full" also syncs the directory entry
+FSYNC_POLICIES = ("off", "data", "full")
+
+
+@dataclass
+class StoredObject:
+    """Index entry for a stored object"""
+    key: str
+    size: int
+    content_type: str
+    modified: float
+    path: Optional[str] = None
+    etag: Optional[str] = None
+    # Hex SHA-256 of the content, once known
+    digest: Optional[str] = None
+
+
+def content_type_for(key: str, header: bytes = b"") -> str:
+    """MIME type from the leading bytes, falling back to the key's extension"""
+    return detect_image_type(header) or mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _valid_key(key: str) -> bool:
+    return bool(key) and key == os.path.basename(key) and not key.startswith(".")
+
+
+class ObjectStorage(ABC):
+    """
+    Interface shared by the storage backends. Index lookups are synchronous;
+    anything that may do I/O is a coroutine.
+    """
+
+    def __init__(self):
+        self._index: Dict[str, StoredObject] = {}
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        """Look an object up in the index"""
+        return self._index.get(key)
+
+    def list(self) -> List[StoredObject]:
+        """All indexed objects"""
+        return list(self._index.values())
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of an object, for backends that have one"""
+        return None
+
+    async def load(self) -> None:
+        """Build the index from what the backend already stores"""
+
+    @abstractmethod
+    async def refresh(self, key: str) -> Optional[StoredObject]:
+        """Look an object up in the backend itself, updating the index"""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        """Store an object, replacing any existing one with the same key"""
+
+    async def put_chunks(
+        self, key: str, chunks: Iterable[bytes], content_type: Optional[str] = None
+    ) -> StoredObject:
+        """
+        Store an object produced chunk by chunk. The iterable is consumed on a
+        worker thread, so it may do CPU work (e.g. decoding) off the event loop.
+        """
+        return await self.put(key, await asyncio.to_thread(b"".join, chunks), content_type)
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes:
+        """Read an object; raises FileNotFoundError if it doesn't exist"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """Delete an object; returns whether it existed"""
+
+    async def ensure_digest(self, stored: StoredObject) -> StoredObject:
+        """Fill in the content digest (and sniffed MIME type) of an indexed object"""
+        if stored.digest is None:
+            data = await self.read(stored.key)
+            stored.digest = _sha256_hex(data)
+            stored.content_type = content_type_for(stored.key, data[:16])
+        return stored
+
+    def stats(self) -> dict:
+        return {"objects": len(self._index), "bytes": sum(item.size for item in self._index.values())}
+
+
+class LocalStorage(ObjectStorage):
+    """Objects under a local directory, sharded by key hash"""
+
+    def __init__(self, root: str, shard_depth: int = 2, fsync: str = "off"):
+        super().__init__()
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.root = root
+        self.shard_depth = shard_depth
+        self.fsync = fsync
+        self._loaded = False
+
+    def _shard_dir(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, *(digest[2 * i:2 * i + 2] for i in range(self.shard_depth)))
+
+    def path_for(self, key: str) -> str:
+        """Where an object is (or would be) stored; creates its shard directory"""
+        directory = self._shard_dir(key)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        stored = self.stat(key)
+        return stored.path if stored else None
+
+    def _entry(self, key: str, path: str, stat: os.stat_result) -> StoredObject:
+        stored = StoredObject(key, stat.st_size, content_type_for(key), stat.st_mtime, path=path)
+        self._index[key] = stored
+        return stored
+
+    def _scan(self, directory: str, depth: int) -> None:
+        with os.scandir(directory) as entries:
+            for item in entries:
+                if depth < self.shard_depth:
+                    if SHARD_DIR_PATTERN.match(item.name) and item.is_dir():
+                        self._scan(item.path, depth + 1)
+                elif _valid_key(item.name) and not item.name.endswith(".tmp") and item.is_file():
+                    self._entry(item.name, item.path, item.stat())
+
+    def _migrate_flat_files(self) -> None:
+        # Images written before sharding sit directly under the root
+        with os.scandir(self.root) as entries:
+            flat = [item for item in entries if _valid_key(item.name) and not item.name.endswith(".tmp") and item.is_file()]
+        for item in flat:
+            path = self.path_for(item.name)
+            os.replace(item.path, path)
+            self._entry(item.name, path, os.stat(path))
+        if flat:
+            logger.info(f"Moved {len(flat)} images under {self.root} into shard directories")
+
+    def load_index(self) -> None:
+        """Scan the root once; later lookups are served from the index"""
+        if self._loaded:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._scan(self.root, 0)
+        if self.shard_depth:
+            self._migrate_flat_files()
+        self._loaded = True
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        self.load_index()
+        return super().stat(key)
+
+    def list(self) -> List[StoredObject]:
+        self.load_index()
+        return super().list()
+
+    async def load(self) -> None:
+        await asyncio.to_thread(self.load_index)
+
+    async def refresh(self, key: str) -> Optional[StoredObject]:
+        if not _valid_key(key):
+            return None
+
+        def stat_file() -> Optional[StoredObject]:
+            self.load_index()
+            path = os.path.join(self._shard_dir(key), key)
+            try:
+                return self._entry(key, path, os.stat(path))
+            except FileNotFoundError:
+                self._index.pop(key, None)
+                return None
+
+        return await asyncio.to_thread(stat_file)
+
+    def _sync_directory(self, directory: str) -> None:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write(self, key: str, chunks: Iterable[bytes], content_type: Optional[str]) -> StoredObject:
+        path = self.path_for(key)
+        temp_path = os.path.join(os.path.dirname(path), f".{uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        header = b""
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in chunks:
+                    if len(header) < 16:
+                        header += chunk[:16]
+                    digest.update(chunk)
+                    f.write(chunk)
+                if self.fsync != "off":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            if self.fsync == "full":
+                self._sync_directory(os.path.dirname(path))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        stored = self._entry(key, path, os.stat(path))
+        stored.digest = digest.hexdigest()
+        stored.content_type = detect_image_type(header) or content_type or stored.content_type
+        return stored
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        return await self.put_chunks(key, (data,), content_type)
+
+    async def put_chunks(
+        self, key: str, chunks: Iterable[bytes], content_type: Optional[str] = None
+    ) -> StoredObject:
+        if not _valid_key(key):
+            raise ValueError(f"Invalid storage key: {key}")
+        self.load_index()
+        return await asyncio.to_thread(self._write, key, chunks, content_type)
+
+    async def read(self, key: str) -> bytes:
+        stored = self.stat(key) or await self.refresh(key)
+        if stored is None:
+            raise FileNotFoundError(key)
+
+        def read_file() -> bytes:
+            with open(stored.path, "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read_file)
+
+    async def ensure_digest(self, stored: StoredObject) -> StoredObject:
+        if stored.digest is None:
+            def hash_file() -> None:
+                digest = hashlib.sha256()
+                with open(stored.path, "rb") as f:
+                    header = f.read(16)
+                    digest.update(header)
+                    while chunk := f.read(DIGEST_CHUNK_SIZE):
+                        digest.update(chunk)
+                stored.content_type = content_type_for(stored.key, header)
+                stored.digest = digest.hexdigest()
+
+            await asyncio.to_thread(hash_file)
+        return stored
+
+    def _unlink(self, key: str) -> None:
+        stored = self._index.pop(key, None)
+        try:
+            os.remove(stored.path if stored else os.path.join(self._shard_dir(key), key))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, key: str) -> bool:
+        existed = self.stat(key) is not None
+        await asyncio.to_thread(self._unlink, key)
+        return existed
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def sign_request_v4(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    service: str = "s3",
+    now: Optional[datetime] = None,
+) -> Dict[str, str]:
+    """
+    Sign a request with AWS Signature Version 4
+    Args:
+        url: Full URL; its query string is part of the signature
+        headers: Headers to sign besides host, x-amz-date and x-amz-content-sha256
+        payload_hash: Hex SHA-256 of the body
+    Returns:
+        Dict[str, str]: `headers` plus the date, payload hash and Authorization headers
+    """
+    now = now or datetime.now(UTC)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    parts = urlsplit(url)
+
+    signed = {name.lower(): " ".join(str(value).split()) for name, value in headers.items()}
+    signed["host"] = parts.netloc
+    signed["x-amz-date"] = amz_date
+    signed["x-amz-content-sha256"] = payload_hash
+    signed_names = ";".join(sorted(signed))
+
+    # The URL's query is already percent-encoded; decode it first so nothing is encoded twice
+    query = sorted(
+        (quote(unquote(name), safe="-_.~"), quote(unquote(value), safe="-_.~"))
+        for name, _, value in (pair.partition("=") for pair in parts.query.split("&") if pair)
+    )
+    canonical_request = "\n".join([
+        method,
+        parts.path or "/",
+        "&".join(f"{name}={value}" for name, value in query),
+        "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+        signed_names,
+        payload_hash,
+    ])
+    scope = f"{date}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, _sha256_hex(canonical_request.encode())])
+
+    signing_key = _hmac(_hmac(_hmac(_hmac(f"AWS4{secret_key}".encode(), date), region), service), "aws4_request")
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    return {
+        **headers,
+        "x-amz-date": amz_date,
+        "x-amz-content-sha256": payload_hash,
+        "Authorization": (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope},"
+            f"SignedHeaders={signed_names},Signature={signature}"
+        ),
+    }
+
+
+class S3Storage(ObjectStorage):
+    """Objects in an S3-compatible bucket (AWS, MinIO, R2, ...), addressed path-style"""
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        http_pool: Optional[HTTPClientPool] = None,
+    ):
+        super().__init__()
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self._http_pool = http_pool
+
+    @property
+    def http_pool(self) -> HTTPClientPool:
+        return self._http_pool or get_http_pool()
+
+    def _url(self, key: str = "", query: str = "") -> str:
+        path = f"/{self.bucket}/" + quote(f"{self.prefix}{key}", safe="/-_.~") if key else f"/{self.bucket}"
+        return f"{self.endpoint_url}{path}" + (f"?{query}" if query else "")
+
+    async def _request(
+        self, method: str, url: str, content: bytes = b"", headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        signed = sign_request_v4(
+            method, url, headers or {}, _sha256_hex(content) if content else EMPTY_PAYLOAD_SHA256,
+            self.access_key, self.secret_key, self.region,
+        )
+        response = await self.http_pool.request(method, url, content=content or None, headers=signed)
+        if response.status_code >= 400 and response.status_code != 404:
+            raise IOError(f"S3 {method} {url} failed with status {response.status_code}")
+        return response
+
+    def _entry(self, key: str, size: int, content_type: str, modified: float, etag: Optional[str]) -> StoredObject:
+        stored = StoredObject(key, size, content_type, modified, etag=etag)
+        self._index[key] = stored
+        return stored
+
+    async def load(self) -> None:
+        token = None
+        while True:
+            query = f"list-type=2&prefix={quote(self.prefix, safe='')}"
+            if token:
+                query += f"&continuation-token={quote(token, safe='')}"
+            response = await self._request("GET", self._url(query=query))
+            root = ElementTree.fromstring(response.content)
+            for item in root.iter(f"{S3_XML_NAMESPACE}Contents"):
+                key = item.findtext(f"{S3_XML_NAMESPACE}Key")[len(self.prefix):]
+                modified = datetime.fromisoformat(item.findtext(f"{S3_XML_NAMESPACE}LastModified").replace("Z", "+00:00"))
+                self._entry(
+                    key,
+                    int(item.findtext(f"{S3_XML_NAMESPACE}Size") or 0),
+                    content_type_for(key),
+                    modified.timestamp(),
+                    item.findtext(f"{S3_XML_NAMESPACE}ETag"),
+                )
+            token = root.findtext(f"{S3_XML_NAMESPACE}NextContinuationToken")
+            if root.findtext(f"{S3_XML_NAMESPACE}IsTruncated") != "true" or not token:
+                return
+
+    async def refresh(self, key: str) -> Optional[StoredObject]:
+        if not _valid_key(key):
+            return None
+        response = await self._request("HEAD", self._url(key))
+        if response.status_code == 404:
+            self._index.pop(key, None)
+            return None
+        return self._entry(
+            key,
+            int(response.headers.get("content-length", 0)),
+            response.headers.get("content-type") or content_type_for(key),
+            time.time(),
+            response.headers.get("etag"),
+        )
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        if not _valid_key(key):
+            raise ValueError(f"Invalid storage key: {key}")
+        content_type = detect_image_type(data[:16]) or content_type or content_type_for(key)
+        response = await self._request("PUT", self._url(key), content=data, headers={"Content-Type": content_type})
+        stored = self._entry(key, len(data), content_type, time.time(), response.headers.get("etag"))
+        stored.digest = _sha256_hex(data)
+        return stored
+
+    async def read(self, key: str) -> bytes:
+        response = await self._request("GET", self._url(key))
+        if response.status_code == 404:
+            self._index.pop(key, None)
+            raise FileNotFoundError(key)
+        return response.content
+
+    async def delete(self, key: str) -> bool:
+        existed = self._index.pop(key, None) is not None
+        await self._request("DELETE", self._url(key))
+        return existed
+
+
+_storage: Optional[ObjectStorage] = None
+
+
+def create_storage() -> ObjectStorage:
+    """Build the backend selected by STORAGE_BACKEND"""
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY_ID,
+            secret_key=settings.S3_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+            prefix=settings.S3_PREFIX,
+        )
+    return LocalStorage(OUTPUT_DIR, shard_depth=settings.STORAGE_SHARD_DEPTH, fsync=settings.STORAGE_FSYNC)
+
+
+async def init_storage() -> ObjectStorage:
+    """Create the application storage and load its index"""
+    storage = get_storage()
+    await storage.load()
+    return storage
+
+
+def get_storage() -> ObjectStorage:
+    """Get the application storage for generated images"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
@@ -0,0 +1,54 @@
+"""
+Tests for the admin user listing and export.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta, UTC
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.models.user import User
+from src.modules.auth.cache import Principal
+from src.modules.routers.admin import check_admin_access
+
+
+async def create_users():
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(7):
+        user = await User.create(name=f"User {i}", email=f"user{i}@example.com", is_admin=i == 0, verified=i % 2 == 0)
+        # Two users share a timestamp to exercise the id tie-break
+        await User.filter(id=user.id).update(created_at=start + timedelta(days=min(i, 5)))
+
+
+def test_users_are_paginated_filtered_and_exported():
+    app.dependency_overrides[check_admin_access] = lambda: Principal("admin", None, True, True)
+    try:
+        with TestClient(app) as client:
+            client.portal.call(create_users)
+
+            emails, cursor = [], None
+            while True:
+                response = client.get("/api/admin/users", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+                assert response.status_code == 200
+                emails += [user["email"] for user in response.json()]
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    break
+            assert len(emails) == len(set(emails)) == 7
+            assert emails[0] in ("user5@example.com", "user6@example.com")
+
+            verified = client.get("/api/admin/users", params={"verified": True, "sort": "email"}).json()
+            assert [user["email"] for user in verified] == [f"user{i}@example.com" for i in (0, 2, 4, 6)]
+            assert client.get("/api/admin/users", params={"sort": "password_hash"}).status_code == 400
+
+            ndjson = client.get("/api/admin/users/export", params={"is_admin": False})
+            assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+            assert len([json.loads(line) for line in ndjson.text.splitlines()]) == 6
+
+            rows = list(csv.DictReader(io.StringIO(client.get("/api/admin/users/export", params={"format": "csv"}).text)))
+            assert len(rows) == 7 and "password_hash" not in rows[0]
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,76 @@
+"""
+Tests for batch image generation.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from main import app
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal
+from src.modules.image_generation import router as image_generation_router
+from src.modules.image_generation.service import ImageGenerationResult, plan_generation_shards
+
+
+def test_shards_respect_the_per_call_image_limit():
+    shards = plan_generation_shards(["a", "b"], "replicate", images_per_prompt=6, seeds=[10, 20])
+    assert [(s.prompt_index, s.seed, s.num_images) for s in shards] == [
+        (0, 20, 4), (0, 21, 2), (0, 40, 4), (0, 41, 2),
+        (1, 20, 4), (1, 21, 2), (1, 40, 4), (1, 41, 2),
+    ]
+    # Adjacent seeds must not reuse each other's extra-call seeds
+    shards = plan_generation_shards(["a", "b"], "replicate", images_per_prompt=12, seeds=[0, 1, 2, 3])
+    pairs = [(s.prompt_index, s.seed) for s in shards]
+    assert len(pairs) == len(set(pairs)) == 2 * 4 * 3
+    assert [s.seed for s in plan_generation_shards(["a"], "replicate", images_per_prompt=4, seeds=[7, 8])] == [7, 8]
+    assert [s.num_images for s in plan_generation_shards(["a"], "kling", images_per_prompt=20)] == [9, 9, 2]
+    with pytest.raises(ValueError):
+        plan_generation_shards(["a"], "kling", seeds=[1])
+
+
+def test_prompt_grid_streams_results_per_call(monkeypatch):
+    running = peak = 0
+
+    async def fake_generate_image(prompt, seed, num_images, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if prompt == "broken":
+            raise HTTPException(status_code=400, detail="Prompt rejected")
+        return ImageGenerationResult(task_id=f"{prompt}-{seed}", images=[f"{prompt}-{seed}-{i}.png" for i in range(num_images)],
+                                     status="succeed", created_at=0, updated_at=0)
+
+    monkeypatch.setattr(image_generation_router, "generate_image", fake_generate_image)
+    body = {"prompts": ["red dress", "broken", "blue coat"], "seeds": [1, 2], "images_per_prompt": 2,
+            "provider": "replicate", "model": "flux-dev", "concurrency": 3}
+
+    app.dependency_overrides[get_current_principal] = lambda: Principal("user-1", None, False, True)
+    try:
+        with TestClient(app) as client:
+            response = client.post("/api/image-generation/generate-image/batch", json=body)
+            too_big = client.post("/api/image-generation/generate-image/batch",
+                                  json={**body, "images_per_prompt": 1000})
+            seeded_kling = client.post("/api/image-generation/generate-image/batch",
+                                       json={**body, "provider": "kling", "model": None})
+            seeded_kling_single = client.post("/api/image-generation/generate-image",
+                                              json={"prompt": "red dress", "provider": "kling", "seed": 1})
+    finally:
+        app.dependency_overrides.pop(get_current_principal, None)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items, summary = lines[:-1], lines[-1]
+    assert summary == {"done": True, "total": 6, "succeeded": 4, "failed": 2}
+    assert {(item["prompt_index"], item["seed"]) for item in items} == {(p, s) for p in range(3) for s in (1, 2)}
+    assert all(len(item["data"]["images"]) == 2 for item in items if item["code"] == 0)
+    assert {item["message"] for item in items if item["code"]} == {"Prompt rejected"}
+    assert peak == 3
+    assert too_big.status_code == 422
+    # Kling ignores seeds, so a seed grid would just repeat the same request
+    assert seeded_kling.status_code == 422
+    assert seeded_kling_single.status_code == 422
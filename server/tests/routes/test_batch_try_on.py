@@ -0,0 +1,82 @@
+"""
+Tests for the batch virtual try-on endpoint.
+"""
+
+import asyncio
+import base64
+import io
+import json
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from main import app
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal
+from src.modules.image_generation import router as image_generation_router
+from src.modules.image_generation.service import ImageGenerationResult
+from src.modules.uploads import service as uploads_service
+from src.modules.uploads.service import UploadQuota, UploadStore
+
+
+def png_data_url() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_one_garment_on_many_people_streams_results(monkeypatch, tmp_path):
+    monkeypatch.setattr(uploads_service, "_store", UploadStore(str(tmp_path)))
+    quota = UploadQuota(max_bytes=10 * 1024 * 1024, window_seconds=3600)
+    monkeypatch.setattr(uploads_service, "_quota", quota)
+    garments = set()
+    running = peak = 0
+
+    async def fake_try_on(human_image_url, garment_image_url, model, garment_type, routing=None):
+        nonlocal running, peak
+        garments.add(garment_image_url)
+        running += 1
+        peak = max(peak, running)
+        # Later people finish first, so results arrive out of order
+        await asyncio.sleep(0.08 / (people.index(human_image_url) + 1))
+        running -= 1
+        if human_image_url == "https://example.com/p3.png":
+            raise HTTPException(status_code=502, detail="provider down")
+        return ImageGenerationResult(task_id=human_image_url, images=["out.png"], status="succeed",
+                                     created_at=0, updated_at=0, provider="cat-vton")
+
+    monkeypatch.setattr(image_generation_router, "route_virtual_try_on", fake_try_on)
+    people = [f"https://example.com/p{i}.png" for i in range(1, 5)]
+
+    body = {"garment_image_url": png_data_url(), "human_image_urls": people, "concurrency": 2}
+    with TestClient(app) as client:
+        anonymous = client.post("/api/image-generation/virtual-try-on/batch", json=body)
+        app.dependency_overrides[get_current_principal] = lambda: Principal("user-1", None, False, True)
+        try:
+            response = client.post("/api/image-generation/virtual-try-on/batch", json=body)
+            invalid = client.post("/api/image-generation/virtual-try-on/batch", json={
+                "garment_image_url": png_data_url(),
+                "garment_image_urls": people,
+            })
+        finally:
+            app.dependency_overrides.pop(get_current_principal, None)
+
+    # Staging writes to the upload store, so anonymous callers are turned away
+    assert anonymous.status_code == 401
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items, summary = lines[:-1], lines[-1]
+    assert summary == {"done": True, "total": 4, "succeeded": 3, "failed": 1}
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    assert [item["index"] for item in items] != [0, 1, 2, 3]
+    failed = next(item for item in items if item["code"])
+    assert failed["human_image_url"] == people[2] and failed["code"] == 502 and failed["data"] is None
+
+    # The shared garment was decoded and stored once, then referenced by upload id
+    assert len(garments) == 1 and garments.pop().startswith("img_")
+    assert len(list(tmp_path.iterdir())) == 1
+    assert quota.remaining("user-1") < quota.max_bytes
+    assert peak == 2
+    assert invalid.status_code == 422
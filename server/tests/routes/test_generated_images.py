@@ -0,0 +1,70 @@
+"""
+Tests for serving generated images.
+"""
+
+import asyncio
+import hashlib
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from main import app
+from src.modules.services import image_variants
+from src.modules.services.image_variants import ImageVariantService
+from src.utils import storage as storage_module
+from src.utils.storage import LocalStorage
+
+
+def test_generated_images_are_cacheable(monkeypatch, tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "blue").save(buffer, format="JPEG")
+    data = buffer.getvalue()
+    storage = LocalStorage(str(tmp_path))
+    # Stored under a .png name, but the bytes say otherwise
+    asyncio.run(storage.put("catvton_abc.png", data, "image/png"))
+    monkeypatch.setattr(storage_module, "_storage", storage)
+
+    with TestClient(app) as client:
+        response = client.get("/api/generated-images/catvton_abc.png")
+        assert response.status_code == 200 and response.content == data
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        etag = response.headers["etag"]
+        assert etag == f'"{hashlib.sha256(data).hexdigest()}"'
+
+        assert client.get("/api/generated-images/catvton_abc.png", headers={"If-None-Match": etag}).status_code == 304
+        since = {"If-Modified-Since": response.headers["last-modified"]}
+        assert client.get("/api/generated-images/catvton_abc.png", headers=since).status_code == 304
+        assert client.get("/api/generated-images/catvton_abc.png", headers={"If-None-Match": '"other"'}).status_code == 200
+
+        partial = client.get("/api/generated-images/catvton_abc.png", headers={"Range": "bytes=0-3"})
+        assert partial.status_code == 206 and partial.content == data[:4]
+        assert client.get("/api/generated-images/missing.png").status_code == 404
+
+
+def test_variants_are_rendered_once_and_cached(monkeypatch, tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1000, 500), "red").save(buffer, format="PNG")
+    storage = LocalStorage(str(tmp_path / "images"))
+    asyncio.run(storage.put("catvton_big.png", buffer.getvalue()))
+    monkeypatch.setattr(storage_module, "_storage", storage)
+    variants = ImageVariantService(str(tmp_path / "variants"), max_workers=1)
+    monkeypatch.setattr(image_variants, "_variants", variants)
+
+    with TestClient(app) as client:
+        def fetch():
+            return client.get("/api/generated-images/catvton_big.png", params={"w": 200, "fmt": "webp"})
+
+        first, second = client.portal.call(lambda: asyncio.gather(
+            asyncio.to_thread(fetch), asyncio.to_thread(fetch)
+        ))
+        assert first.status_code == second.status_code == 200
+        assert first.headers["content-type"] == "image/webp"
+        assert first.headers["etag"] == second.headers["etag"]
+        with Image.open(io.BytesIO(first.content)) as thumbnail:
+            assert thumbnail.size == (256, 128)
+
+        assert fetch().content == first.content
+        assert client.get("/api/generated-images/catvton_big.png", params={"fmt": "gif"}).status_code == 422
+    assert variants.renders == 1
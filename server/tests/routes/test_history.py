@@ -0,0 +1,133 @@
+"""
+Tests for the generation history.
+"""
+
+import asyncio
+from datetime import datetime, UTC
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+from tortoise import Tortoise
+
+from main import app
+from src.models.generation import GenerationJob
+from src.models.user import User
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal, get_optional_principal
+from src.modules.history.service import GenerationHistoryWriter, GenerationRecord, generation_params, get_history_writer
+from src.modules.image_generation import router as image_generation_router
+from src.modules.image_generation.service import ImageGenerationResult
+
+TRY_ON = {"human_image_url": "img_person", "garment_image_url": "img_garment", "model": "cat-vton"}
+
+
+def test_generations_are_recorded_and_listed(monkeypatch):
+    async def fake_try_on(human_image_url, garment_image_url, model, garment_type, routing=None):
+        if garment_image_url == "img_broken":
+            raise ValueError("Unreadable garment")
+        return ImageGenerationResult(task_id="t", images=[f"api/generated-images/{human_image_url}.png"],
+                                     status="succeed", created_at=0, updated_at=0)
+
+    monkeypatch.setattr(image_generation_router, "route_virtual_try_on", fake_try_on)
+    try:
+        with TestClient(app) as client:
+            user = client.portal.call(lambda: User.create(name="Ann", email="ann@example.com"))
+            principal = Principal(str(user.id), user.email, False, True)
+            app.dependency_overrides[get_current_principal] = lambda: principal
+            app.dependency_overrides[get_optional_principal] = lambda: principal
+
+            for body in (TRY_ON, TRY_ON, {**TRY_ON, "garment_image_url": "img_broken"}):
+                client.post("/api/image-generation/virtual-try-on", json=body)
+            assert client.portal.call(get_history_writer().flush) == 3
+
+            items, cursor = [], None
+            while True:
+                page = client.get("/api/history", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+                items += page["items"]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            assert len({item["id"] for item in items}) == 3
+            assert [item["status"] for item in items].count("failed") == 1
+            assert items[0]["created_at"] >= items[-1]["created_at"]
+
+            succeeded = next(item for item in items if item["status"] == "succeed")
+            assert client.get(f"/api/history/{succeeded['id']}").json()["images"] == ["api/generated-images/img_person.png"]
+            assert client.get("/api/history/not-a-uuid").status_code == 404
+            assert client.get("/api/history", params={"cursor": "garbage"}).status_code == 400
+
+            params_hash, _ = generation_params(
+                "virtual-try-on", "cat-vton",
+                {"human_image_url": "img_person", "garment_image_url": "img_garment"},
+                {"garment_type": "overall"},
+            )
+            assert succeeded["params_hash"] == params_hash
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_a_rejected_record_does_not_lose_the_rest_of_its_batch():
+    async def scenario():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.user", "src.models.generation"]})
+        await Tortoise.generate_schemas()
+        try:
+            writer = GenerationHistoryWriter()
+            records = [
+                GenerationRecord(kind="test", provider="p", params_hash="h", status="succeed",
+                                 created_at=datetime.now(UTC), images=[f"{i}.png"])
+                for i in range(3)
+            ]
+            # Same primary key as the first record, so the batch insert fails
+            duplicate = GenerationRecord(kind="test", provider="p", params_hash="h", status="succeed",
+                                         created_at=datetime.now(UTC), id=records[0].id)
+            for record in (*records, duplicate):
+                writer.record(record)
+            written = await writer.flush()
+            return written, writer.dropped, await GenerationJob.all().count()
+        finally:
+            await Tortoise.close_connections()
+
+    assert asyncio.run(scenario()) == (3, 1, 3)
+
+
+def test_deterministic_try_ons_reuse_recorded_results(monkeypatch):
+    calls = []
+    hosted_by_provider = []
+
+    async def fake_try_on(human_image_url, garment_image_url, model, garment_type, routing=None):
+        calls.append(model)
+        prefix = "https://replicate.delivery/" if hosted_by_provider else "api/generated-images/"
+        return ImageGenerationResult(task_id="t", images=[f"{prefix}{model}-{len(calls)}.png"],
+                                     status="succeed", created_at=0, updated_at=0, provider=model)
+
+    monkeypatch.setattr(image_generation_router, "route_virtual_try_on", fake_try_on)
+    # Fresh ids, so results recorded by earlier runs can't be reused
+    person, garment = "img_" + uuid4().hex, "img_" + uuid4().hex
+    try:
+        with TestClient(app) as client:
+            def try_on(**changes):
+                body = {**TRY_ON, "human_image_url": person, "garment_image_url": garment, **changes}
+                response = client.post("/api/image-generation/virtual-try-on", json=body)
+                client.portal.call(get_history_writer().flush)
+                return response.json()["data"]
+
+            first = try_on()
+            reused = try_on()
+            assert calls == ["cat-vton"]
+            assert reused["images"] == first["images"] and reused["task_id"].startswith("reused_")
+
+            # Other parameters, remote inputs and unseeded providers always run
+            try_on(garment_type="upper")
+            try_on(human_image_url="https://replicate.delivery/person.png")
+            try_on(model="leffa")
+            try_on(model="leffa")
+            assert calls == ["cat-vton", "cat-vton", "cat-vton", "leffa", "leffa"]
+
+            # Results only reachable through an expiring provider link are regenerated
+            hosted_by_provider.append(True)
+            garment = "img_" + uuid4().hex
+            try_on()
+            try_on()
+            assert calls[-2:] == ["cat-vton", "cat-vton"]
+    finally:
+        app.dependency_overrides.clear()
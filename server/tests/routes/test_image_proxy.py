@@ -0,0 +1,66 @@
+"""
+Tests for the streaming /view-image proxy.
+"""
+
+import httpx
+from fastapi.testclient import TestClient
+
+from main import app
+from src.external_services.http_pool import HTTPClientPool
+from src.modules.image_generation import router as image_generation_router
+from src.modules.image_generation.proxy import ImageProxy
+from src.utils.result_cache import ResultCache
+
+IMAGE = bytes(range(256)) * 64
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/missing.png":
+        return httpx.Response(404)
+    if request.url.path == "/page.html":
+        return httpx.Response(200, content=b"<script>alert(1)</script>", headers={"content-type": "text/html"})
+    headers = {"content-type": "image/webp", "etag": '"v1"'}
+    if "range" in request.headers:
+        start, end = map(int, request.headers["range"].removeprefix("bytes=").split("-"))
+        headers["content-range"] = f"bytes {start}-{end}/{len(IMAGE)}"
+        return httpx.Response(206, content=IMAGE[start:end + 1], headers=headers)
+    return httpx.Response(200, content=IMAGE, headers=headers)
+
+
+def test_view_image_streams_and_caches(monkeypatch, tmp_path):
+    pool = HTTPClientPool(host_limits={}, transport_factory=lambda limits, http2: httpx.MockTransport(upstream))
+    proxy = ImageProxy(cache=ResultCache(str(tmp_path)), allowed_hosts={"example.com"}, http_pool=pool)
+    monkeypatch.setattr(image_generation_router, "get_image_proxy", lambda: proxy)
+    url = "/api/image-generation/view-image?url=https://cdn.example.com/out.webp"
+
+    client = TestClient(app)
+    partial = client.get(url, headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == IMAGE[:10]
+    assert partial.headers["content-range"] == f"bytes 0-9/{len(IMAGE)}"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.content == IMAGE
+    assert full.headers["content-type"] == "image/webp"
+    assert full.headers["x-content-type-options"] == "nosniff"
+
+    # Served from the disk cache from here on
+    cached = client.get(url, headers={"Range": "bytes=10-19"})
+    assert cached.status_code == 206 and cached.content == IMAGE[10:20]
+    assert cached.headers["x-content-type-options"] == "nosniff"
+    assert client.get(url, headers={"If-None-Match": '"v1"'}).status_code == 304
+
+    assert client.get("/api/image-generation/view-image?url=https://cdn.example.com/missing.png").status_code == 404
+    assert client.get("/api/image-generation/view-image?url=https://cdn.example.com/page.html").status_code == 502
+    assert client.get("/api/image-generation/view-image?url=file:///etc/passwd").status_code == 400
+    assert client.get("/api/image-generation/view-image?url=https://attacker.net/out.webp").status_code == 400
+
+
+def test_only_provider_cdns_are_allowed_by_default():
+    proxy = ImageProxy()
+    assert proxy._host_allowed("pbxt.replicate.delivery")
+    assert proxy._host_allowed("v3.fal.media")
+    assert not proxy._host_allowed("notreplicate.delivery")
+    assert not proxy._host_allowed("169.254.169.254")
+    assert ImageProxy(allowed_hosts={"*"})._host_allowed("anything.example")
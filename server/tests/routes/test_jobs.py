@@ -0,0 +1,173 @@
+"""
+Tests for the background jobs endpoints.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+from fastapi.testclient import TestClient
+from tortoise import Tortoise
+
+from main import app
+from src.models.job import Job
+from src.modules.jobs import router as jobs_router
+from src.modules.jobs.exceptions import JobNotFoundException, UnknownJobProviderException
+from src.modules.jobs.service import JobManager, current_job_manager, report_job_progress
+from src.modules.jobs.store import InMemoryJobStore, TortoiseJobStore
+
+
+def test_job_manager_limits_provider_concurrency():
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), max_workers=10, provider_limits={"slow": 2})
+        running = 0
+        peak = 0
+
+        async def handler():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"ok": True}
+
+        jobs = [await manager.submit("test", "slow", handler) for _ in range(6)]
+        states = [[job async for job in manager.events(job.id)][-1] for job in jobs]
+        await manager.close()
+        return peak, states
+
+    peak, states = asyncio.run(scenario())
+    assert peak == 2
+    assert all(state.status == "succeed" and state.result == {"ok": True} for state in states)
+
+
+def test_handlers_report_progress_to_subscribers():
+    async def scenario():
+        manager = JobManager(InMemoryJobStore())
+
+        async def handler():
+            await report_job_progress({"status": "processing", "percentage": 0.5})
+            return {"ok": True}
+
+        job = await manager.submit("test", "replicate", handler)
+        states = [state async for state in manager.events(job.id)]
+        await manager.close()
+        # Outside a job there is nothing to report to
+        await report_job_progress({"status": "processing"})
+        return states
+
+    states = asyncio.run(scenario())
+    assert {"status": "processing", "percentage": 0.5} in [state.progress for state in states]
+    assert states[-1].status == "succeed"
+
+
+def test_submit_virtual_try_on_returns_job_id(monkeypatch):
+    async def fake_try_on(**kwargs):
+        if kwargs["garment_image_url"] == "broken":
+            raise ValueError("provider down")
+        return {"task_id": "t1", "images": ["out.png"]}
+
+    monkeypatch.setattr(jobs_router, "route_virtual_try_on", fake_try_on)
+    payload = {"human_image_url": "https://example.com/p.png", "garment_image_url": "data:,", "model": "cat-vton"}
+
+    with TestClient(app) as client:
+        response = client.post("/api/jobs/virtual-try-on", json=payload)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        events = client.get(f"/api/jobs/{job_id}/events").text
+        assert "event: succeed" in events
+
+        job = client.get(f"/api/jobs/{job_id}").json()
+        assert job["status"] == "succeed"
+        assert job["result"]["images"] == ["out.png"]
+
+        # Routed jobs are queued under the provider the router picks, not "auto"
+        auto_id = client.post("/api/jobs/virtual-try-on", json={**payload, "model": "auto"}).json()["job_id"]
+        assert client.get(f"/api/jobs/{auto_id}").json()["provider"] in ("leffa", "cat-vton", "kolors")
+
+        failed_id = client.post("/api/jobs/virtual-try-on", json={**payload, "garment_image_url": "broken"}).json()["job_id"]
+        client.get(f"/api/jobs/{failed_id}/events")
+        failed = client.get(f"/api/jobs/{failed_id}").json()
+        assert failed["status"] == "failed"
+        assert failed["error"] == "provider down"
+
+        assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_unknown_try_on_model_is_rejected_without_a_queue(monkeypatch):
+    async def fake_try_on(**kwargs):
+        return {"task_id": "t1", "images": ["out.png"]}
+
+    monkeypatch.setattr(jobs_router, "route_virtual_try_on", fake_try_on)
+    payload = {"human_image_url": "https://example.com/p.png", "garment_image_url": "data:,", "model": "made-up"}
+
+    with TestClient(app) as client:
+        providers = set(current_job_manager().stats()["providers"])
+        response = client.post("/api/jobs/virtual-try-on", json=payload)
+        assert response.status_code == 422
+        assert set(current_job_manager().stats()["providers"]) == providers
+
+
+def test_job_manager_refuses_queues_for_unlisted_providers():
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), providers=["leffa"])
+        try:
+            await manager.submit("test", "made-up", lambda: asyncio.sleep(0))
+        except UnknownJobProviderException as e:
+            return e.status_code, manager.stats()["providers"]
+        finally:
+            await manager.close()
+
+    assert asyncio.run(scenario()) == (422, {})
+
+
+def test_jobs_are_only_visible_to_their_submitter():
+    async def scenario():
+        manager = JobManager(InMemoryJobStore())
+        owned = await manager.submit("test", "p", lambda: asyncio.sleep(0), user_id="u1")
+        anonymous = await manager.submit("test", "p", lambda: asyncio.sleep(0))
+        try:
+            assert (await manager.get_visible(owned.id, "u1")).id == owned.id
+            assert (await manager.get_visible(anonymous.id, "u2")).id == anonymous.id
+            hidden = []
+            for caller in ("u2", None):
+                try:
+                    await manager.get_visible(owned.id, caller)
+                except JobNotFoundException as e:
+                    hidden.append(e.status_code)
+            return hidden, owned.model_dump()
+        finally:
+            await manager.close()
+
+    hidden, dumped = asyncio.run(scenario())
+    assert hidden == [404, 404]
+    assert "user_id" not in dumped
+
+
+def test_database_store_prunes_old_results_and_fails_orphaned_jobs():
+    async def scenario():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.job"]})
+        await Tortoise.generate_schemas()
+        try:
+            long_ago = datetime.now(UTC) - timedelta(hours=2)
+            expired = await Job.create(kind="test", provider="p", status="succeed", finished_at=long_ago)
+            recent = await Job.create(kind="test", provider="p", status="succeed", finished_at=datetime.now(UTC))
+            orphaned = await Job.create(kind="test", provider="p", status="running")
+            live = await Job.create(kind="test", provider="p", status="queued")
+            await Job.filter(id=orphaned.id).update(updated_at=long_ago)
+
+            store = TortoiseJobStore(result_ttl_seconds=3600, stale_seconds=1800)
+            await store.start()
+            return (
+                await store.get(str(expired.id)),
+                await store.get(str(recent.id)),
+                await store.get(str(orphaned.id)),
+                await store.get(str(live.id)),
+            )
+        finally:
+            await Tortoise.close_connections()
+
+    expired, recent, orphaned, live = asyncio.run(scenario())
+    assert expired is None and recent is not None
+    assert orphaned.status == "failed" and orphaned.error and orphaned.finished_at
+    assert live.status == "queued"
@@ -0,0 +1,24 @@
+"""
+Tests for the Kling task callback webhook.
+"""
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.config import settings
+
+CALLBACK_URL = "/api/image-generation/kling/callback"
+PAYLOAD = {"task_id": "t1", "task_status": "succeed"}
+
+
+def test_callbacks_need_the_configured_secret(monkeypatch):
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "KLING_CALLBACK_SECRET", "")
+    assert client.post(CALLBACK_URL, json=PAYLOAD).status_code == 403
+    assert client.post(f"{CALLBACK_URL}?token=", json=PAYLOAD).status_code == 403
+
+    monkeypatch.setattr(settings, "KLING_CALLBACK_SECRET", "s3cret")
+    assert client.post(f"{CALLBACK_URL}?token=wrong", json=PAYLOAD).status_code == 403
+    response = client.post(f"{CALLBACK_URL}?token=s3cret", json=PAYLOAD)
+    assert response.status_code == 200 and response.json() == {"resolved": False}
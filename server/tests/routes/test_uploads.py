@@ -0,0 +1,107 @@
+"""
+Tests for image uploads.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from src.config import settings
+from src.modules.auth.cache import Principal
+from src.modules.auth.dependencies import get_current_principal
+from src.modules.uploads import service as uploads_service
+from src.modules.uploads.exceptions import InvalidImageException
+from src.modules.uploads.service import UploadQuota, UploadStore, load_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def signed_in():
+    app.dependency_overrides[get_current_principal] = lambda: Principal("user-1", None, False, True)
+    yield
+    app.dependency_overrides.pop(get_current_principal, None)
+
+
+def test_uploads_need_a_signed_in_user(monkeypatch, tmp_path):
+    monkeypatch.setattr(uploads_service, "_store", UploadStore(str(tmp_path)))
+    client = TestClient(app)
+    assert client.post("/api/uploads", files={"file": ("garment.png", PNG, "image/png")}).status_code == 401
+    assert client.post("/api/uploads/presign", json={}).status_code == 401
+
+
+def test_multipart_and_presigned_uploads(monkeypatch, tmp_path, signed_in):
+    monkeypatch.setattr(uploads_service, "_store", UploadStore(str(tmp_path)))
+    client = TestClient(app)
+
+    created = client.post("/api/uploads", files={"file": ("garment.png", PNG, "image/png")})
+    assert created.status_code == 201
+    body = created.json()
+    assert body["image_id"].startswith("img_")
+    assert body["content_type"] == "image/png" and body["size"] == len(PNG)
+
+    fetched = client.get(body["url"])
+    assert fetched.content == PNG
+    assert fetched.headers["content-type"] == "image/png"
+
+    presigned = client.post("/api/uploads/presign", json={"size": len(PNG)}).json()
+    assert presigned["max_bytes"] == len(PNG)
+    # Same content, same id
+    put = client.put(presigned["upload_url"], content=PNG)
+    assert put.status_code == 201 and put.json()["image_id"] == body["image_id"]
+    assert len(list(tmp_path.iterdir())) == 1
+    # Presigned URLs are single use
+    assert client.put(presigned["upload_url"], content=PNG).status_code == 403
+
+    presigned = client.post("/api/uploads/presign", json={"size": len(PNG)}).json()
+    assert client.put(presigned["upload_url"], content=PNG + b"x").status_code == 413
+    assert client.put("/api/uploads/presigned/bad-token", content=PNG).status_code == 403
+    assert client.post("/api/uploads", files={"file": ("a.txt", b"hello", "text/plain")}).status_code == 415
+    assert client.get("/api/uploads/img_" + "0" * 32).status_code == 404
+
+
+def test_upload_size_limit(monkeypatch, tmp_path, signed_in):
+    monkeypatch.setattr(uploads_service, "_store", UploadStore(str(tmp_path)))
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 100)
+    response = TestClient(app).post("/api/uploads", files={"file": ("big.png", PNG, "image/png")})
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_quota_per_user(monkeypatch, tmp_path, signed_in):
+    monkeypatch.setattr(uploads_service, "_store", UploadStore(str(tmp_path)))
+    monkeypatch.setattr(uploads_service, "_quota", UploadQuota(max_bytes=len(PNG), window_seconds=60))
+    client = TestClient(app)
+
+    assert client.post("/api/uploads", files={"file": ("a.png", PNG, "image/png")}).status_code == 201
+    over = client.post("/api/uploads", files={"file": ("b.png", PNG + b"b", "image/png")})
+    assert over.status_code == 429 and int(over.headers["retry-after"]) > 0
+    assert client.post("/api/uploads/presign", json={}).status_code == 429
+
+
+def test_images_stored_by_another_worker_are_found(tmp_path):
+    (tmp_path / ("img_" + "a" * 32 + ".png")).write_bytes(PNG)
+    store = UploadStore(str(tmp_path))
+    assert asyncio.run(store.get("img_" + "b" * 32)) is None
+    (tmp_path / ("img_" + "b" * 32 + ".jpg")).write_bytes(PNG)
+    stored = asyncio.run(store.get("img_" + "b" * 32))
+    assert stored is not None and stored.content_type == "image/jpeg" and stored.size == len(PNG)
+
+
+def test_remote_images_are_only_fetched_from_allowed_hosts():
+    fetched = []
+
+    class RecordingPool:
+        async def request(self, method, url, **kwargs):
+            fetched.append(url)
+            return httpx.Response(200, content=PNG, headers={"content-type": "image/png"},
+                                  request=httpx.Request(method, url))
+
+    for url in ("http://169.254.169.254/latest/meta-data", "https://evil.example/a.png", "file:///etc/passwd"):
+        with pytest.raises(InvalidImageException):
+            asyncio.run(load_image(url, RecordingPool()))
+    loaded = asyncio.run(load_image("https://v3.fal.media/a.png", RecordingPool()))
+    assert loaded.data == PNG and fetched == ["https://v3.fal.media/a.png"]
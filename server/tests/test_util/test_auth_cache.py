@@ -0,0 +1,84 @@
+"""
+Tests for token claims and auth caches.
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from tortoise import Tortoise
+
+from src.models.user import User
+from src.modules.auth import cache as auth_cache
+from src.modules.auth.dependencies import get_current_principal, get_current_user, get_verified_principal
+from src.modules.auth.jwt import create_access_token, user_claims
+from src.modules.auth.schemas import UserUpdate
+from src.modules.auth.service import UserService
+
+
+async def with_database(test):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.user"]})
+    await Tortoise.generate_schemas()
+    try:
+        await test()
+    finally:
+        await Tortoise.close_connections()
+
+
+def test_principal_comes_from_claims_until_the_user_changes():
+    async def test():
+        user = await User.create(name="Ada Admin", email="ada@example.com", is_admin=True)
+        token = create_access_token(data=user_claims(user))
+
+        # Removed behind the service's back: claims alone still authorise the caller
+        await User.filter(id=user.id).delete()
+        principal = await get_current_principal(token)
+        assert principal.id == str(user.id) and principal.is_admin
+
+        # Changes through the service stop trusting older claims
+        await User.create(id=user.id, name="Ada Admin", email="ada@example.com", is_admin=True)
+        await UserService.delete_user(str(user.id))
+        with pytest.raises(HTTPException) as error:
+            await get_current_principal(token)
+        assert error.value.status_code == 401
+
+    asyncio.run(with_database(test))
+
+
+def test_user_cache_is_invalidated_on_update():
+    async def test():
+        user = await User.create(name="Grace", email="grace@example.com")
+        token = create_access_token(data=user_claims(user))
+        assert (await get_current_user(token)).name == "Grace"
+
+        await UserService.update_user(str(user.id), UserUpdate(name="Grace Hopper"))
+        assert (await get_current_user(token)).name == "Grace Hopper"
+
+    asyncio.run(with_database(test))
+
+
+def test_privileged_checks_read_the_role_from_the_database():
+    async def test():
+        user = await User.create(name="Ada Admin", email="ada@example.com", is_admin=True)
+        token = create_access_token(data=user_claims(user))
+
+        # Demoted by another process: this process's claims still say admin
+        await User.filter(id=user.id).update(is_admin=False)
+        assert (await get_current_principal(token)).is_admin
+        assert not (await get_verified_principal(token)).is_admin
+
+        await User.filter(id=user.id).update(is_active=False)
+        with pytest.raises(HTTPException) as error:
+            await get_verified_principal(token)
+        assert error.value.status_code == 401
+
+    asyncio.run(with_database(test))
+
+
+def test_invalidations_are_forgotten_once_no_token_can_predate_them(monkeypatch):
+    monkeypatch.setattr(auth_cache, "_invalidated_at", auth_cache.OrderedDict())
+    auth_cache.invalidate_user("old")
+    auth_cache._invalidated_at["old"] = time.time() - auth_cache.MAX_TOKEN_LIFETIME_SECONDS - 1
+    auth_cache.invalidate_user("new")
+    assert list(auth_cache._invalidated_at) == ["new"]
@@ -0,0 +1,66 @@
+"""
+Tests for CatVTON input preparation.
+"""
+
+import asyncio
+import base64
+import io
+import json
+
+import httpx
+from PIL import Image
+
+from src.external_services import catvton
+from src.external_services.http_pool import HTTPClientPool
+from src.modules.services.image_preprocessing import PROVIDER_IMAGE_PROFILES, preprocess_image
+from src.utils.result_cache import ResultCache
+
+
+def encode(size, fmt="JPEG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_inputs_are_downscaled_before_upload(monkeypatch, tmp_path):
+    person = encode((1536, 2048))
+    garment = encode((300, 400), "PNG")
+    uploaded = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, content=person, headers={"content-type": "image/jpeg"})
+        body = request.read()
+        uploaded["person"] = body.count(person)
+        uploaded["garment"] = body.count(garment)
+        return httpx.Response(200, json={"result_image": base64.b64encode(garment).decode()})
+
+    monkeypatch.setattr(catvton, "get_result_cache", lambda: ResultCache(str(tmp_path)))
+    pool = HTTPClientPool(host_limits={}, transport_factory=lambda limits, http2: httpx.MockTransport(handler))
+    request = catvton.CatVTONRequest(
+        human_image_url="https://replicate.delivery/person.jpg",
+        garment_image_url=f"data:image/png;base64,{base64.b64encode(garment).decode()}",
+    )
+
+    result = asyncio.run(catvton.virtual_try_on(request, http_pool=pool))
+
+    # The oversized person image was re-encoded, the small garment passed through as-is
+    assert uploaded == {"person": 0, "garment": 1}
+    downscaled = preprocess_image(person, PROVIDER_IMAGE_PROFILES["cat-vton"])
+    assert (downscaled.width, downscaled.height) == (768, 1024)
+    assert result.image_path.startswith(str(tmp_path))
+
+
+def test_result_image_is_decoded_in_chunks(monkeypatch):
+    image = bytes(range(256)) * 4000
+    encoded = base64.b64encode(image).decode()
+    monkeypatch.setattr(catvton, "RESULT_DECODE_CHUNK", 4 * 1000)
+
+    body = json.dumps({"result_image": encoded, "status": "ok"}).encode()
+    chunks = list(catvton.iter_result_image(body))
+    assert len(chunks) > 1 and b"".join(chunks) == image
+
+    # Lists, data URLs and escaped JSON decode to the same bytes
+    for value in ([encoded], f"data:image/png;base64,{encoded}", encoded.replace("/", "\\/")):
+        raw = json.dumps({"result_image": value}).encode().replace(b"\\\\/", b"\\/")
+        assert b"".join(catvton.iter_result_image(raw)) == image
@@ -0,0 +1,62 @@
+"""
+Tests for the garment analysis deadline in generate_image.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.external_services.replicate import ReplicateImageResponse
+from src.modules.image_generation import service
+
+
+def run_generation(monkeypatch, analysis_seconds, **kwargs):
+    prompts = []
+    finished = []
+
+    async def describe_garment(garment_image_url):
+        await asyncio.sleep(analysis_seconds)
+        finished.append(garment_image_url)
+        return "a red linen shirt"
+
+    async def generate_image_with_replicate(request, api_token):
+        prompts.append(request.prompt)
+        return ReplicateImageResponse(task_id="replicate_test", images=["https://cdn.example.com/out.webp"])
+
+    monkeypatch.setattr(service, "describe_garment", describe_garment)
+    monkeypatch.setattr(service, "generate_image_with_replicate", generate_image_with_replicate)
+
+    async def generate():
+        result = await service.generate_image(
+            prompt="studio portrait",
+            provider="replicate",
+            model="flux-dev",
+            garment_image_url="img_garment",
+            access_token="token",
+            **kwargs,
+        )
+        # Let an analysis that missed its deadline run to completion
+        await asyncio.sleep(analysis_seconds)
+        return result
+
+    asyncio.run(generate())
+    return prompts, finished
+
+
+def test_analysis_within_deadline_enriches_prompt(monkeypatch):
+    prompts, _ = run_generation(monkeypatch, 0, garment_analysis_timeout=1)
+    assert prompts == ["studio portrait, wearing a red linen shirt"]
+
+
+def test_slow_analysis_falls_back_to_bare_prompt(monkeypatch):
+    prompts, finished = run_generation(monkeypatch, 0.2, garment_analysis_timeout=0.01)
+    assert prompts == ["studio portrait"]
+    # The analysis kept running in the background to warm the cache
+    assert finished == ["img_garment"]
+
+
+def test_slow_analysis_without_fallback_fails(monkeypatch):
+    with pytest.raises(HTTPException) as error:
+        run_generation(monkeypatch, 0.2, garment_analysis_timeout=0.01, garment_analysis_fallback=False)
+    assert error.value.status_code == 504
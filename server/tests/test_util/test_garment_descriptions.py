@@ -0,0 +1,53 @@
+"""
+Tests for the garment description cache.
+"""
+
+import asyncio
+
+from tortoise import Tortoise
+
+from src.modules.services.garment_descriptions import GarmentDescriptionCache
+
+
+async def with_database(test):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.garment_description"]})
+    await Tortoise.generate_schemas()
+    try:
+        await test()
+    finally:
+        await Tortoise.close_connections()
+
+
+def test_concurrent_lookups_share_one_call_and_persist():
+    calls = []
+
+    async def describe():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "a red linen shirt"
+
+    async def test():
+        cache = GarmentDescriptionCache(ttl_seconds=60)
+        results = await asyncio.gather(*(cache.get_or_create("abc", describe) for _ in range(5)))
+        assert results == ["a red linen shirt"] * 5
+        assert len(calls) == 1
+
+        # A fresh process-level cache is served from the table
+        assert await GarmentDescriptionCache().get_or_create("abc", describe) == "a red linen shirt"
+        assert len(calls) == 1
+
+        assert await cache.invalidate("abc")
+        await cache.get_or_create("abc", describe)
+        assert len(calls) == 2
+
+    asyncio.run(with_database(test))
+
+
+def test_expired_rows_are_ignored_and_purged():
+    async def test():
+        cache = GarmentDescriptionCache(ttl_seconds=-1)
+        await cache.get_or_create("abc", lambda: asyncio.sleep(0, "old"))
+        assert await GarmentDescriptionCache(ttl_seconds=-1).get_or_create("abc", lambda: asyncio.sleep(0, "new")) == "new"
+        assert await GarmentDescriptionCache(ttl_seconds=-1).purge_expired() == 1
+
+    asyncio.run(with_database(test))
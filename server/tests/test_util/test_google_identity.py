@@ -0,0 +1,66 @@
+"""
+Tests for async Google identity verification.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from src.external_services.http_pool import HTTPClientPool
+from src.modules.auth.google import GoogleIdentity
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+)
+PUBLIC_JWK = {**jwk.construct(PRIVATE_KEY, "RS256").public_key().to_dict(), "kid": "key-1", "use": "sig"}
+
+
+def id_token(**overrides) -> str:
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": "client-id",
+        "sub": "1234",
+        "email": "ada@example.com",
+        "email_verified": True,
+        "iat": int(time.time()),
+        "exp": int(time.time()) + 3600,
+        **overrides,
+    }
+    return jwt.encode(claims, PRIVATE_KEY, algorithm="RS256", headers={"kid": "key-1"})
+
+
+def test_id_tokens_are_verified_against_cached_keys():
+    requests = []
+
+    def google(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path == "/oauth2/v3/certs":
+            return httpx.Response(200, json={"keys": [PUBLIC_JWK]}, headers={"cache-control": "public, max-age=600"})
+        if request.headers["authorization"] == "Bearer opaque-access-token":
+            return httpx.Response(200, json={"sub": "1234", "email": "ada@example.com", "email_verified": True})
+        return httpx.Response(401)
+
+    pool = HTTPClientPool(host_limits={}, transport_factory=lambda limits, http2: httpx.MockTransport(google))
+    identity = GoogleIdentity("client-id", http_pool=pool)
+
+    async def run():
+        users = await asyncio.gather(*(identity.identify(id_token()) for _ in range(5)))
+        assert {user["email"] for user in users} == {"ada@example.com"}
+        # One key fetch served every login
+        assert requests == ["/oauth2/v3/certs"]
+
+        with pytest.raises(ValueError):
+            await identity.identify(id_token(aud="someone-else"))
+        with pytest.raises(ValueError):
+            await identity.identify(id_token(iss="https://evil.example.com"))
+
+        assert (await identity.identify("opaque-access-token"))["sub"] == "1234"
+        with pytest.raises(ValueError):
+            await identity.identify("revoked-access-token")
+
+    asyncio.run(run())
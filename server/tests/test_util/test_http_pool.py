@@ -0,0 +1,58 @@
+"""
+Tests for the shared outbound HTTP connection pool.
+"""
+
+import asyncio
+
+import httpx
+
+from src.external_services.http_pool import HTTPClientPool
+from src.utils.common import parse_int_mapping
+
+
+def make_pool() -> HTTPClientPool:
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = 503 if request.url.path == "/down" else 200
+        return httpx.Response(status, content=b"ok")
+
+    return HTTPClientPool(
+        host_limits={"api.kling.ai": 4},
+        default_max_connections=10,
+        transport_factory=lambda limits, http2: httpx.MockTransport(handler),
+    )
+
+
+def test_parse_int_mapping():
+    assert parse_int_mapping("api.kling.ai=5, example.com=2,bad,x=") == {
+        "api.kling.ai": 5,
+        "example.com": 2,
+    }
+
+
+def test_known_hosts_get_dedicated_clients():
+    pool = make_pool()
+    kling = pool.client_for("https://api.kling.ai/v1/images/generations")
+    assert pool.client_for("https://api.kling.ai/other") is kling
+    assert pool.client_for("https://example.com/a.png") is not kling
+    assert pool.client_for("https://cdn.example.org/b.png") is pool.client_for("https://example.com/a.png")
+    asyncio.run(pool.aclose())
+
+
+def test_stats_track_requests_and_release_connections():
+    async def scenario():
+        pool = make_pool()
+        await pool.request("GET", "https://api.kling.ai/ok")
+        await pool.request("GET", "https://api.kling.ai/down")
+        async with pool.stream("GET", "https://example.com/img.png") as response:
+            assert pool.stats()["hosts"]["*"]["in_flight"] == 1
+            await response.aread()
+        stats = pool.stats()["hosts"]
+        await pool.aclose()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["api.kling.ai"]["requests"] == 2
+    assert stats["api.kling.ai"]["errors"] == 1
+    assert stats["api.kling.ai"]["in_flight"] == 0
+    assert stats["api.kling.ai"]["max_connections"] == 4
+    assert stats["*"]["in_flight"] == 0
@@ -0,0 +1,74 @@
+"""
+Tests for provider image preprocessing.
+"""
+
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from src.modules.services.image_preprocessing import (
+    EXIF_ORIENTATION_TAG,
+    ImagePreprocessor,
+    ProviderImageProfile,
+    preprocess_image,
+)
+
+
+def photo(size=(1200, 800), quality=90, orientation=None) -> bytes:
+    image = Image.new("RGB", size)
+    image.putdata([(x * 255 // size[0], y * 255 // size[1], 128) for y in range(size[1]) for x in range(size[0])])
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION_TAG] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+def test_orientation_is_applied_before_downscaling():
+    # Orientation 6: stored landscape, displayed portrait
+    result = preprocess_image(photo(orientation=6), ProviderImageProfile(max_size=(400, 600), format="WEBP"))
+    assert result.content_type == "image/webp"
+    assert (result.width, result.height) == (400, 600)
+
+
+def test_unreadable_images_are_rejected_as_bad_input():
+    # 422 keeps the try-on router from failing over to providers that would reject it too
+    with pytest.raises(HTTPException) as error:
+        preprocess_image(b"not an image", ProviderImageProfile(max_size=(400, 600)))
+    assert error.value.status_code == 422
+
+
+def test_small_upright_images_pass_through():
+    data = photo(size=(300, 200))
+    assert preprocess_image(data, ProviderImageProfile(max_size=(768, 1024))).data == data
+
+
+def test_only_identical_inputs_share_one_payload():
+    preprocessor = ImagePreprocessor()
+    first = asyncio.run(preprocessor.process(photo(quality=95), "cat-vton"))
+    again = asyncio.run(preprocessor.process(photo(quality=95), "cat-vton"))
+    recompressed = asyncio.run(preprocessor.process(photo(quality=60), "cat-vton"))
+    other_provider = asyncio.run(preprocessor.process(photo(quality=60), "openai"))
+
+    # A recompressed copy may as well be a different photo, so it is prepared again
+    assert again is first and recompressed is not first
+    assert recompressed.data != first.data
+    assert other_provider.content_type == "image/webp"
+    assert preprocessor.stats() == {"entries": 3, "hits": 1}
+
+
+def test_similar_but_different_photos_are_not_swapped():
+    preprocessor = ImagePreprocessor()
+    base = Image.open(io.BytesIO(photo())).convert("RGB")
+    marked = base.copy()
+    marked.paste((255, 255, 255), (100, 100, 140, 120))
+    buffer = io.BytesIO()
+    marked.save(buffer, format="JPEG", quality=90)
+
+    first = asyncio.run(preprocessor.process(photo(), "cat-vton"))
+    second = asyncio.run(preprocessor.process(buffer.getvalue(), "cat-vton"))
+    assert second.data != first.data
@@ -0,0 +1,97 @@
+"""
+Tests for the shared Kling task tracker.
+"""
+
+import asyncio
+
+import httpx
+
+from src.external_services.http_pool import HTTPClientPool
+from src.external_services.kling import KlingTaskTracker
+
+
+def make_tracker(handler) -> KlingTaskTracker:
+    pool = HTTPClientPool(host_limits={}, transport_factory=lambda limits, http2: httpx.MockTransport(handler))
+    return KlingTaskTracker(http_pool=pool, min_interval=0.01, max_interval=0.05)
+
+
+def test_outstanding_tasks_share_one_list_request():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        tasks = [
+            {"task_id": f"t{i}", "task_status": "succeed", "updated_at": 2, "task_result": {"images": [{"url": f"u{i}"}]}}
+            for i in range(5)
+        ]
+        return httpx.Response(200, json={"code": 0, "data": tasks})
+
+    async def scenario():
+        tracker = make_tracker(handler)
+        results = await asyncio.gather(*(tracker.wait(f"t{i}", "key", timeout=1) for i in range(5)))
+        await tracker.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r["task_result"]["images"][0]["url"] for r in results] == [f"u{i}" for i in range(5)]
+    assert calls == ["/v1/images/generations"]
+
+
+def test_single_task_polls_until_done_and_records_duration():
+    polls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        polls["count"] += 1
+        status = "succeed" if polls["count"] >= 3 else "processing"
+        return httpx.Response(200, json={"code": 0, "data": {"task_id": "t1", "task_status": status}})
+
+    async def scenario():
+        tracker = make_tracker(handler)
+        result = await tracker.wait("t1", "key", timeout=2)
+        stats = tracker.stats()
+        await tracker.close()
+        return result, stats
+
+    result, stats = asyncio.run(scenario())
+    assert result["task_status"] == "succeed"
+    assert polls["count"] == 3
+    assert stats["outstanding"] == 0 and stats["p50_seconds"] is not None
+
+
+def test_callback_resolves_without_polling():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise AssertionError("should not poll")
+
+    async def scenario():
+        tracker = KlingTaskTracker(
+            http_pool=HTTPClientPool(host_limits={}, transport_factory=lambda l, h: httpx.MockTransport(handler)),
+            min_interval=5,
+        )
+        waiter = asyncio.create_task(tracker.wait("t9", "key", timeout=1))
+        await asyncio.sleep(0)
+        assert tracker.resolve({"task_id": "t9", "task_status": "failed", "task_status_msg": "nsfw"})
+        result = await waiter
+        await tracker.close()
+        return result
+
+    assert asyncio.run(scenario())["task_status_msg"] == "nsfw"
+
+
+def test_unexpected_poll_errors_back_off_instead_of_stopping_the_loop():
+    polls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        polls["count"] += 1
+        if polls["count"] == 1:
+            # Malformed success response: no "data"
+            return httpx.Response(200, json={"code": 0})
+        return httpx.Response(200, json={"code": 0, "data": {"task_id": "t1", "task_status": "succeed"}})
+
+    async def scenario():
+        tracker = make_tracker(handler)
+        result = await tracker.wait("t1", "key", timeout=2)
+        await tracker.close()
+        return result
+
+    assert asyncio.run(scenario())["task_status"] == "succeed"
+    assert polls["count"] == 2
@@ -0,0 +1,100 @@
+"""
+Tests for password hashing and login rate limiting.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from tortoise import Tortoise
+
+from src.models.user import User
+from src.modules.auth import passwords
+from src.modules.auth.passwords import LoginRateLimiter, PasswordHasher, hash_cost
+from src.modules.auth.service import UserService
+from src.utils.common import client_address, parse_networks
+
+
+def test_hashing_does_not_block_the_event_loop():
+    hasher = PasswordHasher(rounds=10, max_workers=2)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        password_hash = await hasher.hash("Secret123")
+        task.cancel()
+        return password_hash
+
+    password_hash = asyncio.run(run())
+    hasher.close()
+    assert hash_cost(password_hash) == 10
+    assert len(ticks) > 5
+
+
+def test_login_rehashes_at_new_cost_and_is_rate_limited(monkeypatch):
+    monkeypatch.setattr(passwords, "_hasher", PasswordHasher(rounds=5))
+    monkeypatch.setattr(passwords, "_limiter", LoginRateLimiter(max_attempts=3, window_seconds=60))
+
+    async def test():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.user"]})
+        await Tortoise.generate_schemas()
+        try:
+            old_hash = await PasswordHasher(rounds=4).hash("Secret123")
+            await User.create(name="Ada", email="ada@example.com", password_hash=old_hash, verified=True)
+
+            await UserService.authenticate_user("ada@example.com", "Secret123", client_host="10.0.0.1")
+            assert hash_cost((await User.get(email="ada@example.com")).password_hash) == 5
+
+            for _ in range(3):
+                with pytest.raises(HTTPException) as error:
+                    await UserService.authenticate_user("ada@example.com", "wrong", client_host="10.0.0.2")
+                assert error.value.status_code == 401
+            with pytest.raises(HTTPException) as error:
+                await UserService.authenticate_user("ada@example.com", "Secret123", client_host="10.0.0.3")
+            assert error.value.status_code == 429
+            assert "Retry-After" in error.value.headers
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(test())
+
+
+def test_only_failed_logins_count_against_a_shared_address(monkeypatch):
+    monkeypatch.setattr(passwords, "_hasher", PasswordHasher(rounds=4))
+    monkeypatch.setattr(passwords, "_limiter", LoginRateLimiter(max_attempts=2, window_seconds=60))
+
+    async def test():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models.user"]})
+        await Tortoise.generate_schemas()
+        try:
+            password_hash = await PasswordHasher(rounds=4).hash("Secret123")
+            for name in ("ada", "grace", "linus"):
+                await User.create(name=name, email=f"{name}@example.com", password_hash=password_hash, verified=True)
+
+            # Many people behind one proxy address can keep signing in
+            for name in ("ada", "grace", "linus", "ada"):
+                await UserService.authenticate_user(f"{name}@example.com", "Secret123", client_host="10.0.0.1")
+
+            for name in ("ada", "grace"):
+                with pytest.raises(HTTPException):
+                    await UserService.authenticate_user(f"{name}@example.com", "wrong", client_host="10.0.0.1")
+            with pytest.raises(HTTPException) as error:
+                await UserService.authenticate_user("linus@example.com", "Secret123", client_host="10.0.0.1")
+            assert error.value.status_code == 429
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(test())
+
+
+def test_client_address_trusts_forwarded_headers_only_from_proxies():
+    proxies = parse_networks("10.0.0.0/8, not-an-ip")
+    forwarded = {"x-forwarded-for": "6.6.6.6, 203.0.113.7, 10.0.0.2"}
+    assert client_address("10.0.0.1", forwarded, proxies) == "203.0.113.7"
+    assert client_address("198.51.100.1", forwarded, proxies) == "198.51.100.1"
+    assert client_address("10.0.0.1", {}, proxies) == "10.0.0.1"
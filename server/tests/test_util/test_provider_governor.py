@@ -0,0 +1,114 @@
+"""
+Tests for the per-provider admission governor.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.external_services import kolors
+from src.external_services.governor import (
+    ProviderGovernor,
+    ProviderLimits,
+    ProviderRateLimitedException,
+)
+
+
+class UpstreamThrottled(Exception):
+    status_code = 429
+
+
+def test_concurrency_cap_queues_and_rejects_after_the_deadline():
+    governor = ProviderGovernor({"cat-vton": ProviderLimits(max_concurrency=2)}, queue_timeout=0.05)
+    peak = 0
+    running = 0
+
+    async def call(hold: float):
+        nonlocal peak, running
+        async with governor.slot("cat-vton", timeout=1):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(hold)
+            running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(call(0.01) for _ in range(6)))
+        holder = asyncio.create_task(call(0.2))
+        other = asyncio.create_task(call(0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(ProviderRateLimitedException) as excinfo:
+            async with governor.slot("cat-vton"):
+                pass
+        await asyncio.gather(holder, other)
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert peak == 2
+    assert error.status_code == 429 and "Retry-After" in error.headers
+    stats = governor.stats()["cat-vton:default"]
+    assert stats["admitted"] == 8 and stats["rejected"] == 1 and stats["in_flight"] == 0
+
+
+def test_upstream_429_halves_the_lane_and_surfaces_as_rate_limited():
+    governor = ProviderGovernor({"kling": ProviderLimits(max_concurrency=8)})
+
+    async def scenario():
+        with pytest.raises(ProviderRateLimitedException) as excinfo:
+            async with governor.slot("kling", "key-a"):
+                raise UpstreamThrottled()
+        async with governor.slot("kling", "key-b"):
+            pass
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.upstream
+    lanes = governor.stats()
+    throttled, untouched = (lanes[name] for name in sorted(lanes))
+    assert {throttled["limit"], untouched["limit"]} == {4.0, 8.0}
+    assert max(throttled["throttled"], untouched["throttled"]) == 1
+
+
+def test_token_bucket_spaces_out_calls():
+    governor = ProviderGovernor({"replicate": ProviderLimits(rate_per_minute=600, burst=1)})
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(3):
+            async with governor.slot("replicate"):
+                pass
+        return time.monotonic() - started
+
+    # One token up front, then one every 0.1s
+    assert asyncio.run(scenario()) >= 0.18
+
+
+def test_kolors_releases_its_slot_between_polls(monkeypatch):
+    governor = ProviderGovernor({"kolors": ProviderLimits(max_concurrency=1)}, queue_timeout=0.05)
+    monkeypatch.setattr(kolors, "get_provider_governor", lambda: governor)
+    monkeypatch.setattr(kolors, "KOLORS_POLL_INTERVAL_SECONDS", 0.02)
+    polls = {}
+
+    class FakePool:
+        async def request(self, method, url, json, **kwargs):
+            if url == kolors.KOLORS_TRYON_URL:
+                data = {"task_id": json["human_image"]}
+            else:
+                polls[json["task_id"]] = polls.get(json["task_id"], 0) + 1
+                done = polls[json["task_id"]] >= 5
+                data = {"task_status": "succeed" if done else "processing",
+                        "task_result": {"images": [{"url": "out.png"}]} if done else None}
+            return httpx.Response(200, json={"code": 0, "data": data})
+
+    async def scenario():
+        return await asyncio.gather(*(
+            kolors.virtual_try_on(kolors.KolorsTryOnRequest(human_image=name, cloth_image="c"), "key", FakePool())
+            for name in ("a", "b")
+        ))
+
+    # Both tasks poll for ~0.1s on a single permit; holding it across the
+    # whole task would push the second past the queue timeout
+    results = asyncio.run(scenario())
+    assert [result.result_images for result in results] == [["out.png"], ["out.png"]]
+    assert all(lane["in_flight"] == 0 for lane in governor.stats().values())
@@ -0,0 +1,157 @@
+"""
+Tests for async Replicate predictions.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from src.external_services import replicate as replicate_service
+from src.external_services.http_pool import HTTPClientPool
+from src.external_services.replicate import (
+    ReplicateImageRequest,
+    generate_image_with_replicate,
+    get_replicate_client,
+    run_replicate_prediction,
+)
+from src.utils.result_cache import ResultCache
+
+
+class FakePrediction:
+    def __init__(self, statuses, output):
+        self.id = "pred-1"
+        self._statuses = list(statuses)
+        self.status = self._statuses.pop(0)
+        self.output = output
+        self.error = None
+        self.progress = None
+        self.reloads = 0
+
+    async def async_reload(self):
+        self.reloads += 1
+        if self._statuses:
+            self.status = self._statuses.pop(0)
+        if self.status == "processing":
+            self.progress = SimpleNamespace(percentage=min(1.0, self.reloads / 4))
+
+
+class FakePredictions:
+    def __init__(self, prediction):
+        self.prediction = prediction
+        self.created = []
+        self.cancelled = []
+
+    async def async_create(self, model, input):
+        self.created.append((model, input))
+        return self.prediction
+
+    async def async_cancel(self, id):
+        self.cancelled.append(id)
+
+
+class FakeClient:
+    instances = 0
+
+    def __init__(self, api_token=None, prediction=None):
+        FakeClient.instances += 1
+        self.predictions = FakePredictions(prediction)
+
+
+def stub_client(monkeypatch, prediction) -> FakeClient:
+    client = FakeClient(prediction=prediction)
+    monkeypatch.setattr(replicate_service, "get_replicate_client", lambda api_token: client)
+    return client
+
+
+def test_prediction_is_polled_until_it_succeeds(monkeypatch):
+    prediction = FakePrediction(["starting", "processing", "succeeded"], ["https://replicate.delivery/a.webp"])
+    client = stub_client(monkeypatch, prediction)
+    monkeypatch.setattr(replicate_service.settings, "RESULT_CACHE_ENABLED", False)
+
+    result = asyncio.run(generate_image_with_replicate(ReplicateImageRequest(prompt="red dress"), "token"))
+
+    assert result.images == ["https://replicate.delivery/a.webp"]
+    assert prediction.reloads == 2
+    assert client.predictions.created[0][1]["prompt"] == "red dress"
+    assert client.predictions.cancelled == []
+
+
+def test_progress_is_reported_when_it_changes(monkeypatch):
+    prediction = FakePrediction(["starting", "processing", "processing", "processing", "succeeded"], ["out"])
+    stub_client(monkeypatch, prediction)
+    updates = []
+
+    async def on_progress(update):
+        updates.append((update.status, update.percentage))
+
+    output = asyncio.run(run_replicate_prediction("model", {}, "token", poll_interval=0, on_progress=on_progress))
+
+    assert output == ["out"]
+    assert updates == [
+        ("starting", None),
+        ("processing", 0.25),
+        ("processing", 0.5),
+        ("processing", 0.75),
+        ("succeeded", 0.75),
+    ]
+
+
+def test_seeded_outputs_are_served_from_our_own_storage(monkeypatch, tmp_path):
+    downloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        downloads.append(str(request.url))
+        return httpx.Response(200, content=b"webp-bytes", headers={"content-type": "image/webp"})
+
+    cache = ResultCache(str(tmp_path))
+    monkeypatch.setattr(replicate_service, "get_result_cache", lambda: cache)
+    monkeypatch.setattr(
+        replicate_service,
+        "get_http_pool",
+        lambda: HTTPClientPool(host_limits={}, transport_factory=lambda limits, http2: httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(replicate_service.settings, "RESULT_CACHE_ENABLED", True)
+    prediction = FakePrediction(["succeeded"], ["https://replicate.delivery/a.webp"])
+    client = stub_client(monkeypatch, prediction)
+    request = ReplicateImageRequest(prompt="red dress", seed=7)
+
+    first = asyncio.run(generate_image_with_replicate(request, "token"))
+    second = asyncio.run(generate_image_with_replicate(request, "token"))
+
+    # The expiring replicate.delivery link is copied once, then never handed out
+    assert downloads == ["https://replicate.delivery/a.webp"]
+    assert len(client.predictions.created) == 1
+    assert first.images == second.images
+    name = first.images[0].removeprefix("api/generated-images/")
+    assert name.startswith("replicate-0_") and name.endswith(".webp")
+    assert (tmp_path / name).read_bytes() == b"webp-bytes"
+
+
+def test_cancelling_the_caller_cancels_the_prediction(monkeypatch):
+    prediction = FakePrediction(["processing"], None)
+    client = stub_client(monkeypatch, prediction)
+
+    async def scenario():
+        task = asyncio.create_task(run_replicate_prediction("model", {}, "token", poll_interval=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
+    assert client.predictions.cancelled == ["pred-1"]
+
+
+def test_clients_are_reused_per_token(monkeypatch):
+    monkeypatch.setattr(replicate_service.replicate, "Client", FakeClient)
+    monkeypatch.setattr(replicate_service, "_clients", {})
+    FakeClient.instances = 0
+
+    first = get_replicate_client("token-a")
+    assert get_replicate_client("token-a") is first
+    assert get_replicate_client("token-b") is not first
+    assert FakeClient.instances == 2
@@ -0,0 +1,96 @@
+"""
+Tests for provider circuit breakers and hedged requests.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.external_services.governor import ProviderGovernor
+from src.external_services.resilience import CircuitBreaker, ProviderUnavailableException, hedged
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_probe():
+    governor = ProviderGovernor(failure_threshold=2, recovery_seconds=0.05)
+    calls = 0
+
+    async def call(fail: bool):
+        nonlocal calls
+        async with governor.slot("cat-vton"):
+            calls += 1
+            if fail:
+                raise httpx.ConnectError("connection refused")
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await call(fail=True)
+        with pytest.raises(ProviderUnavailableException) as excinfo:
+            await call(fail=False)
+        assert excinfo.value.status_code == 503 and "Retry-After" in excinfo.value.headers
+
+        await asyncio.sleep(0.06)
+        await call(fail=False)
+
+    asyncio.run(scenario())
+    # The short-circuited call never reached the upstream
+    assert calls == 3
+    stats = governor.breaker_stats()["cat-vton"]
+    assert stats["state"] == "closed" and stats["times_opened"] == 1 and stats["short_circuited"] == 1
+
+
+def test_failed_probe_reopens_and_4xx_does_not_trip():
+    breaker = CircuitBreaker("leffa", failure_threshold=1, recovery_seconds=0)
+    breaker.record(probe=False, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    probe = breaker.admit()
+    assert probe and breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(ProviderUnavailableException):
+        breaker.admit()
+    breaker.record(probe, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 2
+
+    governor = ProviderGovernor(failure_threshold=1)
+
+    async def rejected():
+        async with governor.slot("leffa") as permit:
+            permit.observe(422)
+
+    asyncio.run(rejected())
+    assert governor.breaker("leffa").state == CircuitBreaker.CLOSED
+
+
+def test_hedge_wins_when_the_primary_stalls():
+    cancelled = []
+
+    async def call(attempt: int) -> str:
+        try:
+            await asyncio.sleep(1 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return f"attempt-{attempt}"
+
+    async def scenario():
+        started = time.monotonic()
+        result = await hedged(call, delay=0.02)
+        await asyncio.sleep(0)
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "attempt-1" and elapsed < 0.5
+    assert cancelled == [0]
+
+
+def test_failing_hedge_does_not_mask_the_primary():
+    async def call(attempt: int) -> str:
+        if attempt == 1:
+            raise RuntimeError("hedge rejected")
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert asyncio.run(hedged(call, delay=0.01)) == "primary"
+    assert asyncio.run(hedged(call, delay=None)) == "primary"
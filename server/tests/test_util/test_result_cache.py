@@ -0,0 +1,81 @@
+"""
+Tests for the content-addressed result cache.
+"""
+
+import asyncio
+import base64
+import os
+
+from src.utils.result_cache import ResultCache, input_fingerprint, make_cache_key
+
+
+def write(cache: ResultCache, key: str, size: int) -> str:
+    path = cache.path_for("catvton", key, "png")
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_cache_key_is_stable_and_parameter_sensitive():
+    data_url = "data:image/png;base64," + base64.b64encode(b"garment").decode()
+    same_bytes = "data:image/jpeg;base64," + base64.b64encode(b"garment").decode()
+    assert input_fingerprint(data_url) == input_fingerprint(same_bytes) == b"garment"
+
+    key = make_cache_key("catvton", [b"person", b"garment"], {"seed": 42, "steps": 50})
+    assert key == make_cache_key("catvton", [b"person", b"garment"], {"steps": 50, "seed": 42})
+    assert key != make_cache_key("catvton", [b"person", b"garment"], {"steps": 50, "seed": 1})
+    assert key != make_cache_key("catvton", [b"persong", b"arment"], {"steps": 50, "seed": 42})
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    async def scenario():
+        cache = ResultCache(str(tmp_path), max_bytes=250)
+        keys = [make_cache_key("t", [bytes([i])], {}) for i in range(3)]
+        paths = [cache.path_for("catvton", key, "png") for key in keys]
+
+        await cache.put(keys[0], files=[write(cache, keys[0], 100)])
+        await cache.put(keys[1], files=[write(cache, keys[1], 100)])
+        assert await cache.get(keys[0]) is not None  # keys[1] is now least recently used
+        await cache.put(keys[2], files=[write(cache, keys[2], 100)])
+
+        assert await cache.get(keys[1]) is None
+        assert not os.path.exists(paths[1])
+        assert await cache.get(keys[0]) is not None and await cache.get(keys[2]) is not None
+
+    asyncio.run(scenario())
+
+
+def test_ttl_and_index_rebuild(tmp_path):
+    async def scenario():
+        key = make_cache_key("t", [b"a"], {})
+        cache = ResultCache(str(tmp_path))
+        await cache.put(key, files=[write(cache, key, 10)])
+        await cache.put("remote", urls=["https://example.com/a.png"], ttl_seconds=-1)
+        assert await cache.get("remote") is None
+
+        # The index is rebuilt from disk by the first lookup
+        entry = await ResultCache(str(tmp_path)).get(key)
+        assert entry is not None and entry.size == 10
+
+    asyncio.run(scenario())
+
+
+def test_eviction_keeps_files_that_are_still_referenced(tmp_path):
+    async def scenario():
+        keys = [make_cache_key("t", [bytes([i])], {}) for i in range(3)]
+        in_use = {ResultCache.name_for("catvton", keys[0], "png")}
+
+        async def referenced(names):
+            return in_use & set(names)
+
+        cache = ResultCache(str(tmp_path), max_bytes=150, referenced=referenced)
+        paths = [write(cache, key, 100) for key in keys]
+        for key, path in zip(keys, paths):
+            await cache.put(key, files=[path])
+
+        # Over the cap, history still links to the oldest file, so it is only forgotten
+        assert await cache.get(keys[0]) is None and os.path.exists(paths[0])
+        assert await cache.get(keys[1]) is None and not os.path.exists(paths[1])
+        assert cache.stats()["bytes"] == 100
+
+    asyncio.run(scenario())
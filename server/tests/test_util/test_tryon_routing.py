@@ -0,0 +1,72 @@
+"""
+Tests for virtual try-on provider routing and failover.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.external_services.governor import ProviderGovernor
+from src.modules.services.tryon_routing import TryOnRouter
+
+
+def make_router(**kwargs) -> TryOnRouter:
+    return TryOnRouter(
+        ["leffa", "cat-vton", "kolors"],
+        costs={"cat-vton": 1, "leffa": 3, "kolors": 7},
+        governor=ProviderGovernor(failure_threshold=1),
+        **kwargs,
+    )
+
+
+def test_fastest_prefers_the_quickest_healthy_provider_and_fails_over():
+    router = make_router()
+    router.score("leffa").record(2.0)
+    router.score("cat-vton").record(8.0)
+    router.score("kolors").record(20.0)
+    calls = []
+
+    async def call(provider: str) -> str:
+        calls.append(provider)
+        if provider == "leffa":
+            raise HTTPException(status_code=500, detail="FAL.AI is down")
+        return provider
+
+    assert router.candidates("auto", "fastest") == ["leffa", "cat-vton", "kolors"]
+    assert router.pick("auto", None) == "leffa" and router.pick("kling", None) == "kolors"
+    assert asyncio.run(router.run("auto", None, call)) == "cat-vton"
+    assert calls == ["leffa", "cat-vton"]
+    assert router.stats()["providers"]["leffa"]["failures"] == 1
+
+    # An open breaker sends a provider to the back of the line
+    router.governor.breaker("cat-vton").record(probe=False, failed=True)
+    assert router.candidates("auto", "fastest")[-1] == "cat-vton"
+
+
+def test_cheapest_and_strict_policies():
+    router = make_router()
+    assert router.candidates("auto", "cheapest") == ["cat-vton", "leffa", "kolors"]
+    assert router.candidates("kling", "strict") == ["kolors"]
+    assert router.resolve_policy("cat-vton", None) == "strict"
+
+    async def call(provider: str) -> str:
+        raise HTTPException(status_code=500, detail=f"{provider} failed")
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(router.run("cat-vton", None, call))
+    assert excinfo.value.detail == "cat-vton failed"
+    assert router.stats()["providers"]["leffa"]["failures"] == 0
+
+
+def test_request_errors_are_not_failed_over():
+    router = make_router()
+    calls = []
+
+    async def call(provider: str) -> str:
+        calls.append(provider)
+        raise HTTPException(status_code=415, detail="Unsupported image")
+
+    with pytest.raises(HTTPException):
+        asyncio.run(router.run("auto", "fastest", call))
+    assert len(calls) == 1
@@ -11,6 +11,7 @@ import {
   TableRow,
 } from "@/components/ui/table";
 import { Card } from "@/components/ui/card";
+import { Button } from "@/components/ui/button";
 import { ApiClient } from "@/lib/api-client";
 
 interface User {
@@ -23,19 +24,34 @@ interface User {
   is_active: boolean;
 }
 
+const USERS_PAGE_SIZE = 50;
+
 export default function AdminPage() {
   const [users, setUsers] = useState<User[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Cursors of the pages visited so far; the first page has none. Keyset
+  // cursors only point forward, so "previous" re-requests a remembered cursor
+  const [pageCursors, setPageCursors] = useState<(string | undefined)[]>([undefined]);
+  const [pageIndex, setPageIndex] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
 
   useEffect(() => {
     const fetchUsers = async () => {
+      setLoading(true);
       try {
-        const response = await ApiClient.get<User[]>("/api/admin/users");
+        const cursor = pageCursors[pageIndex];
+        const response = await ApiClient.get<User[]>("/api/admin/users", {
+          limit: USERS_PAGE_SIZE,
+          ...(cursor ? { cursor } : {}),
+        });
         if (response.error) {
           throw new Error(response.error.message);
         }
         setUsers(response.data || []);
+        // Absent on the last page
+        const next = response.headers?.["x-next-cursor"];
+        setNextCursor(typeof next === "string" ? next : undefined);
       } catch (err) {
         setError("Failed to fetch users");
         console.error("Error fetching users:", err);
@@ -45,9 +61,19 @@ export default function AdminPage() {
     };
 
     fetchUsers();
-  }, []);
+  }, [pageCursors, pageIndex]);
+
+  const goToNextPage = () => {
+    if (!nextCursor) return;
+    setPageCursors((cursors) => [...cursors.slice(0, pageIndex + 1), nextCursor]);
+    setPageIndex((index) => index + 1);
+  };
+
+  const goToPreviousPage = () => {
+    setPageIndex((index) => Math.max(0, index - 1));
+  };
 
-  if (loading) {
+  if (loading && users.length === 0) {
     return (
       <div className="flex flex-col h-full">
         <div className="p-6 border-b">
@@ -86,7 +112,7 @@ export default function AdminPage() {
       <div className="p-6 flex-1">
         <Card className="h-full">
           <Table className="">
-            <TableCaption>A list of all registered users</TableCaption>
+            <TableCaption>Registered users, page {pageIndex + 1}</TableCaption>
             <TableHeader>
               <TableRow>
                 <TableHead>Name</TableHead>
@@ -108,6 +134,24 @@ export default function AdminPage() {
               ))}
             </TableBody>
           </Table>
+          <div className="flex items-center justify-end gap-2 p-4 border-t">
+            <Button
+              variant="outline"
+              size="sm"
+              onClick={goToPreviousPage}
+              disabled={loading || pageIndex === 0}
+            >
+              Previous
+            </Button>
+            <Button
+              variant="outline"
+              size="sm"
+              onClick={goToNextPage}
+              disabled={loading || !nextCursor}
+            >
+              Next
+            </Button>
+          </div>
         </Card>
       </div>
     </div>
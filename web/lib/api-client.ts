@@ -6,6 +6,7 @@ import { authOptions } from './auth';
 
 type ApiResult<T> = {
 	data?: T;
+	headers?: AxiosResponse['headers'];
 	error?: {
 		message: string;
 		status: number;
@@ -33,7 +34,7 @@ export class ApiClient {
 				headers,
 			});
 			const response: AxiosResponse<T> = await client.request(config);
-			return { data: response.data };
+			return { data: response.data, headers: response.headers };
 		} catch (err) {
 			const error = err as Error;
 			console.error('API Client error:', {